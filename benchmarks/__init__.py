@@ -0,0 +1 @@
+"""Бенчмарки и нагрузочные тесты docchat. Запускаются из корня репозитория: python -m benchmarks.<модуль>."""
@@ -0,0 +1,270 @@
+"""
+Детерминированный синтетический корпус для бенчмарков DocumentReader.
+
+Один и тот же seed даёт побайтно одинаковые файлы: случайность только из
+random.Random(seed), даты в архивах и gzip зафиксированы.
+Запуск: python -m benchmarks.corpus --out bench_corpus --sizes small,medium
+"""
+import argparse
+import gzip
+import io
+import random
+import tarfile
+import typing as tp
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+# Примерный размер текста документа по классам
+SIZE_CLASSES = {"small": 8 * 1024, "medium": 256 * 1024, "large": 4 * 1024 * 1024}
+
+FIXED_DATE = (2024, 1, 1, 0, 0, 0)
+FIXED_MTIME = 1704067200
+
+CYRILLIC_WORDS = (
+    "документ договор поставка счёт оплата сторона условие срок товар услуга акт приёмка "
+    "претензия ответственность порядок изменение расторжение приложение подпись печать "
+    "объём качество гарантия возврат уведомление заказчик исполнитель реквизиты ёмкость"
+).split()
+LATIN_WORDS = (
+    "document contract delivery invoice payment party clause term goods service act "
+    "acceptance claim liability order amendment termination annex signature seal volume "
+    "quality warranty return notice customer contractor details capacity"
+).split()
+
+# Названия в cp866 — такие пишут архиваторы под DOS/Windows без флага UTF-8
+CP866_NAMES = ("Договор поставки.txt", "Счёт №15.txt", "Акт приёмки.txt")
+
+
+@dataclass
+class CorpusFile:
+    path: Path
+    format: str
+    size_class: str
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size
+
+    def to_dict(self) -> dict:
+        return {"path": str(self.path), "format": self.format, "size_class": self.size_class, "bytes": self.size}
+
+
+def make_text(rng: random.Random, size: int, words: tp.Sequence[str]) -> str:
+    """Абзацы из случайных слов, примерно size символов."""
+    parts, length = [], 0
+    while length < size:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 16))).capitalize() + "."
+        if rng.random() < 0.15:
+            sentence += "\n\n"
+        else:
+            sentence += " "
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)
+
+
+def _zip_write(zf: zipfile.ZipFile, name: str, data: bytes, info_cls=zipfile.ZipInfo):
+    info = info_cls(name, date_time=FIXED_DATE)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    zf.writestr(info, data)
+
+
+def make_docx(paragraphs: tp.Sequence[str]) -> bytes:
+    """Минимальный .docx, собранный вручную: только document.xml и обязательные части."""
+    from xml.sax.saxutils import escape
+
+    body = "".join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>' for text in paragraphs
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        "</Types>"
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        _zip_write(zf, "[Content_Types].xml", content_types.encode("utf-8"))
+        _zip_write(zf, "_rels/.rels", rels.encode("utf-8"))
+        _zip_write(zf, "word/document.xml", document.encode("utf-8"))
+    return buffer.getvalue()
+
+
+def make_pdf(pages: tp.Sequence[tp.Sequence[str]]) -> bytes:
+    """
+    Минимальный PDF 1.4: по потоку текста на страницу, шрифт Helvetica без встраивания.
+    Поэтому текст только латиницей. Таблица xref считается по реальным смещениям.
+    """
+    objects: list[bytes] = []
+    page_count = len(pages)
+    font_id = 3
+    page_ids = [4 + 2 * i for i in range(page_count)]
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_id, lines in zip(page_ids, pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return out.getvalue()
+
+
+class CP866ZipInfo(zipfile.ZipInfo):
+    """Пишет имя члена в cp866 без флага UTF-8, как старые архиваторы."""
+
+    def _encodeFilenameFlags(self):
+        return self.filename.encode("cp866"), self.flag_bits & ~0x800
+
+
+def make_zip(members: tp.Sequence[tuple[str, bytes]], info_cls=zipfile.ZipInfo) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, data in members:
+            _zip_write(zf, name, data, info_cls)
+    return buffer.getvalue()
+
+
+def make_tar(members: tp.Sequence[tuple[str, bytes]], compress: bool = False) -> bytes:
+    buffer = io.BytesIO()
+    raw = gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) if compress else buffer
+    with tarfile.open(fileobj=raw, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = FIXED_MTIME
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    if compress:
+        raw.close()
+    return buffer.getvalue()
+
+
+class CorpusGenerator:
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+
+    def _rng(self, *parts) -> random.Random:
+        # Отдельный генератор на файл: набор классов размеров не меняет содержимое остальных
+        return random.Random(f"{self.seed}:" + ":".join(map(str, parts)))
+
+    def text(self, size_class: str, encoding: str) -> bytes:
+        words = LATIN_WORDS if encoding == "latin-1" else CYRILLIC_WORDS
+        text = make_text(self._rng("txt", size_class, encoding), SIZE_CLASSES[size_class], words)
+        if encoding == "latin-1":
+            text = text.replace("details", "détails")  # Несколько не-ASCII символов для chardet
+        return text.encode(encoding)
+
+    def docx(self, size_class: str) -> bytes:
+        text = make_text(self._rng("docx", size_class), SIZE_CLASSES[size_class], CYRILLIC_WORDS)
+        return make_docx([p for p in text.split("\n\n") if p])
+
+    def pdf(self, size_class: str) -> bytes:
+        rng = self._rng("pdf", size_class)
+        text = make_text(rng, SIZE_CLASSES[size_class], LATIN_WORDS).replace("\n\n", " ")
+        words = text.split()
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        pages = [lines[i:i + 60] for i in range(0, len(lines), 60)] or [[""]]
+        return make_pdf(pages)
+
+    def archive_members(self, size_class: str) -> list[tuple[str, bytes]]:
+        """Смесь форматов для архивов: члены на класс меньше самого архива."""
+        member_class = {"small": "small", "medium": "small", "large": "medium"}[size_class]
+        count = {"small": 4, "medium": 32, "large": 16}[size_class]
+        members = []
+        for i in range(count):
+            kind = i % 4
+            if kind == 0:
+                members.append((f"docs/text_{i:03d}.txt", self.text(member_class, "utf-8")))
+            elif kind == 1:
+                members.append((f"docs/cp1251_{i:03d}.txt", self.text(member_class, "cp1251")))
+            elif kind == 2:
+                members.append((f"office/doc_{i:03d}.docx", self.docx(member_class)))
+            else:
+                members.append((f"scans/page_{i:03d}.pdf", self.pdf(member_class)))
+        members.append(("misc/image.bin", b"\0" * 256))  # Неподдерживаемое расширение — пропускается
+        return members
+
+    def files(self, size_class: str) -> tp.Iterator[tuple[str, str, bytes]]:
+        """(имя файла, формат, содержимое) для одного класса размеров."""
+        for encoding, label in (("utf-8", "utf8"), ("cp1251", "cp1251"), ("koi8-r", "koi8r"), ("latin-1", "latin1")):
+            yield f"{size_class}_{label}.txt", f"txt-{label}", self.text(size_class, encoding)
+        yield f"{size_class}.docx", "docx", self.docx(size_class)
+        yield f"{size_class}.pdf", "pdf", self.pdf(size_class)
+
+        members = self.archive_members(size_class)
+        yield f"{size_class}.zip", "zip", make_zip(members)
+        yield f"{size_class}.tar", "tar", make_tar(members)
+        yield f"{size_class}.tar.gz", "tar.gz", make_tar(members, compress=True)
+        nested = [
+            ("inner/level1.zip", make_zip(members[:3])),
+            ("inner/level1.tar.gz", make_tar(members[:3], compress=True)),
+            *members[3:],
+        ]
+        yield f"{size_class}_nested.zip", "zip-nested", make_zip(nested)
+        cp866_members = [(name, self.text("small", "cp1251")) for name in CP866_NAMES]
+        yield f"{size_class}_cp866.zip", "zip-cp866", make_zip(cp866_members, CP866ZipInfo)
+
+    def generate(self, out_dir: Path, size_classes: tp.Sequence[str] = ("small", "medium")) -> list[CorpusFile]:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        corpus = []
+        for size_class in size_classes:
+            for name, file_format, data in self.files(size_class):
+                path = out_dir / name
+                path.write_bytes(data)
+                corpus.append(CorpusFile(path, file_format, size_class))
+        return corpus
+
+
+__all__ = ["CorpusGenerator", "CorpusFile", "SIZE_CLASSES", "make_docx", "make_pdf", "make_zip", "make_tar"]
+
+
+def main():
+    import orjson
+
+    parser = argparse.ArgumentParser(description="Генерация синтетического корпуса документов")
+    parser.add_argument("--out", default="bench_corpus", help="папка для корпуса")
+    parser.add_argument("--sizes", default="small,medium", help=f"классы размеров: {','.join(SIZE_CLASSES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    corpus = CorpusGenerator(args.seed).generate(Path(args.out), args.sizes.split(","))
+    print(orjson.dumps([item.to_dict() for item in corpus], option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == "__main__":
+    main()
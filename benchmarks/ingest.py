@@ -0,0 +1,192 @@
+"""
+Бенчмарк DocumentReader на синтетическом корпусе.
+
+Каждый файл корпуса разбирается repeat раз через read_file или process_file,
+результаты группируются по (формат, класс размера). Итог — JSON
+в stdout или в --json, чтобы прогоны можно было сравнивать между собой.
+Запуск: python -m benchmarks.ingest --sizes small,medium --repeat 5 --json bench.json
+"""
+import argparse
+import contextlib
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing as tp
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from .corpus import SIZE_CLASSES, CorpusFile, CorpusGenerator
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах, в macOS — в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> tp.Optional[float]:
+    """Текущий RSS процесса из /proc; None, где его так не узнать."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+@contextlib.contextmanager
+def sample_rss(interval: float = 0.01) -> tp.Iterator[dict]:
+    """
+    Пик RSS за время блока: ru_maxrss — максимум за всю жизнь процесса
+    и для отдельной группы ничего не говорит, поэтому текущий RSS
+    опрашивается фоновым потоком. В словаре после выхода — start_mb и peak_mb.
+    """
+    result = {"start_mb": current_rss_mb(), "peak_mb": None}
+    if result["start_mb"] is None:
+        yield result
+        return
+    peak = [result["start_mb"]]
+    stop = threading.Event()
+
+    def poll():
+        while not stop.wait(interval):
+            peak[0] = max(peak[0], current_rss_mb() or 0.0)
+
+    thread = threading.Thread(target=poll, daemon=True)
+    thread.start()
+    try:
+        yield result
+    finally:
+        stop.set()
+        thread.join()
+        result["peak_mb"] = max(peak[0], current_rss_mb() or 0.0)
+
+
+def git_revision() -> tp.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies: list[float], total_bytes: int) -> dict:
+    values = np.asarray(latencies)
+    elapsed = float(values.sum())
+    return {
+        "runs": len(latencies),
+        "docs_per_sec": len(latencies) / elapsed if elapsed else None,
+        "mb_per_sec": total_bytes / (1024 * 1024) / elapsed if elapsed else None,
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p95_ms": float(np.percentile(values, 95) * 1000),
+        "max_ms": float(values.max() * 1000),
+    }
+
+
+def run_benchmark(corpus: list[CorpusFile], mode: str = "read", repeat: int = 3, warmup: int = 1,
+                  output_dir: tp.Optional[Path] = None) -> list[dict]:
+    """Прогоняет корпус через DocumentReader и возвращает сводку по группам."""
+    from src.docchat_service.api.v1.service import DocumentReader
+
+    reader = DocumentReader(output_dir=output_dir)
+    run = reader.read_file if mode == "read" else reader.process_file
+    groups: dict[tuple[str, str], list[CorpusFile]] = defaultdict(list)
+    for item in corpus:
+        groups[(item.format, item.size_class)].append(item)
+
+    results = []
+    for (file_format, size_class), items in groups.items():
+        latencies, total_bytes = [], 0
+        with sample_rss() as rss:
+            for item in items:
+                name = item.path.name
+                for _ in range(warmup):
+                    run(str(item.path), name)
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    run(str(item.path), name)
+                    latencies.append(time.perf_counter() - start)
+                    total_bytes += item.size
+        results.append({
+            "format": file_format,
+            "size_class": size_class,
+            "files": len(items),
+            "bytes": total_bytes // max(repeat, 1),
+            **summarize(latencies, total_bytes),
+            # Пик и прирост RSS именно за эту группу; None — платформа без /proc
+            "rss_peak_mb": rss["peak_mb"],
+            "rss_growth_mb": rss["peak_mb"] - rss["start_mb"] if rss["peak_mb"] is not None else None,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк извлечения текста DocumentReader")
+    parser.add_argument("--corpus", help="папка корпуса; по умолчанию генерируется во временную")
+    parser.add_argument("--sizes", default="small,medium", help=f"классы размеров: {','.join(SIZE_CLASSES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=("read", "process"), default="read",
+                        help="read — только read_file, process — process_file с записью результата")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--formats", help="только эти форматы, через запятую (txt-utf8,docx,zip,...)")
+    parser.add_argument("--json", help="куда записать результат; по умолчанию stdout")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи приложения")
+    args = parser.parse_args()
+
+    # Логгер приложения настраивается при импорте сервиса: логи уводим в stderr, чтобы stdout
+    # оставался чистым JSON-отчётом, а уровень меняем уже после импорта, иначе его перезапишет LOG_LEVEL
+    os.environ.setdefault("LOG_STREAM", "stderr")
+    from src.docchat_service.api.v1.service import DocumentReader  # noqa: F401
+
+    if not args.verbose:
+        logging.getLogger("rag_app").setLevel(logging.WARNING)
+
+    sizes = args.sizes.split(",")
+    with tempfile.TemporaryDirectory(prefix="docchat_bench_") as tmp:
+        corpus_dir = Path(args.corpus) if args.corpus else Path(tmp) / "corpus"
+        corpus = CorpusGenerator(args.seed).generate(corpus_dir, sizes)
+        if args.formats:
+            wanted = set(args.formats.split(","))
+            corpus = [item for item in corpus if item.format in wanted]
+
+        started = time.perf_counter()
+        results = run_benchmark(corpus, args.mode, args.repeat, args.warmup, Path(tmp) / "output")
+        report = {
+            "meta": {
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "sizes": sizes,
+                "mode": args.mode,
+                "repeat": args.repeat,
+                "warmup": args.warmup,
+                "wall_seconds": time.perf_counter() - started,
+                "peak_rss_mb": peak_rss_mb(),
+            },
+            "results": results,
+        }
+
+    data = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.json:
+        Path(args.json).write_bytes(data)
+    else:
+        sys.stdout.write(data.decode() + "\n")
+
+
+__all__ = ["run_benchmark", "summarize", "peak_rss_mb", "current_rss_mb", "sample_rss"]
+
+
+if __name__ == "__main__":
+    main()
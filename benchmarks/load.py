@@ -0,0 +1,254 @@
+"""
+Нагрузочный прогон HTTP API.
+
+По умолчанию приложение поднимается в этом же процессе через httpx.ASGITransport
+(lifespan запускается вручную), с --url — нагружается уже запущенный сервер.
+Для каждого уровня конкурентности из --concurrency выполняется --requests
+запросов по смеси --mix; файлы для загрузок берутся из синтетического корпуса
+по весам --files. В отчёте — пропускная способность, перцентили задержек,
+доля ошибок по эндпоинтам, а для приложения в этом процессе — ещё и задержка
+его event loop во время прогона (с --url в этом процессе только клиент, и его
+event loop о сервере ничего не говорит, поэтому задержка не замеряется).
+Запуск: python -m benchmarks.load --concurrency 1,8,32 --requests 200 --mix upload:1,chat:3,health:1
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import typing as tp
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+import numpy as np
+import orjson
+
+from .corpus import CorpusGenerator
+
+HEALTH_PATHS = ("/health", "/health/liveness", "/health/readiness")
+CHAT_MESSAGES = (
+    "Кто сейчас президент России?",
+    "Какие сроки поставки указаны в договоре?",
+    "Что говорится об ответственности сторон?",
+    "Перечисли реквизиты исполнителя",
+)
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition(":")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class LoopLagMonitor:
+    """Просыпается каждые interval секунд и записывает, насколько опоздал."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: tp.Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        values = np.asarray(self.samples or [0.0])
+        return {
+            "samples": len(self.samples),
+            "p50_ms": float(np.percentile(values, 50) * 1000),
+            "p99_ms": float(np.percentile(values, 99) * 1000),
+            "max_ms": float(values.max() * 1000),
+        }
+
+
+class LoadGenerator:
+    def __init__(self, client: httpx.AsyncClient, mix: dict[str, float], files: list[tuple[str, bytes]],
+                 file_weights: list[float], seed: int = 42, measure_loop_lag: bool = True):
+        self.client = client
+        self.measure_loop_lag = measure_loop_lag
+        self.scenarios = list(mix)
+        self.weights = list(mix.values())
+        self.files = files
+        self.file_weights = file_weights
+        self.rng = random.Random(seed)
+
+    async def request(self, scenario: str) -> tuple[str, int]:
+        """Выполняет запрос сценария, возвращает (эндпоинт для отчёта, статус)."""
+        if scenario == "upload":
+            name, data = self.rng.choices(self.files, self.file_weights)[0]
+            response = await self.client.post("/api/v1/upload", files={"file": (name, data)})
+            return "/api/v1/upload", response.status_code
+        if scenario == "chat":
+            message = self.rng.choice(CHAT_MESSAGES)
+            response = await self.client.post("/api/v1/chat", json={"message": message})
+            return "/api/v1/chat", response.status_code
+        if scenario == "health":
+            path = self.rng.choice(HEALTH_PATHS)
+            response = await self.client.get(path)
+            return path, response.status_code
+        raise ValueError(f"Неизвестный сценарий {scenario}")
+
+    async def run_level(self, concurrency: int, total_requests: int) -> dict:
+        plan = self.rng.choices(self.scenarios, self.weights, k=total_requests)
+        queue: asyncio.Queue = asyncio.Queue()
+        for scenario in plan:
+            queue.put_nowait(scenario)
+        latencies: dict[str, list[float]] = defaultdict(list)
+        errors: dict[str, int] = defaultdict(int)
+
+        async def worker():
+            while not queue.empty():
+                scenario = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    endpoint, status = await self.request(scenario)
+                    failed = status >= 400
+                except httpx.HTTPError:
+                    endpoint, failed = scenario, True
+                latencies[endpoint].append(time.perf_counter() - start)
+                if failed:
+                    errors[endpoint] += 1
+
+        monitor = LoopLagMonitor() if self.measure_loop_lag else None
+        if monitor is not None:
+            monitor.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        loop_lag = await monitor.stop() if monitor is not None else None
+
+        endpoints = {}
+        for endpoint, values in sorted(latencies.items()):
+            array = np.asarray(values)
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": errors[endpoint],
+                "error_rate": errors[endpoint] / len(values),
+                "rps": len(values) / elapsed,
+                "p50_ms": float(np.percentile(array, 50) * 1000),
+                "p95_ms": float(np.percentile(array, 95) * 1000),
+                "p99_ms": float(np.percentile(array, 99) * 1000),
+            }
+        return {
+            "concurrency": concurrency,
+            "requests": total_requests,
+            "seconds": elapsed,
+            "rps": total_requests / elapsed,
+            "error_rate": sum(errors.values()) / total_requests,
+            "loop_lag": loop_lag,
+            "endpoints": endpoints,
+        }
+
+
+def load_files(spec: str, seed: int, corpus_dir: Path) -> tuple[list[tuple[str, bytes]], list[float]]:
+    """Файлы корпуса по весам формата: "txt-utf8:3,docx:1,zip:1"."""
+    weights = parse_weights(spec)
+    corpus = CorpusGenerator(seed).generate(corpus_dir, ("small",))
+    files, file_weights = [], []
+    for item in corpus:
+        if item.format in weights:
+            files.append((item.path.name, item.path.read_bytes()))
+            file_weights.append(weights[item.format])
+    if not files:
+        raise SystemExit(f"В корпусе нет форматов из --files={spec}")
+    return files, file_weights
+
+
+async def run(args) -> dict:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    with tempfile.TemporaryDirectory(prefix="docchat_load_") as tmp:
+        files, file_weights = load_files(args.files, args.seed, Path(tmp))
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        lifespan = None
+    else:
+        from src.docchat_service.api import app_main
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app_main), base_url="http://bench", timeout=args.timeout
+        )
+        # ASGITransport не отправляет lifespan-события — запускаем их сами
+        lifespan = app_main.router.lifespan_context(app_main)
+
+    results = []
+    async with client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            generator = LoadGenerator(client, parse_weights(args.mix), files, file_weights, args.seed,
+                                      measure_loop_lag=lifespan is not None)
+            if args.warmup:
+                await generator.run_level(min(levels), args.warmup)
+            for level in levels:
+                results.append(await generator.run_level(level, args.requests))
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    return {
+        "meta": {
+            "target": args.url or "in-process",
+            "mix": args.mix,
+            "files": args.files,
+            "requests_per_level": args.requests,
+            "seed": args.seed,
+        },
+        "levels": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон DocChat API")
+    parser.add_argument("--url", help="адрес запущенного сервера; по умолчанию приложение в этом процессе")
+    parser.add_argument("--concurrency", default="1,4,16", help="уровни конкурентности через запятую")
+    parser.add_argument("--requests", type=int, default=100, help="запросов на уровень")
+    parser.add_argument("--warmup", type=int, default=10, help="запросов прогрева перед замерами")
+    parser.add_argument("--mix", default="upload:1,chat:2,health:1", help="веса сценариев upload/chat/health")
+    parser.add_argument("--files", default="txt-utf8:3,txt-cp1251:1,docx:2,pdf:1,zip:1",
+                        help="веса форматов корпуса для загрузок")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="не отключать кеш результатов (иначе повторные загрузки не парсятся)")
+    parser.add_argument("--json", help="куда записать результат; по умолчанию stdout")
+    args = parser.parse_args()
+
+    if not args.url:
+        # Настройки читаются при импорте приложения, поэтому до него; логи — в stderr,
+        # чтобы stdout оставался чистым JSON-отчётом
+        os.environ.setdefault("LOG_STREAM", "stderr")
+        if not args.keep_cache:
+            os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+
+    report = asyncio.run(run(args))
+    data = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.json:
+        Path(args.json).write_bytes(data)
+    else:
+        sys.stdout.write(data.decode() + "\n")
+
+
+__all__ = ["LoadGenerator", "LoopLagMonitor", "run"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Проверка бюджета времени импорта приложения.
+
+Импортирует модуль (по умолчанию src.docchat_service.api) в чистом
+подпроцессе с python -X importtime, печатает JSON с общим временем, самыми
+медленными модулями и списком тяжёлых зависимостей, попавших в импорт.
+Код выхода 1, если бюджет превышен или загружен запрещённый модуль —
+так проверку можно вызывать в CI.
+Запуск: python -m benchmarks.startup --budget-ms 1500
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import typing as tp
+
+import orjson
+
+# Должны загружаться только при первом использовании (см. src.docchat_service.capabilities)
+LAZY_MODULES = (
+    "fitz",
+    "docx",
+    "PyPDF2",
+    "rarfile",
+    "py7zr",
+    "langchain_ollama",
+    "langchain_community",
+    "langchain_text_splitters",
+)
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str, runs: int = 3) -> dict:
+    """Самый быстрый из runs прогонов: время импорта, дерево importtime и загруженные модули."""
+    script = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps(sorted(sys.modules)))"
+    )
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    best: tp.Optional[dict] = None
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            capture_output=True, text=True, check=True, env=env,
+        )
+        entries = []
+        for line in completed.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+        total_us = next((cumulative for name, _, cumulative, _ in entries if name == module), 0)
+        loaded = orjson.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or total_us < best["total_us"]:
+            best = {"total_us": total_us, "entries": entries, "modules": loaded}
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бюджет времени импорта приложения")
+    parser.add_argument("--module", default="src.docchat_service.api")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--runs", type=int, default=3, help="берётся лучший из прогонов")
+    parser.add_argument("--top", type=int, default=15, help="сколько самых медленных пакетов показать")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.runs)
+    # Самые дорогие пакеты верхнего уровня (накопленное время, без вложенных подмодулей)
+    top_level = [entry for entry in result["entries"] if "." not in entry[0]]
+    slowest = sorted(top_level, key=lambda entry: entry[2], reverse=True)[:args.top]
+    eager = [name for name in LAZY_MODULES if name in result["modules"]]
+    total_ms = result["total_us"] / 1000
+    report = {
+        "module": args.module,
+        "import_ms": round(total_ms, 1),
+        "budget_ms": args.budget_ms,
+        "within_budget": total_ms <= args.budget_ms,
+        "eager_heavy_modules": eager,
+        "modules_loaded": len(result["modules"]),
+        "slowest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)} for name, _, cumulative, _ in slowest],
+    }
+    sys.stdout.write(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode() + "\n")
+    if eager or not report["within_budget"]:
+        sys.exit(1)
+
+
+__all__ = ["measure", "LAZY_MODULES"]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
 import uvicorn
 
-from src.docchat_service.api import app_main
 from src.docchat_service.config import APP_CONFIG
 from src.docchat_service.logger.uvicorn_logging_config import LOGGING_CONFIG
 
+# Строка импорта, а не объект: каждый воркер создаёт свой AppContext при импорте,
+# а управляющий процесс приложение не импортирует вовсе
+APP_IMPORT_STRING = "src.docchat_service.api:app_main"
+
+
 def main():
+    workers = APP_CONFIG.app.app_workers
     uvicorn.run(
-        app_main,
+        APP_IMPORT_STRING,
         host=APP_CONFIG.app.app_host,
         port=APP_CONFIG.app.app_port,
+        workers=workers,
         access_log=False,
         log_config=LOGGING_CONFIG,
-        reload=APP_CONFIG.log.log_lvl == 10
+        # Перезагрузка кода несовместима с несколькими воркерами
+        reload=APP_CONFIG.log.log_lvl == 10 and workers == 1,
+        timeout_graceful_shutdown=APP_CONFIG.app.app_shutdown_timeout,
     )
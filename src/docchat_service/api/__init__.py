@@ -4,12 +4,15 @@ import typing as tp
 from fastapi import FastAPI
 
 from src.docchat_service.context import APP_CTX
+from .metric_router import router as metric_router
 from .middleware import log_requests
 from .os_router import router as service_router
 from .v1.router import router as v1_router
+from .v1.service import run_upload_job
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI) -> tp.AsyncGenerator[None, None]:
     await APP_CTX.on_startup()
+    APP_CTX.get_job_manager().start(run_upload_job)
     yield
     await APP_CTX.on_shutdown()
 
@@ -24,6 +27,7 @@ app_main = FastAPI(
 
 app_main.middleware("http")(log_requests)
 app_main.include_router(service_router, tags=["Service"])
+app_main.include_router(metric_router, tags=["Service"])
 
 app_main.include_router(v1_router)
 
@@ -1,38 +1,15 @@
-from datetime import datetime, timezone
-from fastapi import APIRouter, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 
-from . import schemas
+from src.docchat_service.context import APP_CTX
 
 router = APIRouter()
 
-@router.get("/health", status_code=status.HTTP_200_OK, response_model=schemas.HealthResponse)
-async def health():
-    return {"status": "healthy"}
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 
-@router.get("/info", status_code=status.HTTP_200_OK, response_model=schemas.InfoResponse)
-async def info():
-    return {
-        "name": "rag-document-processor",
-        "version": "0.1.0",
-        "description": "Local RAG system for document processing with Ollama"
-    }
 
-@router.get("/health/liveness", status_code=status.HTTP_200_OK)
-async def liveness_probe():
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content={
-            "status": "alive",
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-    )
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(APP_CTX.get_metrics().render(), media_type=PROMETHEUS_CONTENT_TYPE)
 
-@router.get("/health/readiness", status_code=status.HTTP_200_OK)
-async def readiness_probe():
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content={"status": "ready", "service": "rag-core"}
-    )
-
-__all__ = ["router"]
\ No newline at end of file
+__all__ = ["router"]
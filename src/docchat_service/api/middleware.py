@@ -7,8 +7,15 @@ from fastapi import Request
 from starlette.concurrency import iterate_in_threadpool
 
 from src.docchat_service.context import APP_CTX
+from src.docchat_service.metrics import HTTP_LATENCY, HTTP_REQUESTS
 
-NON_LOGGED_ENDPOINTS = ("/health", "/health/liveness", "/health/readiness", "/info", "/openapi.json", "/docs")
+NON_LOGGED_ENDPOINTS = ("/health", "/health/liveness", "/health/readiness", "/info", "/openapi.json", "/docs", "/metrics")
+
+
+def route_template(request: Request) -> str:
+    """Шаблон маршрута (/api/v1/jobs/{job_id}), чтобы число меток в метриках было ограничено."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
 
 
 async def log_requests(request: Request, call_next):
@@ -24,8 +31,16 @@ async def log_requests(request: Request, call_next):
             "client": request.client.host if request.client else "unknown"
         })
 
-    response = await call_next(request)
-    processing_time_ms = int((time.time() - start_time) * 1000)
+    try:
+        response = await call_next(request)
+    except Exception:
+        HTTP_REQUESTS.inc(method=request.method, path=route_template(request), status=500)
+        raise
+    elapsed = time.time() - start_time
+    processing_time_ms = int(elapsed * 1000)
+    path_template = route_template(request)
+    HTTP_REQUESTS.inc(method=request.method, path=path_template, status=response.status_code)
+    HTTP_LATENCY.observe(elapsed, method=request.method, path=path_template)
     if request_path not in NON_LOGGED_ENDPOINTS:
         logger.info(f"Completed {request_path} in {processing_time_ms}ms", extra={
             "trace_id": trace_id,
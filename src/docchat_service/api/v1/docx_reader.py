@@ -0,0 +1,159 @@
+import posixpath
+import re
+import typing as tp
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+# Переходная и строгая (ISO 29500 Strict) версии схемы WordprocessingML
+W_NAMESPACES = {
+    "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "http://purl.oclc.org/ooxml/wordprocessingml/main",
+}
+MC_NAMESPACE = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+PACKAGE_RELS = "_rels/.rels"
+DEFAULT_MAIN_PART = "word/document.xml"
+
+# Служебные сноски — линии-разделители, текста в них нет
+SEPARATOR_NOTES = {"separator", "continuationSeparator", "continuationNotice"}
+# Поддеревья, текст которых не выводится: запасная разметка для старых версий Word
+# (дублирует mc:Choice) и исходное место перемещённого при рецензировании текста
+SKIPPED = {(MC_NAMESPACE, "Fallback")} | {(ns, "moveFrom") for ns in W_NAMESPACES}
+RUN_CHARACTERS = {"tab": "\t", "br": "\n", "cr": "\n", "noBreakHyphen": "-"}
+
+# Ошибки, после которых имеет смысл разобрать файл запасным парсером
+DOCX_ERRORS = (zipfile.BadZipFile, KeyError, ElementTree.ParseError)
+
+
+def _split_tag(tag: str) -> tuple[str, str]:
+    namespace, _, local = tag.rpartition("}")
+    return namespace[1:], local
+
+
+def _natural_key(name: str) -> list:
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def _relationships(zf: zipfile.ZipFile, rels_name: str, base_dir: str) -> list[tuple[str, str]]:
+    """(тип, имя части в пакете) для внутренних связей из .rels-файла."""
+    try:
+        data = zf.read(rels_name)
+    except KeyError:
+        return []
+    result = []
+    for rel in ElementTree.fromstring(data):
+        if rel.get("TargetMode") == "External" or not rel.get("Target"):
+            continue
+        target = rel.get("Target")
+        name = target.lstrip("/") if target.startswith("/") else posixpath.join(base_dir, target)
+        result.append((rel.get("Type", "").rsplit("/", 1)[-1], posixpath.normpath(name)))
+    return result
+
+
+def docx_parts(zf: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """
+    (вид, имя части) в порядке чтения: верхние колонтитулы, основной текст
+    ("document"), нижние колонтитулы, сноски, концевые сноски.
+    """
+    main = next((name for kind, name in _relationships(zf, PACKAGE_RELS, "")
+                 if kind == "officeDocument"), DEFAULT_MAIN_PART)
+    main_dir, main_name = posixpath.split(main)
+    related: dict[str, set[str]] = {}
+    for kind, name in _relationships(zf, posixpath.join(main_dir, "_rels", f"{main_name}.rels"), main_dir):
+        if name in zf.NameToInfo:
+            related.setdefault(kind, set()).add(name)
+    parts = [("document", main)]
+    for kind in ("header", "footer", "footnotes", "endnotes"):
+        parts.extend((kind, name) for name in sorted(related.get(kind, ()), key=_natural_key))
+    # Верхние колонтитулы — перед основным текстом
+    return sorted(parts, key=lambda part: part[0] != "header")
+
+
+def iter_part_paragraphs(stream: tp.BinaryIO) -> tp.Iterator[str]:
+    """
+    Абзацы одной XML-части по мере чтения через iterparse. Каждый разобранный
+    элемент сразу удаляется из родителя, поэтому в памяти только цепочка
+    открытых элементов, а не всё дерево. Строка таблицы выводится одной
+    строкой с ячейками через табуляцию; абзацы внутри ячейки — через пробел.
+    """
+    stack: list[ElementTree.Element] = []
+    paragraphs: list[list[str]] = []  # Открытые абзацы: в абзаце может быть текстовое поле со своими
+    cells: list[list[str]] = []
+    rows: list[list[str]] = []
+    ready: list[str] = []
+    ignored = 0  # Глубина внутри пропускаемого поддерева
+
+    def emit(text: str):
+        if cells:
+            cells[-1].append(text)
+        else:
+            ready.append(text)
+
+    for event, elem in ElementTree.iterparse(stream, events=("start", "end")):
+        namespace, tag = _split_tag(elem.tag)
+        if event == "start":
+            stack.append(elem)
+            if ignored:
+                ignored += 1
+            elif (namespace, tag) in SKIPPED or (
+                    tag in ("footnote", "endnote") and elem.get(f"{{{namespace}}}type") in SEPARATOR_NOTES):
+                ignored = 1
+            elif namespace in W_NAMESPACES:
+                if tag == "p":
+                    paragraphs.append([])
+                elif tag == "tc":
+                    cells.append([])
+                elif tag == "tr":
+                    rows.append([])
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if ignored:
+            ignored -= 1
+        elif namespace in W_NAMESPACES:
+            if tag == "t" and paragraphs:
+                paragraphs[-1].append(elem.text or "")
+            elif tag in RUN_CHARACTERS and paragraphs and parent is not None and _split_tag(parent.tag)[1] == "r":
+                # w:tab встречается и в описании позиций табуляции (w:pPr/w:tabs), там это не символ
+                paragraphs[-1].append(RUN_CHARACTERS[tag])
+            elif tag == "p" and paragraphs:
+                emit("".join(paragraphs.pop()))
+            elif tag == "tc" and cells:
+                cell = cells.pop()
+                if rows:
+                    rows[-1].append(" ".join(text for text in cell if text))
+            elif tag == "tr" and rows:
+                row = rows.pop()
+                if any(row):
+                    emit("\t".join(row))
+        if parent is not None:
+            parent.remove(elem)
+        if ready:
+            yield from ready
+            ready.clear()
+
+
+def iter_docx_paragraphs(path: Path) -> tp.Iterator[str]:
+    """
+    Текст .docx по абзацам без python-docx: части пакета читаются потоком
+    прямо из zip, см. docx_parts и iter_part_paragraphs.
+    Колонтитулы, повторяющиеся в нескольких разделах, выводятся один раз.
+    """
+    with zipfile.ZipFile(path) as zf:
+        parts = docx_parts(zf)
+        seen: set[tuple[str, ...]] = set()
+        for kind, name in parts:
+            # Без основной части это не документ Word: KeyError, как у отсутствующих частей zip
+            with zf.open(name) as stream:
+                paragraphs = iter_part_paragraphs(stream)
+                if kind not in ("header", "footer"):
+                    yield from paragraphs
+                    continue
+                text = tuple(paragraphs)
+                if any(text) and text not in seen:
+                    seen.add(text)
+                    yield from text
+
+
+__all__ = ["DOCX_ERRORS", "docx_parts", "iter_part_paragraphs", "iter_docx_paragraphs"]
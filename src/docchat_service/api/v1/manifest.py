@@ -0,0 +1,71 @@
+import os
+import threading
+import typing as tp
+from pathlib import Path
+
+import orjson
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+class ArchiveManifest:
+    """
+    Что было извлечено из архива при прошлой загрузке: id документа и для
+    каждого члена — его идентичность в архиве (CRC и размер из оглавления
+    zip/rar/7z, mtime и размер для tar) и путь сохранённого результата.
+    По нему повторная загрузка того же архива разбирает только новые
+    и изменённые члены. fingerprint — версия парсера и формат вывода:
+    при их смене прошлые результаты не переиспользуются.
+    """
+
+    def __init__(self, path: Path, document_id: tp.Optional[str], fingerprint: str,
+                 members: tp.Optional[dict[str, dict]] = None):
+        self.path = path
+        self.document_id = document_id
+        self.fingerprint = fingerprint
+        self.members: dict[str, dict] = members or {}
+
+    @classmethod
+    def load(cls, path: Path, fingerprint: str) -> tp.Optional["ArchiveManifest"]:
+        try:
+            data = orjson.loads(path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        if data.get("fingerprint") != fingerprint:
+            return None
+        return cls(path, data.get("document_id"), fingerprint, data.get("members", {}))
+
+    def save(self):
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(orjson.dumps({
+            "document_id": self.document_id,
+            "fingerprint": self.fingerprint,
+            "members": self.members,
+        }))
+        os.replace(tmp_path, self.path)
+
+
+def zip_identity(info) -> str:
+    return f"crc:{info.CRC:08x}:{info.file_size}"
+
+
+def tar_identity(member) -> str:
+    return f"mtime:{int(member.mtime)}:{member.size}"
+
+
+def rar_identity(info) -> str:
+    return f"crc:{info.CRC:08x}:{info.file_size}"
+
+
+def sevenzip_identity(entry) -> str:
+    return f"crc:{entry.crc32 or 0:08x}:{entry.uncompressed}"
+
+
+__all__ = [
+    "ArchiveManifest",
+    "MANIFEST_SUFFIX",
+    "zip_identity",
+    "tar_identity",
+    "rar_identity",
+    "sevenzip_identity",
+]
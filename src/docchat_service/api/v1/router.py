@@ -1,11 +1,26 @@
 # src/docchat_service/api/v1/router.py
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-from fastapi.responses import JSONResponse
-from .schemas import HealthCheck, DocumentUploadResponse, ChatResponse, ChatRequest
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from .schemas import (
+    HealthCheck, DocumentUploadResponse, BatchUploadResponse, ChatResponse, ChatRequest, ChatSource, JobResponse,
+)
 import uuid
 import time
-from .service import process_uploaded_file  # ← импортируем новую функцию
+import typing as tp
+import orjson
+from .service import (
+    process_uploaded_file, UploadTooLarge, save_upload, stream_uploaded_file, submit_upload_job,
+    save_upload_batch, process_upload_batch, stream_upload_batch, remove_temp_file, remove_batch_files,
+)
+from src.docchat_service.capabilities import capabilities_report, unavailable_extensions
+from src.docchat_service.config import APP_CONFIG
+from src.docchat_service.context import APP_CTX
+from src.docchat_service.jobs import JobQueueFull
+from src.docchat_service.workers import ParserPoolBusy
+
+logger = APP_CTX.get_logger()
 
 router = APIRouter(
     prefix="/api/v1",
@@ -29,26 +44,225 @@ async def upload(file: UploadFile = File(...)):
         result = await process_uploaded_file(file)
         return DocumentUploadResponse(
             document_id=result["document_id"],
-            message=result["message"]
+            message=result["message"],
+            chunks_created=result.get("chunks_created", 0)
         )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ParserPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка обработки файла: {str(e)}")
 
 
+@router.post("/upload/stream")
+async def upload_stream(file: UploadFile = File(...)):
+    """
+    Загружает файл и отдаёт результаты разбора потоком NDJSON: по записи
+    на член архива, страницу PDF или блок абзацев DOCX.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Файл не указан")
+
+    try:
+        APP_CTX.get_parser_pool().check_capacity()
+        temp_path, _ = await save_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ParserPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    # Генератор удаляет файл сам, но если клиент отключится до начала ответа, тело не читается вовсе
+    return StreamingResponse(
+        stream_uploaded_file(temp_path, file.filename, str(uuid.uuid4())),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(remove_temp_file, temp_path),
+    )
+
+
+async def save_batch(files: list[UploadFile]) -> list[dict]:
+    max_files = APP_CONFIG.upload.upload_batch_max_files
+    if not files:
+        raise HTTPException(status_code=400, detail="Файлы не указаны")
+    if len(files) > max_files:
+        raise HTTPException(status_code=413, detail=f"В пакете больше {max_files} файлов")
+    return await save_upload_batch(files)
+
+
+@router.post("/upload/batch", response_model=BatchUploadResponse, status_code=200)
+async def upload_batch(files: list[UploadFile] = File(...)):
+    """
+    Загружает несколько файлов одним запросом и обрабатывает их параллельно
+    (не больше UPLOAD_BATCH_CONCURRENCY одновременно). Ошибка одного файла
+    попадает в его запись results и не прерывает остальные.
+    """
+    return await process_upload_batch(await save_batch(files))
+
+
+@router.post("/upload/batch/stream")
+async def upload_batch_stream(files: list[UploadFile] = File(...)):
+    """
+    То же, что /upload/batch, но записи по файлам приходят потоком NDJSON
+    по мере готовности, последней — итоговая запись "done".
+    """
+    saved = await save_batch(files)
+    return StreamingResponse(stream_upload_batch(saved), media_type="application/x-ndjson",
+                             background=BackgroundTask(remove_batch_files, saved))
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """
+    Принимает файл в фоновую обработку и сразу возвращает задачу.
+    Состояние и прогресс — GET /api/v1/jobs/{job_id}.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Файл не указан")
+
+    try:
+        job = await submit_upload_job(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    job = APP_CTX.get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_dict()
+
+
+@router.get("/capabilities")
+async def capabilities():
+    """Какие необязательные парсеры установлены и загружены, какие форматы недоступны."""
+    return {
+        "capabilities": capabilities_report(),
+        "unavailable_extensions": sorted(unavailable_extensions()),
+    }
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    embedding_cache = APP_CTX.get_embedding_cache()
+    answer_cache = APP_CTX.get_answer_cache()
+    return {
+        "results": APP_CTX.get_result_cache().stats(),
+        "embeddings": embedding_cache.stats() if embedding_cache else {"enabled": False},
+        "sessions": APP_CTX.get_session_store().stats(),
+        "answers": answer_cache.stats() if answer_cache else {"enabled": False},
+    }
+
+
+async def answer_cache_bucket(mode: str, document_ids: list[str], history: list) -> tp.Optional[str]:
+    """Корзина кеша ответов; None — кеш не применяется (выключен или у сессии уже есть история)."""
+    answer_cache = APP_CTX.get_answer_cache()
+    if answer_cache is None or history:
+        return None
+    # Если индексы изменил другой воркер, refresh() сбросит кеш до поиска в нём
+    await APP_CTX.get_retriever().refresh()
+    return answer_cache.bucket(mode, document_ids)
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     start_time = time.time()
 
     mode_used = request.mode or "general"
     session_id = request.session_id or str(uuid.uuid4())
-    if request.message.lower() == "кто сейчас президент россии?":
-        simulated_response = "Владимир Путин является действующим президентом Российской Федерации (по состоянию на 2024 год)."
+    sessions = APP_CTX.get_session_store()
+    history = await sessions.get_history(session_id)
+    bucket = await answer_cache_bucket(mode_used, request.document_ids, history)
+    cached = await APP_CTX.get_answer_cache().get(request.message, bucket) if bucket else None
+    if cached is not None:
+        response, sources = cached.response, cached.sources
     else:
-        simulated_response = f"Это тестовый ответ в режиме '{mode_used}'. Ваш вопрос: '{request.message}'"
+        sources = await APP_CTX.get_retriever().retrieve(request.message, document_ids=request.document_ids)
+        response = await APP_CTX.get_generator().generate(request.message, mode_used, sources, history)
+        if bucket:
+            await APP_CTX.get_answer_cache().put(request.message, bucket, response, sources)
+    await sessions.append(session_id, "user", request.message)
+    await sessions.append(session_id, "assistant", response)
     elapsed = time.time() - start_time
-    print(f"⏱Chat response time: {elapsed:.2f} seconds")
+    logger.info("Chat response time: %.2f seconds", elapsed,
+                extra={"duration_ms": int(elapsed * 1000), "cached": cached is not None})
     return ChatResponse(
-        response=simulated_response,
+        response=response,
         session_id=session_id,
-        mode_used=mode_used
-    )
\ No newline at end of file
+        mode_used=mode_used,
+        sources=sources,
+        cached=cached is not None
+    )
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Ответ потоком Server-Sent Events: события "token" по мере генерации
+    и итоговое "done" с session_id, mode_used, источниками и таймингами.
+    При отключении клиента генерация прерывается.
+    """
+    start_time = time.perf_counter()
+    mode_used = request.mode or "general"
+    session_id = request.session_id or str(uuid.uuid4())
+    sessions = APP_CTX.get_session_store()
+    history = await sessions.get_history(session_id)
+    bucket = await answer_cache_bucket(mode_used, request.document_ids, history)
+    cached = await APP_CTX.get_answer_cache().get(request.message, bucket) if bucket else None
+    if cached is not None:
+        sources = cached.sources
+    else:
+        sources = await APP_CTX.get_retriever().retrieve(request.message, document_ids=request.document_ids)
+
+    async def cached_tokens():
+        yield cached.response
+
+    async def events():
+        first_token_at = None
+        parts = []
+        if cached is not None:
+            tokens = cached_tokens()
+        else:
+            tokens = APP_CTX.get_generator().stream(request.message, mode_used, sources, history)
+        try:
+            async for token in tokens:
+                if await http_request.is_disconnected():
+                    return
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+            # Оборванный ответ в историю и кеш не попадает
+            response = "".join(parts)
+            await sessions.append(session_id, "user", request.message)
+            await sessions.append(session_id, "assistant", response)
+            if bucket and cached is None:
+                await APP_CTX.get_answer_cache().put(request.message, bucket, response, sources)
+            total_ms = (time.perf_counter() - start_time) * 1000
+            ttft_ms = (first_token_at - start_time) * 1000 if first_token_at else total_ms
+            logger.info("Chat stream: first token %.0f ms, total %.0f ms", ttft_ms, total_ms,
+                        extra={"ttft_ms": round(ttft_ms, 1), "duration_ms": int(total_ms), "cached": cached is not None})
+            yield sse_event("done", {
+                "session_id": session_id,
+                "mode_used": mode_used,
+                "sources": [ChatSource(**hit).model_dump() for hit in sources],
+                "cached": cached is not None,
+                "ttft_ms": round(ttft_ms, 1),
+                "total_ms": round(total_ms, 1),
+            })
+        finally:
+            # Закрытие генератора отменяет генерацию выше по течению
+            await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
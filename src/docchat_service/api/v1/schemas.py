@@ -15,24 +15,75 @@ class DocumentUpload(BaseModel):
 
 class DocumentUploadResponse(BaseModel):
     document_id: str
-    message: str = "document upload succesfully"\
+    message: str = "document upload succesfully"
+    chunks_created: int = 0
+
+
+class BatchUploadItem(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    status: str  # ok | error
+    document_id: Optional[str] = None
+    message: Optional[str] = None
+    chunks_created: int = 0
+    cached: bool = False
+    status_code: int = 200
+    error: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    results: List[BatchUploadItem]
+    succeeded: int = 0
+    failed: int = 0
+
+
+class JobProgress(BaseModel):
+    processed: int = 0
+    total: Optional[int] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    filename: str
+    state: str
+    progress: JobProgress
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 
 class ChatRequest(BaseModel):
     message: str
     mode: str = "general"
     session_id: Optional[str] = None
+    document_ids: List[str] = []
+
+
+class ChatSource(BaseModel):
+    document_id: str
+    source: str
+    text: str
+    score: float
 
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     mode_used: str
+    sources: List[ChatSource] = []
+    cached: bool = False
 
 __all__ = [
     "HealthCheck",
     "DocumentUpload",
     "DocumentUploadResponse",
+    "BatchUploadItem",
+    "BatchUploadResponse",
+    "JobProgress",
+    "JobResponse",
     "ChatRequest",
+    "ChatSource",
     "ChatResponse"
 ]
\ No newline at end of file
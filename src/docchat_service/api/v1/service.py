@@ -1,70 +1,144 @@
 from fastapi import UploadFile
 import os
-import json
 import zipfile
 import tarfile
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import chardet
 import tempfile
 import uuid
+import asyncio
+import contextvars
+import functools
+import itertools
+import time
+import typing as tp
+
+import orjson
+import xxhash
+
+from src.docchat_service.budget import BudgetExceeded, ResourceBudget
+from src.docchat_service.capabilities import optional_import
+from src.docchat_service.config import APP_CONFIG
+from src.docchat_service.context import APP_CTX
+from src.docchat_service.jobs import Job, JobQueueFull
+from src.docchat_service.locks import FileLock
+from src.docchat_service.metrics import ARCHIVE_MEMBERS, BYTES_PROCESSED, EVENTS, STAGE_LATENCY
+from src.docchat_service.workers import ParserPoolBusy, get_pdf_page_pool
+from src.docchat_service.rag import split_document
+from .docx_reader import DOCX_ERRORS, iter_docx_paragraphs
+from .manifest import MANIFEST_SUFFIX, ArchiveManifest, rar_identity, sevenzip_identity, tar_identity, zip_identity
+from .writers import OutputWriter, make_writer
+
+logger = APP_CTX.get_logger()
 
 # Типы файлов
 TEXT_EXTENSIONS = {'.txt', '.rtf'}
 DOC_EXTENSIONS = {'.doc', '.docx'}
 PDF_EXTENSIONS = {'.pdf'}
 ARCHIVE_EXTENSIONS = {'.zip', '.tar', '.tar.gz', '.gz', '.rar', '.7z'}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | DOC_EXTENSIONS | PDF_EXTENSIONS | ARCHIVE_EXTENSIONS
 
-try:
-    import docx
-except ImportError:
-    docx = None
+COPY_BUFFER_SIZE = 1024 * 1024
+DOCX_BLOCK_PARAGRAPHS = 50
 
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
+# Меняется при любом изменении формата извлечённого текста — сбрасывает кеш результатов
+PARSER_VERSION = "4"
 
-try:
-    import fitz  # PyMuPDF
-except ImportError:
-    fitz = None
+# Содержимое члена архива, результат которого взят из прошлой загрузки без разбора
+REUSED = object()
+# Конец генератора записей в stream_uploaded_file
+STREAM_END = object()
+# Служебные поля записей членов архива, клиенту потока они не отдаются
+INTERNAL_RECORD_KEYS = ("replaced", "reused")
 
-try:
-    import rarfile
-except ImportError:
-    rarfile = None
 
-try:
-    import py7zr
-except ImportError:
-    py7zr = None
+def _extract_pdf_pages(path: str, start: int, stop: int) -> list:
+    """Текст страниц [start, stop). Выполняется в процессе пула со своим дескриптором fitz."""
+    fitz = optional_import("fitz")
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def pdf_page_records(pages: list) -> list:
+    """Постраничные записи с границами каждой страницы в склеенном тексте."""
+    records = []
+    offset = 0
+    for number, text in enumerate(pages, start=1):
+        records.append({"page": number, "text": text, "start": offset, "end": offset + len(text)})
+        offset += len(text)
+    return records
 
 
 class DocumentReader:
-    def __init__(self, output_dir="output_jsons"):
-        self.output_dir = Path(output_dir)
+    def __init__(self, output_dir=None, page_records: bool = None, writer: OutputWriter = None):
+        self.output_dir = Path(output_dir or APP_CONFIG.output.output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.writer = writer or make_writer(APP_CONFIG.output)
+        if page_records is None:
+            page_records = APP_CONFIG.parser.pdf_page_records
+        self.page_records = page_records
 
-    def read_file(self, file_path: str):
+    def read_file(self, file_path: str, name: str = None, progress=None, budget: ResourceBudget = None):
+        """
+        name — исходное имя файла, по нему называется папка с результатами архива.
+        progress(processed, total) вызывается после каждого члена архива; total
+        равен None, если число членов нельзя узнать без чтения всего архива.
+        budget — лимиты внешнего архива, если файл — его член; без него
+        архив получает собственный бюджет из настроек ARCHIVE_MAX_*.
+        """
         path = Path(file_path)
         ext = path.suffix.lower()
 
         if ext in TEXT_EXTENSIONS:
-            return self._read_text_file(path)
+            read, stage = self._read_text_file, "parse_text"
         elif ext in DOC_EXTENSIONS:
-            return self._read_doc_file(path)
+            read, stage = self._read_doc_file, "parse_doc"
         elif ext in PDF_EXTENSIONS:
-            return self._read_pdf_file(path)
+            read, stage = self._read_pdf_file, "parse_pdf"
         elif ext in ARCHIVE_EXTENSIONS:
-            return self._read_archive(path)
+            # Архив замеряется в _iter_archive_records, члены — каждый по своему формату
+            return self._read_archive(path, name, progress, budget)
         else:
             return f"Формат {ext} не поддерживается."
 
+        BYTES_PROCESSED.inc(path.stat().st_size, stage=stage)
+        with STAGE_LATENCY.time(stage=stage):
+            return read(path)
+
+    def iter_records(self, file_path: str, name: str = None, document_id: str = None):
+        """
+        Разбирает файл и отдаёт результат частями по мере готовности:
+        по записи на член архива, страницу PDF или блок абзацев DOCX.
+        Члены архива, как и в process(), сохраняются под блокировкой архива
+        и попадают в его манифест (см. streaming в _iter_archive_records).
+        Блокировка держится, пока генератор не закрыт, и привязана к потоку:
+        все next() и close() нужно вызывать из одного потока.
+        """
+        path = Path(file_path)
+        ext = path.suffix.lower()
+
+        if ext in ARCHIVE_EXTENSIONS:
+            name = name or path.name
+            with self.archive_lock(name).acquire():
+                manifest = self.load_manifest(name, document_id)
+                yield from self._iter_archive_records(path, name, manifest=manifest, streaming=True)
+        elif ext in PDF_EXTENSIONS and optional_import("fitz"):
+            for number, text in enumerate(self._iter_pdf_pages(path), start=1):
+                yield {"type": "page", "page": number, "text": text}
+        elif path.suffix.lower() == '.docx' and self._docx_supported():
+            for index, text in enumerate(self._iter_docx_blocks(path)):
+                yield {"type": "block", "index": index, "text": text}
+        else:
+            yield {"type": "document", "content": self.read_file(file_path, name)}
+
     def _read_text_file(self, path: Path):
         with open(path, 'rb') as f:
             raw_data = f.read()
-            encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'
+            with STAGE_LATENCY.time(stage="detect_encoding"):
+                encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'
         try:
             with open(path, 'r', encoding=encoding) as f:
                 return f.read()
@@ -75,140 +149,418 @@ class DocumentReader:
 
     def _read_doc_file(self, path: Path):
         if path.suffix.lower() == '.docx':
-            if not docx:
+            if not self._docx_supported():
                 return "Для .docx установите python-docx."
-            doc = docx.Document(str(path))
-            full_text = [p.text for p in doc.paragraphs]
-            return '\n'.join(full_text)
+            return '\n'.join(self._iter_docx_paragraphs(path))
         elif path.suffix.lower() == '.doc':
+            win32_client = optional_import("win32com.client")
+            if win32_client is None:
+                return "Для .doc установите pywin32: pip install pywin32"
             try:
-                import win32com.client
-                word = win32com.client.Dispatch("Word.Application")
+                word = win32_client.Dispatch("Word.Application")
                 doc = word.Documents.Open(str(path.resolve()))
                 text = doc.Range().Text
                 doc.Close()
                 word.Quit()
                 return text
-            except ImportError:
-                return "Для .doc установите pywin32: pip install pywin32"
             except Exception as e:
                 return f"Ошибка при чтении .doc: {e}"
         else:
             return f"Чтение .doc требует Win32 COM, не поддерживается в этой версии."
 
+    @staticmethod
+    def _docx_supported() -> bool:
+        return APP_CONFIG.parser.docx_parser == "stream" or optional_import("docx") is not None
+
+    def _iter_docx_paragraphs(self, path: Path):
+        """
+        Абзацы .docx, включая ячейки таблиц, колонтитулы и сноски, потоковым
+        разбором XML (docx_reader). Если пакет не читается ещё до первого абзаца,
+        файл разбирается python-docx — он отдаёт только абзацы основного текста.
+        """
+        if APP_CONFIG.parser.docx_parser == "stream":
+            paragraphs = iter_docx_paragraphs(path)
+            try:
+                first = next(paragraphs, None)
+            except DOCX_ERRORS as e:
+                if optional_import("docx") is None:
+                    raise
+                logger.warning("Потоковый разбор %s не удался (%s), читаем через python-docx", path.name, e)
+            else:
+                if first is not None:
+                    yield first
+                    yield from paragraphs
+                return
+        for paragraph in optional_import("docx").Document(str(path)).paragraphs:
+            yield paragraph.text
+
+    def _iter_docx_blocks(self, path: Path):
+        paragraphs = self._iter_docx_paragraphs(path)
+        while block := list(itertools.islice(paragraphs, DOCX_BLOCK_PARAGRAPHS)):
+            yield '\n'.join(block)
+
     def _read_pdf_file(self, path: Path):
-        if fitz:
-            doc = fitz.open(str(path))
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            return text
-        elif PyPDF2:
+        if optional_import("fitz"):
+            pages = list(self._iter_pdf_pages(path))
+        elif optional_import("PyPDF2"):
             with open(path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page in reader.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted
-                return text
+                reader = optional_import("PyPDF2").PdfReader(f)
+                pages = [page.extract_text() or "" for page in reader.pages]
         else:
             return "Для .pdf установите pymupdf или PyPDF2."
 
-    def _read_archive(self, path: Path):
-        archive_path = str(path)
-        extract_dir = f"extracted_{path.stem}"
-        os.makedirs(extract_dir, exist_ok=True)
+        if self.page_records:
+            return pdf_page_records(pages)
+        return "".join(pages)
+
+    def _iter_pdf_pages(self, path: Path):
+        """
+        Текст PDF по страницам. Длинные документы делятся на диапазоны страниц,
+        которые разбираются параллельно в процессном пуле; страницы отдаются
+        по порядку, как только готов их диапазон.
+        """
+        settings = APP_CONFIG.parser
+        with optional_import("fitz").open(str(path)) as doc:
+            page_count = doc.page_count
+            if page_count < settings.pdf_parallel_min_pages or settings.pdf_page_workers <= 1:
+                for page in doc:
+                    yield page.get_text()
+                return
+
+        workers = min(settings.pdf_page_workers, page_count)
+        step = -(-page_count // workers)
+        pool = get_pdf_page_pool(settings.pdf_page_workers, *APP_CTX.get_process_initializer())
+        futures = [
+            pool.submit(_extract_pdf_pages, str(path), start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def archive_output_dir(self, name: str) -> Path:
+        return self.output_dir / self._sanitize_filename(Path(name).stem)
+
+    def archive_location(self, name: str) -> Path:
+        """Куда сохраняются результаты членов архива: папка или файл-бандл."""
+        return self.writer.archive_location(self.archive_output_dir(name))
+
+    def archive_manifest_path(self, name: str) -> Path:
+        return self.output_dir / f"{self._sanitize_filename(Path(name).stem)}{MANIFEST_SUFFIX}"
+
+    def archive_lock(self, name: str) -> FileLock:
+        return FileLock(self.archive_manifest_path(name).with_suffix(".lock"))
 
-        archive_name = self._sanitize_filename(path.stem)
-        archive_output_dir = self.output_dir / archive_name
+    @property
+    def manifest_fingerprint(self) -> str:
+        return f"v{PARSER_VERSION}:{type(self.writer).__name__}:{getattr(self.writer, 'compression', 'none')}"
+
+    def load_manifest(self, name: str, document_id: str = None) -> ArchiveManifest:
+        """Манифест прошлой загрузки архива с тем же именем или пустой — для первой."""
+        path = self.archive_manifest_path(name)
+        manifest = ArchiveManifest.load(path, self.manifest_fingerprint)
+        if manifest is None:
+            return ArchiveManifest(path, document_id, self.manifest_fingerprint)
+        if manifest.document_id is None:
+            manifest.document_id = document_id
+        return manifest
+
+    def _read_archive(self, path: Path, name: str = None, progress=None, budget: ResourceBudget = None):
+        for record in self._iter_archive_records(path, name, progress, budget):
+            if record["type"] == "error":
+                return record["detail"]
+            if record["type"] == "aborted":
+                return f"Архив {name or path.name} обработан частично: {record['detail']}"
+        return f"Файлы из архива {name or path.name} сохранены в структуре: {self.archive_location(name or path.name)}"
+
+    def _iter_archive_records(self, path: Path, name: str = None, progress=None, budget: ResourceBudget = None,
+                              manifest: ArchiveManifest = None, streaming: bool = False):
+        """
+        Записи членов архива по мере разбора. Если архив верхнего уровня
+        (budget не передан) превышает лимиты, последней идёт запись "aborted"
+        с исчерпанным лимитом и расходом; уже разобранные члены сохранены.
+        Во вложенном архиве BudgetExceeded уходит наружу, к архиву верхнего уровня.
+
+        С manifest члены, идентичность которых не изменилась, не распаковываются
+        и не разбираются: их результат переносится из прошлой загрузки (запись
+        с reused=True и content=None). replaced=True — член был и раньше, его
+        прежние фрагменты надо убрать из индексов. После полного прохода
+        результаты исчезнувших членов удаляются (записи "removed"), а манифест
+        перезаписывается.
+
+        streaming=True — потоковая выдача без индексации: клиенту нужен текст
+        каждого члена, поэтому ничего не переиспользуется, а в манифест члены
+        попадают без идентичности и исчезнувшие не удаляются. Следующая обычная
+        загрузка разберёт их заново и уберёт из индексов устаревшие фрагменты.
+        """
+        root = budget is None
+        if root:
+            budget = ResourceBudget.from_settings(APP_CONFIG.limits)
+        kind = self._archive_kind(path)
+        if kind is None:
+            yield {"type": "error", "detail": f"Архив {path.suffix} не поддерживается."}
+            return
+        if kind == 'rar' and not optional_import("rarfile"):
+            yield {"type": "error", "detail": "Для .rar установите rarfile."}
+            return
+        if kind == '7z' and not optional_import("py7zr"):
+            yield {"type": "error", "detail": "Для .7z установите py7zr."}
+            return
+
+        archive_output_dir = self.archive_output_dir(name or path.name)
         try:
-            archive_output_dir.mkdir(parents=True, exist_ok=True)
+            sink = self.writer.archive_sink(archive_output_dir)
         except Exception as e:
-            print(f"Не удалось создать папку {archive_output_dir}: {e}")
-            return f"Не удалось создать папку для архива {path.name}"
+            logger.error("Не удалось создать папку %s: %s", archive_output_dir, e)
+            yield {"type": "error", "detail": f"Не удалось создать папку для архива {path.name}"}
+            return
+
+        total = self._count_archive_members(path, kind) if progress else None
+        processed = 0
+        started_at = time.perf_counter()
+        BYTES_PROCESSED.inc(path.stat().st_size, stage="parse_archive")
+
+        # Члены архива распаковываются по одному во временную папку запроса,
+        # которая удаляется вместе со всем содержимым после обработки
+        previous = manifest.members if manifest is not None else {}
+        current: dict[str, dict] = {}
+        complete = False
+
+        def reusable(rel_name: str, identity: str) -> bool:
+            entry = previous.get(rel_name)
+            if entry is None or entry["identity"] != identity or entry["output"] is None:
+                return False
+            return sink.can_reuse(rel_name, archive_output_dir / self._sanitize_filename(rel_name), entry["output"])
 
-        if path.suffix == '.zip':
-            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        with sink, tempfile.TemporaryDirectory(prefix="extract_", dir=APP_CONFIG.upload.upload_tmp_dir) as extract_dir:
+            try:
+                member_budget = budget.nested()
+                members = self._iter_archive_members(path, kind, Path(extract_dir), member_budget,
+                                                     reusable if previous and not streaming else None)
+                for rel_name, identity, content in self._parse_members(members, member_budget):
+                    base = archive_output_dir / self._sanitize_filename(rel_name)
+                    if content is REUSED:
+                        json_path = self._save(lambda: sink.reuse(rel_name, base, previous[rel_name]["output"]), base)
+                        record = {"type": "member", "name": rel_name, "json_path": json_path, "content": None,
+                                  "reused": True}
+                    else:
+                        json_path = self._save(lambda: sink.add(rel_name, base, content), base)
+                        record = {"type": "member", "name": rel_name, "json_path": json_path, "content": content,
+                                  "replaced": rel_name in previous}
+                    current[rel_name] = {"identity": None if streaming else identity, "output": json_path}
+                    yield record
+                    processed += 1
+                    if progress:
+                        progress(processed, total)
+                # Потоковый проход не считается полным: исчезнувшие члены остаются в манифесте до обычной загрузки
+                complete = not streaming
+                # Члены, которых больше нет в архиве: их результаты удаляются
+                for rel_name, entry in previous.items() if complete else ():
+                    if rel_name not in current:
+                        if entry["output"]:
+                            sink.remove(entry["output"])
+                        yield {"type": "removed", "name": rel_name}
+            except BudgetExceeded as e:
+                if not root:
+                    raise
+                EVENTS.inc(event="archive_budget_exceeded")
+                logger.warning("Разбор архива %s прерван: %s", name or path.name, e,
+                               extra={"limit": e.limit, "members": processed})
+                yield {"type": "aborted", "limit": e.limit, "detail": str(e),
+                       "processed": processed, "usage": budget.usage()}
+        if manifest is not None:
+            # После прерывания по лимитам недошедшие члены остаются в манифесте как были
+            manifest.members = current if complete else {**previous, **current}
+            try:
+                manifest.save()
+            except OSError as e:
+                logger.error("Не удалось сохранить манифест %s: %s", manifest.path, e)
+        elapsed = time.perf_counter() - started_at
+        STAGE_LATENCY.observe(elapsed, stage="parse_archive")
+        ARCHIVE_MEMBERS.observe(processed)
+        logger.info("Архив %s обработан: %d файлов за %.2f с", name or path.name, processed, elapsed,
+                    extra={"members": processed, "duration_ms": int(elapsed * 1000)})
+
+    @staticmethod
+    def _count_archive_members(path: Path, kind: str):
+        """Число поддерживаемых членов по оглавлению архива; для tar и 7z — None."""
+        if kind == 'zip':
+            with zipfile.ZipFile(path, 'r') as zip_ref:
+                infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+            return sum(Path(info.filename).suffix.lower() in SUPPORTED_EXTENSIONS for info in infos)
+        if kind == 'rar':
+            with optional_import("rarfile").RarFile(str(path)) as rar_ref:
+                infos = [info for info in rar_ref.infolist() if info.is_file()]
+            return sum(Path(info.filename).suffix.lower() in SUPPORTED_EXTENSIONS for info in infos)
+        return None
+
+    @staticmethod
+    def _archive_kind(path: Path):
+        name = path.name.lower()
+        if name.endswith('.tar.gz') or name.endswith('.tgz'):
+            return 'tar:gz'
+        return {'.zip': 'zip', '.tar': 'tar', '.rar': 'rar', '.7z': '7z'}.get(path.suffix.lower())
+
+    def _iter_archive_members(self, path: Path, kind: str, extract_dir: Path, budget: ResourceBudget,
+                              reusable=None):
+        """
+        Последовательно копирует поддерживаемые члены архива из открытого потока
+        во временную папку и отдаёт тройки (имя в архиве, идентичность, путь к копии).
+        Каждый член лежит в своей подпапке, поэтому одинаковые имена не конфликтуют.
+        Размеры из оглавления проверяются по budget до распаковки члена,
+        фактически распакованные байты — по ходу копирования.
+        Если reusable(имя, идентичность) истинно, член не распаковывается и путь равен None.
+        """
+        index = 0
+
+        def member_path(name: str) -> Path:
+            nonlocal index
+            index += 1
+            target_dir = extract_dir / f"{index:06d}"
+            target_dir.mkdir()
+            return target_dir / self._sanitize_filename(Path(name).name)
+
+        def copy_member(src, name: str) -> Path:
+            target = member_path(name)
+            with src, open(target, 'wb') as dst:
+                while True:
+                    chunk = src.read(COPY_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    budget.consume(len(chunk))
+                    dst.write(chunk)
+            return target
+
+        if kind == 'zip':
+            with zipfile.ZipFile(path, 'r') as zip_ref:
                 for info in zip_ref.infolist():
-                    original_name = info.filename
-                    if not info.is_dir():
-                        file_ext = Path(original_name).suffix.lower()
-                        if file_ext in (TEXT_EXTENSIONS | DOC_EXTENSIONS | PDF_EXTENSIONS | ARCHIVE_EXTENSIONS):
-                            decoded_name = self._decode_filename_safe(original_name)
-                            rel_path = self._sanitize_filename(decoded_name)
-                            json_path = archive_output_dir / rel_path
-                            json_path = json_path.with_suffix('.json')
-                            json_path.parent.mkdir(parents=True, exist_ok=True)
-
-                            zip_ref.extract(info, extract_dir)
-                            extracted_path = os.path.join(extract_dir, info.filename)
-                            content = self.read_file(extracted_path)
-                            self._save_json_with_path(json_path, content)
-                        else:
-                            print(f"Пропущен файл: {original_name} (неподдерживаемое расширение)")
-
-        elif path.suffix in ['.tar', '.tar.gz']:
-            mode = 'r:gz' if path.suffix == '.tar.gz' else 'r'
-            with tarfile.open(archive_path, mode) as tar_ref:
-                for member in tar_ref.getmembers():
-                    if member.isfile():
-                        file_ext = Path(member.name).suffix.lower()
-                        if file_ext in (TEXT_EXTENSIONS | DOC_EXTENSIONS | PDF_EXTENSIONS | ARCHIVE_EXTENSIONS):
-                            tar_ref.extract(member, extract_dir)
-                            rel_path = self._sanitize_filename(member.name)
-                            json_path = archive_output_dir / rel_path
-                            json_path = json_path.with_suffix('.json')
-                            json_path.parent.mkdir(parents=True, exist_ok=True)
-                            extracted_path = os.path.join(extract_dir, member.name)
-                            content = self.read_file(extracted_path)
-                            self._save_json_with_path(json_path, content)
-                        else:
-                            print(f"Пропущен файл: {member.name} (неподдерживаемое расширение)")
-
-        elif path.suffix == '.rar':
-            if not rarfile:
-                return "Для .rar установите rarfile."
-            with rarfile.RarFile(archive_path) as rar_ref:
+                    if info.is_dir():
+                        continue
+                    if Path(info.filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                        self._log_skipped(info.filename)
+                        continue
+                    decoded_name = self._decode_filename_safe(info.filename)
+                    identity = zip_identity(info)
+                    if reusable and reusable(decoded_name, identity):
+                        budget.check_time()
+                        yield decoded_name, identity, None
+                        continue
+                    budget.check_member(decoded_name, info.compress_size, info.file_size)
+                    yield decoded_name, identity, copy_member(zip_ref.open(info), decoded_name)
+
+        elif kind in ('tar', 'tar:gz'):
+            mode = 'r:gz' if kind == 'tar:gz' else 'r'
+            with tarfile.open(path, mode) as tar_ref:
+                for member in tar_ref:
+                    if not member.isfile():
+                        continue
+                    if Path(member.name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                        self._log_skipped(member.name)
+                        continue
+                    # Сжатие в tar.gz общее на весь поток, поэтому степень сжатия члена неизвестна
+                    identity = tar_identity(member)
+                    if reusable and reusable(member.name, identity):
+                        budget.check_time()
+                        yield member.name, identity, None
+                        continue
+                    budget.check_member(member.name, None, member.size)
+                    yield member.name, identity, copy_member(tar_ref.extractfile(member), member.name)
+
+        elif kind == 'rar':
+            with optional_import("rarfile").RarFile(str(path)) as rar_ref:
                 for info in rar_ref.infolist():
-                    if info.is_file():
-                        file_ext = Path(info.filename).suffix.lower()
-                        if file_ext in (TEXT_EXTENSIONS | DOC_EXTENSIONS | PDF_EXTENSIONS | ARCHIVE_EXTENSIONS):
-                            rar_ref.extract(info, extract_dir)
-                            rel_path = self._sanitize_filename(info.filename)
-                            json_path = archive_output_dir / rel_path
-                            json_path = json_path.with_suffix('.json')
-                            json_path.parent.mkdir(parents=True, exist_ok=True)
-                            extracted_path = os.path.join(extract_dir, info.filename)
-                            content = self.read_file(extracted_path)
-                            self._save_json_with_path(json_path, content)
-                        else:
-                            print(f"Пропущен файл: {info.filename} (неподдерживаемое расширение)")
-
-        elif path.suffix == '.7z':
-            if not py7zr:
-                return "Для .7z установите py7zr."
-            with py7zr.SevenZipFile(archive_path, mode='r') as szf:
-                szf.extractall(path=extract_dir)
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_ext = Path(file).suffix.lower()
-                    if file_ext in (TEXT_EXTENSIONS | DOC_EXTENSIONS | PDF_EXTENSIONS | ARCHIVE_EXTENSIONS):
-                        rel_path = os.path.relpath(file_path, extract_dir)
-                        safe_rel_path = self._sanitize_filename(rel_path)
-                        json_path = archive_output_dir / safe_rel_path
-                        json_path = json_path.with_suffix('.json')
-                        json_path.parent.mkdir(parents=True, exist_ok=True)
-                        content = self.read_file(file_path)
-                        self._save_json_with_path(json_path, content)
-                    else:
-                        print(f"Пропущен файл: {file} (неподдерживаемое расширение)")
+                    if not info.is_file():
+                        continue
+                    if Path(info.filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                        self._log_skipped(info.filename)
+                        continue
+                    identity = rar_identity(info)
+                    if reusable and reusable(info.filename, identity):
+                        budget.check_time()
+                        yield info.filename, identity, None
+                        continue
+                    budget.check_member(info.filename, info.compress_size, info.file_size)
+                    yield info.filename, identity, copy_member(rar_ref.open(info), info.filename)
 
-        else:
-            return f"Архив {path.suffix} не поддерживается."
+        elif kind == '7z':
+            # py7zr не умеет отдавать члены потоком, поэтому распаковываем целиком во временную папку
+            sevenzip_dir = extract_dir / "7z"
+            with optional_import("py7zr").SevenZipFile(path, mode='r') as szf:
+                # Лимиты проверяются по оглавлению до распаковки; в solid-архиве сжатый размер члена неизвестен
+                identities = {}
+                for entry in szf.list():
+                    if not entry.is_directory and Path(entry.filename).suffix.lower() in SUPPORTED_EXTENSIONS:
+                        budget.check_member(entry.filename, entry.compressed, entry.uncompressed)
+                        identities[Path(entry.filename).as_posix()] = sevenzip_identity(entry)
+                szf.extractall(path=sevenzip_dir)
+            for root, dirs, files in os.walk(sevenzip_dir):
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = Path(root) / file
+                    if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                        self._log_skipped(file)
+                        continue
+                    budget.consume(file_path.stat().st_size)
+                    rel_name = os.path.relpath(file_path, sevenzip_dir)
+                    identity = identities.get(Path(rel_name).as_posix(), "")
+                    # 7z распакован целиком, поэтому неизменённый член экономит только разбор
+                    if reusable and identity and reusable(rel_name, identity):
+                        yield rel_name, identity, None
+                        continue
+                    yield rel_name, identity, file_path
+
+    @staticmethod
+    def _log_skipped(member_name: str):
+        # В архиве могут быть тысячи таких файлов — сообщения ограничены по частоте
+        logger.info("Пропущен файл: %s (неподдерживаемое расширение)", member_name,
+                    extra={"rate_key": "archive_member_skipped"})
+
+    def _parse_members(self, members, budget: ResourceBudget):
+        """
+        Парсит члены архива в пуле потоков и отдаёт (имя, идентичность, содержимое)
+        в порядке архива; для члена без пути (результат переиспользуется) содержимое — REUSED.
+        Вперёд распаковывается не больше двух членов на поток, чтобы не занимать диск.
+        """
+        workers = max(1, APP_CONFIG.parser.archive_member_workers)
+
+        def done(item):
+            rel_name, identity, future = item
+            return rel_name, identity, REUSED if future is None else future.result()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive-member") as pool:
+            pending = deque()
+            try:
+                try:
+                    for rel_name, identity, member_path in members:
+                        future = None if member_path is None else pool.submit(self._read_member, member_path, budget)
+                        pending.append((rel_name, identity, future))
+                        if len(pending) >= workers * 2:
+                            yield done(pending.popleft())
+                except BudgetExceeded:
+                    # Уже распакованные члены укладываются в лимиты — дочитываем их в частичный результат
+                    while pending:
+                        yield done(pending.popleft())
+                    raise
+                while pending:
+                    yield done(pending.popleft())
+            finally:
+                # При прерывании (лимит, обрыв потока) ещё не начатые члены не разбираем
+                for _, _, future in pending:
+                    if future is not None:
+                        future.cancel()
 
-        return f"Файлы из архива {path.name} сохранены в структуре: {archive_output_dir}"
+    def _read_member(self, member_path: Path, budget: ResourceBudget):
+        try:
+            return self.read_file(str(member_path), budget=budget)
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            return f"Ошибка при чтении {member_path.name}: {e}"
+        finally:
+            member_path.unlink(missing_ok=True)
 
     def _decode_filename_safe(self, filename: str) -> str:
         try:
@@ -227,88 +579,507 @@ class DocumentReader:
         filename = re.sub(r'\s+', ' ', filename)
         return filename
 
-    def _save_json_with_path(self, json_path: Path, data):
+    def _save(self, write, base: Path):
+        """Выполняет запись writer-ом и возвращает путь результата (None при ошибке)."""
         try:
-            json_path.write_text(
-                json.dumps({"filename": json_path.name, "content": data}, ensure_ascii=False, indent=2),
-                encoding='utf-8'
-            )
-            print(f"Сохранено: {json_path}")
+            with STAGE_LATENCY.time(stage="output_write"):
+                json_path = write()
+            logger.debug("Сохранено: %s", json_path, extra={"rate_key": "output_saved"})
+            return str(json_path)
         except Exception as e:
-            print(f"Ошибка при сохранении {json_path}: {e}")
+            logger.error("Ошибка при сохранении %s: %s", base, e, exc_info=True,
+                         extra={"rate_key": "output_save_error"})
+            return None
 
-    def process_file(self, input_path: str, original_filename: str = None):
+    def process(self, input_path: str, original_filename: str = None, progress=None, on_document=None,
+                document_id: str = None) -> dict:
         """
-        Обрабатывает файл и сохраняет результат как JSON.
-        original_filename — имя файла, которое будет использовано для имени JSON.
+        Обрабатывает файл, сохраняет результат через self.writer и возвращает
+        его сводку из памяти, без повторного чтения с диска.
+        original_filename — имя файла, которое будет использовано для имени результата.
+        progress — см. read_file; для одиночного файла вызывается один раз в конце.
+        on_document(source, content) вызывается для документа или каждого разобранного члена архива.
+
+        Архив, который уже загружался под тем же именем, разбирается инкрементально
+        по манифесту: неизменённые члены не разбираются, их результаты остаются на месте,
+        а документ сохраняет прежний document_id (он возвращается в сводке).
+        Ключ "incremental" перечисляет переиспользованные, изменённые и удалённые члены —
+        по нему из индексов убираются устаревшие фрагменты.
         """
         path = Path(input_path)
         if original_filename is None:
             original_filename = path.name
 
-        content = self.read_file(input_path)
-
         if path.suffix.lower() in ARCHIVE_EXTENSIONS:
-            return content
+            # Манифест читается, сверяется с архивом и перезаписывается под блокировкой этого архива:
+            # иначе параллельные загрузки одного имени разберут всё заново и задвоят фрагменты
+            with self.archive_lock(original_filename).acquire():
+                location = self.archive_location(original_filename)
+                manifest = self.load_manifest(original_filename, document_id)
+                json_files = []
+                aborted = None
+                incremental = {"reused": 0, "changed": [], "removed": []}
+                records = self._iter_archive_records(path, original_filename, progress, manifest=manifest)
+                for record in records:
+                    if record["type"] == "error":
+                        return {"message": record["detail"], "is_archive": True,
+                                "document_id": manifest.document_id, "output_dir": str(location),
+                                "json_files": json_files}
+                    if record["type"] == "aborted":
+                        aborted = {key: record[key] for key in ("limit", "detail", "processed", "usage")}
+                        continue
+                    if record["type"] == "removed":
+                        incremental["removed"].append(record["name"])
+                        continue
+                    if record["json_path"]:
+                        json_files.append(str(Path(record["json_path"]).relative_to(self.output_dir)))
+                    if record.get("reused"):
+                        incremental["reused"] += 1
+                        continue
+                    if record["replaced"]:
+                        incremental["changed"].append(record["name"])
+                    # Результат вложенного архива — только сообщение о сохранении, не текст
+                    if on_document and Path(record["name"]).suffix.lower() not in ARCHIVE_EXTENSIONS:
+                        on_document(record["name"], record["content"])
+                result = {
+                    "message": f"Файлы из архива {original_filename} сохранены в структуре: {location}",
+                    "is_archive": True,
+                    "document_id": manifest.document_id,
+                    "output_dir": str(location),
+                    "json_files": json_files,
+                    "incremental": incremental,
+                }
+                if aborted is not None:
+                    result["message"] = (f"Архив {original_filename} обработан частично ({aborted['detail']}), "
+                                         f"результаты сохранены в структуре: {location}")
+                    result["aborted"] = aborted
+                return result
+
+        content = self.read_file(input_path, original_filename)
+        base = self.output_dir / Path(original_filename).name
+        json_path = self._save(lambda: self.writer.write(base, content), base)
+        if json_path is None:
+            raise Exception(f"Результат не был сохранён: {base}")
+        if on_document:
+            on_document(original_filename, content)
+        if progress:
+            progress(1, 1)
+        return {
+            "message": f"Файл {original_filename} сохранён как JSON: {json_path}",
+            "is_archive": False,
+            "document_id": document_id,
+            "output_path": str(json_path),
+            "content": {"filename": Path(json_path).name, "content": content},
+        }
+
+    def process_file(self, input_path: str, original_filename: str = None, progress=None):
+        """
+        Обрабатывает файл и сохраняет результат как JSON.
+        Возвращает текстовое сообщение; сводка целиком — в process().
+        """
+        return self.process(input_path, original_filename, progress)["message"]
 
-        json_path = self.output_dir / f"{Path(original_filename).stem}.json"
-        self._save_json_with_path(json_path, content)
-        return f"Файл {original_filename} сохранён как JSON: {json_path}"
+
+@functools.lru_cache(maxsize=1)
+def default_reader() -> DocumentReader:
+    """
+    DocumentReader с настройками из APP_CONFIG, один на процесс: без состояния
+    между вызовами, поэтому общий для потоков пула. Не создаётся (и не делает mkdir)
+    заново на каждый файл пакетной загрузки.
+    """
+    return DocumentReader()
+
+
+def process_local_file(temp_path: str, original_filename: str, document_id: str, progress=None) -> dict:
+    """
+    Синхронная часть обработки загрузки: парсинг, сохранение результата и сбор сводки.
+    При включённом INGEST_ENABLED текст здесь же нарезается на фрагменты (ключ "chunks").
+    Выполняется в пуле парсинга, поэтому должна быть функцией уровня модуля.
+    """
+    settings = APP_CONFIG.rag
+    documents = []
+    on_document = None
+    if settings.ingest_enabled:
+        def on_document(source, content):
+            documents.append((source, content))
+
+    result = default_reader().process(temp_path, original_filename, progress, on_document, document_id)
+    if settings.ingest_enabled:
+        # Повторно загруженный архив сохраняет прежний document_id — он известен только после разбора
+        document_id = result["document_id"]
+        result["chunks"] = [
+            chunk
+            for source, content in documents
+            for chunk in split_document(document_id, source, content, settings.chunk_size, settings.chunk_overlap)
+        ]
+    return result
+
+
+async def ingest_result(result: dict) -> dict:
+    """
+    Считает эмбеддинги фрагментов из результата process_local_file и
+    заменяет список фрагментов на их число (chunks_created).
+    Для повторно загруженного архива сначала убирает из индексов фрагменты
+    изменённых и удалённых членов.
+    """
+    chunks = result.pop("chunks", None)
+    if chunks is not None:
+        pipeline = APP_CTX.get_ingest_pipeline()
+        incremental = result.get("incremental")
+        if incremental and (incremental["changed"] or incremental["removed"]):
+            await pipeline.delete(result["document_id"], incremental["changed"] + incremental["removed"])
+        result["chunks_created"] = await pipeline.ingest(chunks)
+    return result
 
 
 # --- Функция для интеграции с FastAPI ---
+class UploadTooLarge(Exception):
+    """Загрузка превышает UPLOAD_MAX_BYTES."""
+
+
+def make_temp_file(suffix: str = "") -> tuple[int, str]:
+    tmp_dir = APP_CONFIG.upload.upload_tmp_dir
+    if tmp_dir:
+        Path(tmp_dir).mkdir(parents=True, exist_ok=True)
+    return tempfile.mkstemp(suffix=suffix, dir=tmp_dir)
+
+
+async def spool_upload(file: UploadFile, dest, hasher=None) -> int:
+    """
+    Копирует загрузку в открытый файл блоками по UPLOAD_CHUNK_SIZE.
+    Лимит размера проверяется по ходу копирования, hasher (если передан)
+    обновляется теми же блоками. Возвращает число записанных байт.
+    """
+    settings = APP_CONFIG.upload
+    if file.size is not None and file.size > settings.upload_max_bytes:
+        raise UploadTooLarge(f"Файл больше {settings.upload_max_bytes} байт")
+
+    total = 0
+    with STAGE_LATENCY.time(stage="upload_copy"):
+        while True:
+            chunk = await file.read(settings.upload_chunk_size)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > settings.upload_max_bytes:
+                raise UploadTooLarge(f"Файл больше {settings.upload_max_bytes} байт")
+            dest.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+    BYTES_PROCESSED.inc(total, stage="upload")
+    return total
+
+
+def result_cache_key(digest: str, filename: str) -> str:
+    # Расширение входит в ключ: одни и те же байты как .txt и как .zip разбираются по-разному.
+    # Имя файла — тоже: от него зависит, куда сохранён результат и что вернуть в ответе
+    suffix = re.sub(r'[^a-z0-9]', '', Path(filename).suffix.lower())
+    name = xxhash.xxh3_64_hexdigest(Path(filename).name.encode("utf-8"))
+    output = APP_CONFIG.output
+    # Результат, разобранный без индексации (или с другой нарезкой), не должен отменять индексацию при попадании
+    rag = APP_CONFIG.rag
+    ingest = f"i{rag.chunk_size}.{rag.chunk_overlap}" if rag.ingest_enabled else "i0"
+    return (f"{digest}-{name}-{suffix}-v{PARSER_VERSION}-{output.output_format}-{output.output_compression}"
+            f"-{ingest}")
+
+
+def result_cacheable(filename: str) -> bool:
+    """
+    Архивы в кеш результатов не попадают: их повторная загрузка идёт по манифесту
+    (неизменённые члены переиспользуются), а попадание в кеш вернуло бы сводку
+    прежней версии архива мимо манифеста, с результатами других членов на диске.
+    """
+    return Path(filename).suffix.lower() not in ARCHIVE_EXTENSIONS
+
+
+def outputs_exist(result: dict) -> bool:
+    """Сохранённый результат, на который ссылается закешированная сводка, всё ещё на диске."""
+    return "output_path" in result and Path(result["output_path"]).exists()
+
+
+async def get_cached_result(digest: str, filename: str) -> tp.Optional[dict]:
+    """
+    Сводка из кеша результатов или None. Запись, чьи сохранённые результаты
+    удалены с диска, считается промахом и удаляется: файл разбирается заново.
+    """
+    if not result_cacheable(filename):
+        return None
+    cache = APP_CTX.get_result_cache()
+    cache_key = result_cache_key(digest, filename)
+    cached = await asyncio.to_thread(cache.get, cache_key)
+    if cached is None:
+        return None
+    if not await asyncio.to_thread(outputs_exist, cached):
+        await asyncio.to_thread(cache.delete, cache_key)
+        return None
+    return {**cached, "cached": True}
+
+
+async def save_upload(file: UploadFile) -> tuple[str, str]:
+    """
+    Сохраняет загрузку во временный файл, попутно считая хеш содержимого.
+    Возвращает (путь к файлу, xxh3-хеш). Файл удаляет вызывающий.
+    """
+    temp_fd, temp_path = make_temp_file(suffix=Path(file.filename).suffix)
+    try:
+        hasher = xxhash.xxh3_128()
+        with os.fdopen(temp_fd, 'wb') as tmp:
+            await spool_upload(file, tmp, hasher)
+    except BaseException:
+        remove_temp_file(temp_path)
+        raise
+    return temp_path, hasher.hexdigest()
+
+
+def remove_temp_file(temp_path: str):
+    try:
+        os.unlink(temp_path)
+    except OSError:
+        pass  # Игнорируем, если уже удалён
+
+
 async def process_uploaded_file(file: UploadFile) -> dict:
     """
     Обрабатывает загруженный файл через DocumentReader.
+    Парсинг выполняется в пуле APP_CTX, event loop остаётся свободным.
     Возвращает результат в виде словаря.
     """
+    temp_path, digest = await save_upload(file)
+    return await process_saved_upload(temp_path, digest, file.filename)
+
+
+async def process_saved_upload(temp_path: str, digest: str, filename: str) -> dict:
+    """Обработка уже сохранённой загрузки (см. save_upload); временный файл удаляется."""
     document_id = str(uuid.uuid4())
-    temp_fd, temp_path = tempfile.mkstemp(suffix=Path(file.filename).suffix)
+    cache = APP_CTX.get_result_cache()
 
     try:
-        # Записываем содержимое файла во временный файл
-        content = await file.read()
-        with os.fdopen(temp_fd, 'wb') as tmp:
-            tmp.write(content)
+        # Тот же файл под тем же именем уже разбирали — отдаём сохранённый результат без парсинга
+        cached = await get_cached_result(digest, filename)
+        if cached is not None:
+            return cached
 
         # Обрабатываем
-        reader = DocumentReader(output_dir="output_jsons")
-        result_message = reader.process_file(temp_path, original_filename=file.filename)
-
-        # Определяем тип
-        is_archive = Path(file.filename).suffix.lower() in ARCHIVE_EXTENSIONS
-
-        if is_archive:
-            archive_name = reader._sanitize_filename(Path(file.filename).stem)
-            output_subdir = reader.output_dir / archive_name
-            json_files = []
-            if output_subdir.exists():
-                for json_file in output_subdir.rglob("*.json"):
-                    json_files.append(str(json_file.relative_to(reader.output_dir)))
-            return {
-                "document_id": document_id,
-                "message": result_message,
-                "is_archive": True,
-                "output_dir": str(output_subdir),
-                "json_files": json_files
-            }
-        else:
-            # Ищем JSON по оригинальному имени
-            json_path = reader.output_dir / f"{Path(file.filename).stem}.json"
-            if not json_path.exists():
-                raise Exception(f"JSON файл не был создан: {json_path}")
-
-            content = json_path.read_text(encoding='utf-8')
-            return {
-                "document_id": document_id,
-                "message": result_message,
-                "is_archive": False,
-                "content": json.loads(content)
-            }
+        result = await APP_CTX.get_parser_pool().run(
+            process_local_file, temp_path, filename, document_id
+        )
+        result = await ingest_result(result)
+        # Прерванный по лимитам разбор не кешируем: при других лимитах результат был бы полнее
+        if "aborted" not in result and result_cacheable(filename):
+            await asyncio.to_thread(cache.put, result_cache_key(digest, filename), result)
+        return result
 
     finally:
         # Удаляем временный файл
-        try:
-            os.unlink(temp_path)
-        except OSError:
-            pass  # Игнорируем, если уже удалён
\ No newline at end of file
+        remove_temp_file(temp_path)
+
+
+def batch_error(index: int, filename: str, status_code: int, error: str) -> dict:
+    return {"index": index, "filename": filename, "status": "error", "status_code": status_code, "error": error}
+
+
+async def save_upload_batch(files: list[UploadFile]) -> list[dict]:
+    """
+    Сохраняет файлы пакета во временные файлы до ответа: после него FastAPI
+    закрывает загрузки, а потоковый ответ обрабатывает их позже.
+    Файл, который не удалось сохранить, сразу становится записью об ошибке.
+    """
+    saved = []
+    try:
+        for index, file in enumerate(files):
+            if not file.filename:
+                saved.append(batch_error(index, file.filename, 400, "Файл не указан"))
+                continue
+            try:
+                temp_path, digest = await save_upload(file)
+            except UploadTooLarge as e:
+                saved.append(batch_error(index, file.filename, 413, str(e)))
+                continue
+            saved.append({"index": index, "filename": file.filename, "temp_path": temp_path, "digest": digest})
+    except BaseException:
+        remove_batch_files(saved)
+        raise
+    return saved
+
+
+def remove_batch_files(saved: list[dict]):
+    """Удаляет временные файлы пакета из save_upload_batch (повторный вызов безопасен)."""
+    for item in saved:
+        if "temp_path" in item:
+            remove_temp_file(item["temp_path"])
+
+
+async def process_batch_item(item: dict) -> dict:
+    """Обрабатывает один файл пакета; его ошибка возвращается записью и не затрагивает остальные."""
+    index, filename = item["index"], item["filename"]
+    try:
+        result = await process_saved_upload(item["temp_path"], item["digest"], filename)
+    except ParserPoolBusy as e:
+        return batch_error(index, filename, 503, str(e))
+    except Exception as e:
+        logger.error("Ошибка обработки %s из пакета: %s", filename, e, exc_info=True,
+                     extra={"rate_key": "batch_item_error"})
+        return batch_error(index, filename, 500, f"Ошибка обработки файла: {e}")
+    return {
+        "index": index,
+        "filename": filename,
+        "status": "ok",
+        "document_id": result["document_id"],
+        "message": result["message"],
+        "chunks_created": result.get("chunks_created", 0),
+        "cached": result.get("cached", False),
+    }
+
+
+async def iter_batch_results(saved: list[dict]):
+    """
+    Результаты пакета из save_upload_batch в порядке готовности.
+    Одновременно обрабатывается не больше UPLOAD_BATCH_CONCURRENCY файлов;
+    при обрыве незавершённые отменяются, а их временные файлы удаляются.
+    """
+    semaphore = asyncio.Semaphore(max(1, APP_CONFIG.upload.upload_batch_concurrency))
+
+    async def run(item: dict) -> dict:
+        async with semaphore:
+            return await process_batch_item(item)
+
+    tasks = [asyncio.create_task(run(item)) for item in saved if "temp_path" in item]
+    try:
+        for item in saved:
+            if "temp_path" not in item:
+                yield item
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        remove_batch_files(saved)
+
+
+async def process_upload_batch(saved: list[dict]) -> dict:
+    """Весь пакет одним ответом: записи в порядке файлов в запросе и счётчики."""
+    results = [item async for item in iter_batch_results(saved)]
+    results.sort(key=lambda item: item["index"])
+    succeeded = sum(item["status"] == "ok" for item in results)
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+async def stream_upload_batch(saved: list[dict]):
+    """NDJSON-поток пакета: запись на файл по мере готовности, последняя — итоговая "done"."""
+    succeeded = failed = 0
+    async for item in iter_batch_results(saved):
+        if item["status"] == "ok":
+            succeeded += 1
+        else:
+            failed += 1
+        yield orjson.dumps({"type": "file", **item}) + b"\n"
+    yield orjson.dumps({"type": "done", "succeeded": succeeded, "failed": failed}) + b"\n"
+
+
+async def submit_upload_job(file: UploadFile) -> Job:
+    """
+    Сохраняет загрузку и ставит её в очередь фоновой обработки.
+    Если результат уже есть в кеше, задача сразу создаётся завершённой.
+    """
+    jobs = APP_CTX.get_job_manager()
+    jobs.check_capacity()
+    temp_path, digest = await save_upload(file)
+    job = Job(filename=file.filename, path=temp_path, digest=digest)
+
+    cached = await get_cached_result(digest, file.filename)
+    if cached is not None:
+        remove_temp_file(temp_path)
+        return jobs.add_finished(job, job_result(cached))
+
+    try:
+        return jobs.submit(job)
+    except JobQueueFull:
+        remove_temp_file(temp_path)
+        raise
+
+
+def job_result(result: dict) -> dict:
+    """
+    Итог задачи без извлечённого текста: задача хранится в истории, пишется
+    на диск и отдаётся на каждый опрос статуса. Сам текст лежит по output_path
+    (для архива — в output_dir, членов там "files").
+    """
+    summary = {
+        "document_id": result["document_id"],
+        "message": result["message"],
+        "chunks_created": result.get("chunks_created", 0),
+    }
+    if result.get("is_archive"):
+        summary["output_dir"] = result["output_dir"]
+        summary["files"] = len(result.get("json_files", ()))
+    else:
+        summary["output_path"] = result.get("output_path")
+    for key in ("cached", "aborted"):
+        if key in result:
+            summary[key] = result[key]
+    return summary
+
+
+async def run_upload_job(job: Job) -> dict:
+    """Обработчик JobManager: разбирает сохранённый файл задачи в пуле парсинга."""
+    pool = APP_CTX.get_parser_pool()
+    # Колбэк прогресса не переживёт передачу в другой процесс — там прогресс виден только в конце
+    progress = job.set_progress if pool.kind == "thread" else None
+    try:
+        result = await pool.run(process_local_file, job.path, job.filename, job.id, progress)
+        result = await ingest_result(result)
+        if "aborted" not in result and result_cacheable(job.filename):
+            await asyncio.to_thread(
+                APP_CTX.get_result_cache().put, result_cache_key(job.digest, job.filename), result
+            )
+        return job_result(result)
+    finally:
+        remove_temp_file(job.path)
+
+
+async def stream_uploaded_file(temp_path: str, original_filename: str, document_id: str):
+    """
+    NDJSON-поток результатов разбора уже сохранённой загрузки.
+    Записи приходят по мере готовности, последняя — итоговая запись "done".
+    Генератор записей продвигается по одному next() в отдельном потоке этого
+    потока записей: архив разбирается под блокировкой, привязанной к потоку,
+    поэтому и close() выполняется там же. При обрыве соединения текущий next()
+    дорабатывает, после чего генератор закрывается (удаляет распакованные члены,
+    закрывает архив, снимает блокировку) и только затем освобождается слот пула
+    и удаляется временный файл.
+    """
+    pool = APP_CTX.get_parser_pool()
+    records = default_reader().iter_records(temp_path, original_filename, document_id)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream")
+
+    def in_stream_thread(func, *args) -> asyncio.Future:
+        # Как asyncio.to_thread: контекст запроса (trace_id для логов) переходит в поток
+        return loop.run_in_executor(executor, functools.partial(contextvars.copy_context().run, func, *args))
+
+    count = 0
+    try:
+        async with pool.slot():
+            step = None
+            try:
+                while True:
+                    step = in_stream_thread(next, records, STREAM_END)
+                    # shield: отмена запроса не должна отменять ожидание next() — поток всё равно его доделает
+                    record = await asyncio.shield(step)
+                    if record is STREAM_END:
+                        break
+                    record = {key: value for key, value in record.items() if key not in INTERNAL_RECORD_KEYS}
+                    yield orjson.dumps({"document_id": document_id, "seq": count, **record}) + b"\n"
+                    count += 1
+            except Exception as e:
+                yield orjson.dumps({"document_id": document_id, "type": "error", "detail": str(e)}) + b"\n"
+            finally:
+                if step is not None and not step.done():
+                    # Закрыть генератор, пока в потоке выполняется его next(), нельзя (ValueError)
+                    await asyncio.wait({step})
+                await in_stream_thread(records.close)
+        yield orjson.dumps({"document_id": document_id, "type": "done", "records": count}) + b"\n"
+    finally:
+        executor.shutdown(wait=False)
+        remove_temp_file(temp_path)
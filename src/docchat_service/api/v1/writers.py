@@ -0,0 +1,242 @@
+import json
+import os
+import struct
+import threading
+import typing as tp
+from pathlib import Path
+
+import orjson
+import zstandard
+
+from src.docchat_service.config import OutputSettings
+
+BUNDLE_MAGIC = b"DCB1"
+# Хвост бандла: смещение индекса (uint64 LE) и сигнатура
+BUNDLE_FOOTER = struct.Struct("<Q4s")
+
+
+class OutputWriter:
+    """Сохраняет результат извлечения отдельным файлом на каждый документ."""
+
+    suffix = ".json"
+
+    def encode(self, record: dict) -> bytes:
+        raise NotImplementedError
+
+    def output_path(self, base: Path) -> Path:
+        return base.with_suffix(self.suffix)
+
+    def write(self, base: Path, content) -> Path:
+        path = self.output_path(base)
+        # Через временный файл: тот же документ может одновременно писать другой воркер
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(self.encode({"filename": path.name, "content": content}))
+        os.replace(tmp_path, path)
+        return path
+
+    def archive_location(self, archive_dir: Path) -> Path:
+        return archive_dir
+
+    def archive_sink(self, archive_dir: Path) -> "ArchiveSink":
+        return FileSink(self, archive_dir)
+
+
+class PrettyJsonWriter(OutputWriter):
+    """Прежний формат: stdlib json с отступами, читается глазами."""
+
+    def encode(self, record: dict) -> bytes:
+        return json.dumps(record, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+class OrjsonWriter(OutputWriter):
+    """Компактный orjson, при compression="zstd" — ещё и сжатый (*.json.zst)."""
+
+    def __init__(self, compression: str = "none", level: int = 3):
+        self.compression = compression
+        self.level = level
+        self.suffix = ".json.zst" if compression == "zstd" else ".json"
+
+    def encode(self, record: dict) -> bytes:
+        data = orjson.dumps(record)
+        if self.compression == "zstd":
+            # ZstdCompressor не потокобезопасен, а писатель общий для потоков пула
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return data
+
+
+class BundleWriter(OrjsonWriter):
+    """Одиночные документы пишет как OrjsonWriter, архив — одним файлом с индексом."""
+
+    def archive_location(self, archive_dir: Path) -> Path:
+        return archive_dir.parent / f"{archive_dir.name}.bundle"
+
+    def archive_sink(self, archive_dir: Path) -> "ArchiveSink":
+        return BundleSink(self, self.archive_location(archive_dir))
+
+
+class ArchiveSink:
+    """Приёмник результатов членов одного архива."""
+
+    location: Path
+
+    def add(self, name: str, base: Path, content) -> str:
+        raise NotImplementedError
+
+    def can_reuse(self, name: str, base: Path, previous: str) -> bool:
+        """Можно ли взять результат члена из прошлой загрузки (previous — его путь) без разбора."""
+        return False
+
+    def reuse(self, name: str, base: Path, previous: str) -> str:
+        raise NotImplementedError
+
+    def remove(self, previous: str):
+        """Удаляет результат члена, которого больше нет в архиве."""
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class FileSink(ArchiveSink):
+    def __init__(self, writer: OutputWriter, archive_dir: Path):
+        self._writer = writer
+        self.location = archive_dir
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+    def add(self, name: str, base: Path, content) -> str:
+        base.parent.mkdir(parents=True, exist_ok=True)
+        return str(self._writer.write(base, content))
+
+    def can_reuse(self, name: str, base: Path, previous: str) -> bool:
+        # Файл прошлого результата остаётся на месте, если путь и формат не менялись
+        return previous == str(self._writer.output_path(base)) and Path(previous).exists()
+
+    def reuse(self, name: str, base: Path, previous: str) -> str:
+        return previous
+
+    def remove(self, previous: str):
+        Path(previous).unlink(missing_ok=True)
+
+
+class BundleSink(ArchiveSink):
+    """
+    Все члены архива в одном файле: подряд идут закодированные записи,
+    за ними JSON-индекс [{name, offset, length}] и BUNDLE_FOOTER.
+    Файл появляется под итоговым именем только после close(), поэтому
+    неизменённые члены копируются байтами из прежнего бандла без перекодирования.
+    """
+
+    def __init__(self, writer: OutputWriter, path: Path):
+        self._writer = writer
+        self.location = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._index: list[dict] = []
+        self._previous: dict[str, dict] = {}
+        self._previous_file = None
+        try:
+            index = read_bundle_index(path)
+            if index["compression"] == writer.compression:
+                self._previous = {entry["name"]: entry for entry in index["members"]}
+        except (OSError, ValueError):
+            pass
+
+    def add(self, name: str, base: Path, content) -> str:
+        data = self._writer.encode({"filename": name, "content": content})
+        self._index.append({"name": name, "offset": self._file.tell(), "length": len(data)})
+        self._file.write(data)
+        return f"{self.location}#{name}"
+
+    def can_reuse(self, name: str, base: Path, previous: str) -> bool:
+        return name in self._previous
+
+    def reuse(self, name: str, base: Path, previous: str) -> str:
+        entry = self._previous[name]
+        if self._previous_file is None:
+            self._previous_file = open(self.location, "rb")
+        self._previous_file.seek(entry["offset"])
+        self._index.append({"name": name, "offset": self._file.tell(), "length": entry["length"]})
+        self._file.write(self._previous_file.read(entry["length"]))
+        return f"{self.location}#{name}"
+
+    def _close_previous(self):
+        if self._previous_file is not None:
+            self._previous_file.close()
+            self._previous_file = None
+
+    def close(self):
+        self._close_previous()
+        index_offset = self._file.tell()
+        self._file.write(orjson.dumps({"compression": self._writer.compression, "members": self._index}))
+        self._file.write(BUNDLE_FOOTER.pack(index_offset, BUNDLE_MAGIC))
+        self._file.close()
+        os.replace(self._tmp_path, self.location)
+
+    def abort(self):
+        self._close_previous()
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def read_bundle_index(path: Path) -> dict:
+    with open(path, "rb") as f:
+        f.seek(-BUNDLE_FOOTER.size, os.SEEK_END)
+        footer_offset = f.tell()
+        index_offset, magic = BUNDLE_FOOTER.unpack(f.read(BUNDLE_FOOTER.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} не является бандлом результатов")
+        f.seek(index_offset)
+        return orjson.loads(f.read(footer_offset - index_offset))
+
+
+def read_bundle_member(path: Path, name: str) -> tp.Optional[dict]:
+    index = read_bundle_index(path)
+    for entry in index["members"]:
+        if entry["name"] == name:
+            with open(path, "rb") as f:
+                f.seek(entry["offset"])
+                data = f.read(entry["length"])
+            if index["compression"] == "zstd":
+                data = zstandard.ZstdDecompressor().decompress(data)
+            return orjson.loads(data)
+    return None
+
+
+def read_output(path: Path) -> dict:
+    """Читает файл результата любого из форматов OutputWriter."""
+    data = Path(path).read_bytes()
+    if str(path).endswith(".zst"):
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return orjson.loads(data)
+
+
+def make_writer(settings: OutputSettings) -> OutputWriter:
+    if settings.output_format == "json":
+        return PrettyJsonWriter()
+    if settings.output_format == "bundle":
+        return BundleWriter(settings.output_compression, settings.output_zstd_level)
+    return OrjsonWriter(settings.output_compression, settings.output_zstd_level)
+
+
+__all__ = [
+    "OutputWriter",
+    "PrettyJsonWriter",
+    "OrjsonWriter",
+    "BundleWriter",
+    "make_writer",
+    "read_bundle_index",
+    "read_bundle_member",
+    "read_output",
+]
@@ -0,0 +1,133 @@
+import threading
+import time
+import typing as tp
+
+from src.docchat_service.config import LimitSettings
+
+# Меньшие члены не проверяются по степени сжатия: короткий текст законно жмётся в сотни раз
+RATIO_MIN_BYTES = 1024 * 1024
+
+
+class BudgetExceeded(Exception):
+    """Разбор архива превысил лимит; limit — имя исчерпанного ресурса."""
+
+    def __init__(self, limit: str, detail: str):
+        super().__init__(detail)
+        self.limit = limit
+
+
+class _Usage:
+    """Счётчики, общие для всех уровней вложенности одного запроса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.members = 0
+        self.started_at = time.monotonic()
+        self.exceeded: tp.Optional[BudgetExceeded] = None
+
+
+class ResourceBudget:
+    """
+    Лимиты на разбор одной загрузки: распакованные байты, число членов,
+    глубина вложенности архивов, время и степень сжатия члена.
+    Передаётся по цепочке вызовов DocumentReader; вложенный архив получает
+    nested() — те же счётчики, но глубина на единицу больше. Члены архива
+    разбираются в нескольких потоках, поэтому счётчики под блокировкой.
+    После первого превышения любая следующая проверка сразу падает тем же
+    исключением, чтобы параллельные члены не продолжали работу.
+    """
+
+    def __init__(self, max_bytes: int, max_members: int, max_depth: int, max_seconds: float,
+                 max_ratio: float, depth: int = 0, usage: tp.Optional[_Usage] = None):
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.max_depth = max_depth
+        self.max_seconds = max_seconds
+        self.max_ratio = max_ratio
+        self.depth = depth
+        self._usage = usage or _Usage()
+
+    @classmethod
+    def from_settings(cls, settings: LimitSettings) -> "ResourceBudget":
+        return cls(
+            max_bytes=settings.archive_max_bytes,
+            max_members=settings.archive_max_members,
+            max_depth=settings.archive_max_depth,
+            max_seconds=settings.archive_max_seconds,
+            max_ratio=settings.archive_max_ratio,
+        )
+
+    def _fail(self, limit: str, detail: str):
+        with self._usage.lock:
+            if self._usage.exceeded is None:
+                self._usage.exceeded = BudgetExceeded(limit, detail)
+            raise self._usage.exceeded
+
+    def _check_exceeded(self):
+        if self._usage.exceeded is not None:
+            raise self._usage.exceeded
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._usage.started_at
+
+    def nested(self) -> "ResourceBudget":
+        """Бюджет для архива на следующем уровне вложенности."""
+        self._check_exceeded()
+        if self.depth + 1 > self.max_depth:
+            self._fail("depth", f"Вложенность архивов больше {self.max_depth}")
+        return ResourceBudget(self.max_bytes, self.max_members, self.max_depth, self.max_seconds,
+                              self.max_ratio, self.depth + 1, self._usage)
+
+    def check_time(self):
+        self._check_exceeded()
+        if self.elapsed > self.max_seconds:
+            self._fail("seconds", f"Разбор архива дольше {self.max_seconds:g} с")
+
+    def check_member(self, name: str, compressed: tp.Optional[int] = None, size: tp.Optional[int] = None):
+        """
+        Вызывается до распаковки члена: считает его и проверяет заявленные
+        в оглавлении размеры (если формат их даёт), чтобы не начинать
+        заведомо лишнюю распаковку.
+        """
+        self.check_time()
+        with self._usage.lock:
+            self._usage.members += 1
+            members, used = self._usage.members, self._usage.bytes
+        if members > self.max_members:
+            self._fail("members", f"В архиве больше {self.max_members} файлов")
+        if size is None:
+            return
+        if used + size > self.max_bytes:
+            self._fail("bytes", f"Распакованные данные превысят {self.max_bytes} байт ({name})")
+        if size >= RATIO_MIN_BYTES and compressed is not None and size > compressed * self.max_ratio:
+            self._fail("ratio", f"Степень сжатия {name} больше {self.max_ratio:g}:1")
+
+    def consume(self, size: int):
+        """Учитывает фактически распакованные байты; вызывается по ходу копирования."""
+        self._check_exceeded()
+        with self._usage.lock:
+            self._usage.bytes += size
+            used = self._usage.bytes
+        if used > self.max_bytes:
+            self._fail("bytes", f"Распаковано больше {self.max_bytes} байт")
+        self.check_time()
+
+    def usage(self) -> dict:
+        with self._usage.lock:
+            return {
+                "bytes": self._usage.bytes,
+                "members": self._usage.members,
+                "seconds": round(self.elapsed, 3),
+                "limits": {
+                    "bytes": self.max_bytes,
+                    "members": self.max_members,
+                    "depth": self.max_depth,
+                    "seconds": self.max_seconds,
+                    "ratio": self.max_ratio,
+                },
+            }
+
+
+__all__ = ["BudgetExceeded", "ResourceBudget", "RATIO_MIN_BYTES"]
@@ -0,0 +1,112 @@
+import importlib
+import importlib.util
+import threading
+import time
+import typing as tp
+from dataclasses import dataclass
+from types import ModuleType
+
+
+@dataclass(frozen=True)
+class Capability:
+    module: str
+    package: str  # Что ставить через pip
+    extensions: tuple[str, ...]
+    description: str
+
+
+# Необязательные зависимости: импортируются при первом обращении, а не при старте
+CAPABILITIES: dict[str, Capability] = {
+    # .docx разбирается и без него (см. api.v1.docx_reader), поэтому расширение за ним не числится
+    "docx": Capability("docx", "python-docx", (), "Word .docx через python-docx (запасной)"),
+    "fitz": Capability("fitz", "pymupdf", (".pdf",), "PDF через PyMuPDF (основной)"),
+    "PyPDF2": Capability("PyPDF2", "PyPDF2", (".pdf",), "PDF через PyPDF2 (запасной)"),
+    "rarfile": Capability("rarfile", "rarfile", (".rar",), "RAR-архивы"),
+    "py7zr": Capability("py7zr", "py7zr", (".7z",), "7z-архивы"),
+    "win32com.client": Capability("win32com.client", "pywin32", (".doc",), "Word .doc через COM (Windows)"),
+    "langchain_ollama": Capability("langchain_ollama", "langchain-ollama", (), "Ollama: эмбеддинги и чат"),
+}
+
+# Что прогревает warm_up() по умолчанию: парсеры форматов, без LangChain
+PARSER_CAPABILITIES = ("docx", "fitz", "PyPDF2", "rarfile", "py7zr")
+
+_modules: dict[str, tp.Optional[ModuleType]] = {}
+_import_seconds: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def optional_import(name: str) -> tp.Optional[ModuleType]:
+    """Модуль из реестра или None, если он не установлен. Результат запоминается."""
+    try:
+        return _modules[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _modules:
+            started = time.perf_counter()
+            try:
+                _modules[name] = importlib.import_module(CAPABILITIES[name].module)
+            except ImportError:
+                _modules[name] = None
+            _import_seconds[name] = time.perf_counter() - started
+    return _modules[name]
+
+
+def require(name: str) -> ModuleType:
+    """Как optional_import, но без модуля — ImportError с подсказкой, что установить."""
+    module = optional_import(name)
+    if module is None:
+        raise ImportError(f"Для «{CAPABILITIES[name].description}» установите {CAPABILITIES[name].package}")
+    return module
+
+
+def is_installed(name: str) -> bool:
+    """Проверка без импорта самого модуля (импортируются только родительские пакеты)."""
+    if name in _modules:
+        return _modules[name] is not None
+    try:
+        return importlib.util.find_spec(CAPABILITIES[name].module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def warm_up(names: tp.Optional[tp.Iterable[str]] = None) -> dict[str, bool]:
+    """Импортирует установленные модули заранее, чтобы первый запрос не платил за импорт."""
+    return {name: optional_import(name) is not None for name in (names or PARSER_CAPABILITIES) if is_installed(name)}
+
+
+def capabilities_report() -> dict:
+    """Что установлено, что уже загружено и какие расширения этим покрыты."""
+    report = {}
+    for name, capability in CAPABILITIES.items():
+        report[name] = {
+            "package": capability.package,
+            "description": capability.description,
+            "extensions": list(capability.extensions),
+            "installed": is_installed(name),
+            "loaded": _modules.get(name) is not None,
+            "import_ms": round(_import_seconds[name] * 1000, 1) if name in _import_seconds else None,
+        }
+    return report
+
+
+def unavailable_extensions() -> set[str]:
+    """Расширения, для которых не установлен ни один модуль."""
+    covered: dict[str, bool] = {}
+    for name, capability in CAPABILITIES.items():
+        for extension in capability.extensions:
+            covered[extension] = covered.get(extension, False) or is_installed(name)
+    return {extension for extension, ok in covered.items() if not ok}
+
+
+__all__ = [
+    "Capability",
+    "CAPABILITIES",
+    "PARSER_CAPABILITIES",
+    "optional_import",
+    "require",
+    "is_installed",
+    "warm_up",
+    "capabilities_report",
+    "unavailable_extensions",
+]
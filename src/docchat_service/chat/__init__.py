@@ -0,0 +1,15 @@
+from .answer_cache import AnswerCache, CachedAnswer, normalize_message
+from .generation import AnswerGenerator, FakeGenerator, OllamaGenerator, make_generator
+from .sessions import SessionSpill, SessionStore
+
+__all__ = [
+    "AnswerCache",
+    "CachedAnswer",
+    "normalize_message",
+    "AnswerGenerator",
+    "FakeGenerator",
+    "OllamaGenerator",
+    "make_generator",
+    "SessionSpill",
+    "SessionStore",
+]
@@ -0,0 +1,158 @@
+import time
+import typing as tp
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import xxhash
+
+from src.docchat_service.rag import EmbeddingBackend
+from src.docchat_service.rag.vector_index import normalize
+
+TRAILING_PUNCTUATION = "?!.,;: "
+
+
+def normalize_message(message: str) -> str:
+    """Регистр, ё/е, пробелы и завершающая пунктуация на ответ не влияют."""
+    text = unicodedata.normalize("NFC", message).casefold().replace("ё", "е")
+    return " ".join(text.split()).rstrip(TRAILING_PUNCTUATION)
+
+
+@dataclass
+class CachedAnswer:
+    response: str
+    sources: list[dict]
+    created_at: float
+    bucket: str
+    row: int = -1
+
+
+class AnswerCache:
+    """
+    Кеш ответов чата: LRU на max_items записей со сроком жизни ttl секунд.
+    Ключ — нормализованный вопрос, режим и «корзина»: набор документов
+    в области поиска вместе с их поколениями. Индексация документа увеличивает
+    его поколение (и общее — для вопросов по всем документам), поэтому старые
+    ответы перестают находиться и вытесняются сами.
+    При similarity > 0 вопрос без точного совпадения сравнивается
+    по эмбеддингу с вопросами из той же корзины.
+    """
+
+    def __init__(self, max_items: int = 1024, ttl: float = 3600,
+                 backend: tp.Optional[EmbeddingBackend] = None, similarity: float = 0.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.backend = backend if similarity > 0 else None
+        self.similarity = similarity
+        self._entries: tp.OrderedDict[str, CachedAnswer] = OrderedDict()
+        self._generation = 0
+        self._document_generations: dict[str, int] = {}
+        # Эмбеддинги вопросов: строка матрицы на запись, свободные строки переиспользуются
+        self._vectors: tp.Optional[np.ndarray] = None
+        self._row_buckets: list[tp.Optional[str]] = []
+        self._row_keys: list[tp.Optional[str]] = []
+        self._free_rows: list[int] = []
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def bucket(self, mode: str, document_ids: tp.Sequence[str]) -> str:
+        if not document_ids:
+            return f"{mode}\0*:{self._generation}"
+        scope = ",".join(f"{d}:{self._document_generations.get(d, 0)}" for d in sorted(set(document_ids)))
+        return f"{mode}\0{scope}"
+
+    @staticmethod
+    def key(message: str, bucket: str) -> str:
+        return xxhash.xxh3_128_hexdigest(f"{bucket}\0{normalize_message(message)}".encode("utf-8"))
+
+    def invalidate(self, document_ids: tp.Iterable[str]):
+        """Вызывается после индексации или удаления фрагментов документов."""
+        self._generation += 1
+        for document_id in set(document_ids):
+            self._document_generations[document_id] = self._document_generations.get(document_id, 0) + 1
+
+    def clear(self):
+        """Сбрасывает все ответы: индексы изменил другой процесс, и неизвестно, какие документы затронуты."""
+        for key in list(self._entries):
+            self._drop(key)
+        self._generation += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.row >= 0:
+            self._row_buckets[entry.row] = None
+            self._row_keys[entry.row] = None
+            self._free_rows.append(entry.row)
+
+    def _alive(self, entry: CachedAnswer) -> bool:
+        return time.monotonic() - entry.created_at <= self.ttl
+
+    async def _embed(self, message: str) -> np.ndarray:
+        return normalize(await self.backend.embed_query(normalize_message(message))).reshape(-1)
+
+    async def get(self, message: str, bucket: str) -> tp.Optional[CachedAnswer]:
+        key = self.key(message, bucket)
+        entry = self._entries.get(key)
+        if entry is not None and not self._alive(entry):
+            self._drop(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if self.backend is not None and self._vectors is not None:
+            rows = [row for row, row_bucket in enumerate(self._row_buckets) if row_bucket == bucket]
+            if rows:
+                scores = self._vectors[rows] @ await self._embed(message)
+                best = int(np.argmax(scores))
+                similar_key = self._row_keys[rows[best]]
+                entry = self._entries.get(similar_key)
+                if scores[best] >= self.similarity and entry is not None and self._alive(entry):
+                    self._entries.move_to_end(similar_key)
+                    self.similar_hits += 1
+                    return entry
+        self.misses += 1
+        return None
+
+    async def put(self, message: str, bucket: str, response: str, sources: list[dict]):
+        """
+        bucket берётся до поиска фрагментов: если за время генерации документы
+        переиндексировали, ответ ляжет в устаревшую корзину и не будет найден.
+        """
+        key = self.key(message, bucket)
+        entry = CachedAnswer(response, sources, time.monotonic(), bucket)
+        if self.backend is not None:
+            vector = await self._embed(message)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_items, vector.shape[0]), dtype=np.float32)
+                self._row_buckets = [None] * self.max_items
+                self._row_keys = [None] * self.max_items
+                self._free_rows = list(range(self.max_items - 1, -1, -1))
+
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_items:
+            self._drop(next(iter(self._entries)))
+        if self.backend is not None:
+            entry.row = self._free_rows.pop()
+            self._vectors[entry.row] = vector
+            self._row_buckets[entry.row] = bucket
+            self._row_keys[entry.row] = key
+
+    def stats(self) -> dict:
+        total = self.hits + self.similar_hits + self.misses
+        return {
+            "items": len(self._entries),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.similar_hits) / total if total else 0.0,
+        }
+
+
+__all__ = ["AnswerCache", "CachedAnswer", "normalize_message"]
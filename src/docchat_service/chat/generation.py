@@ -0,0 +1,81 @@
+import asyncio
+import re
+import typing as tp
+
+from src.docchat_service.capabilities import require
+from src.docchat_service.config import ChatSettings
+
+TOKEN_RE = re.compile(r"\S+\s*")
+
+
+class AnswerGenerator:
+    """Генерирует ответ на вопрос потоком токенов. history — предыдущие реплики (роль, текст)."""
+
+    def stream(self, message: str, mode: str, context: list[dict],
+               history: tp.Sequence[tuple[str, str]] = ()) -> tp.AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def generate(self, message: str, mode: str, context: list[dict],
+                       history: tp.Sequence[tuple[str, str]] = ()) -> str:
+        return "".join([token async for token in self.stream(message, mode, context, history)])
+
+
+class FakeGenerator(AnswerGenerator):
+    """Тестовые ответы без LLM, отдаются по словам с задержкой token_delay."""
+
+    def __init__(self, token_delay: float = 0.0):
+        self.token_delay = token_delay
+
+    @staticmethod
+    def answer(message: str, mode: str) -> str:
+        if message.lower() == "кто сейчас президент россии?":
+            return "Владимир Путин является действующим президентом Российской Федерации (по состоянию на 2024 год)."
+        return f"Это тестовый ответ в режиме '{mode}'. Ваш вопрос: '{message}'"
+
+    async def stream(self, message: str, mode: str, context: list[dict],
+                     history: tp.Sequence[tuple[str, str]] = ()) -> tp.AsyncIterator[str]:
+        for token in TOKEN_RE.findall(self.answer(message, mode)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+
+class OllamaGenerator(AnswerGenerator):
+    """ChatOllama создаётся при первом запросе, а не при старте приложения."""
+
+    def __init__(self, model: str, base_url: str):
+        self._model = model
+        self._base_url = base_url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = require("langchain_ollama").ChatOllama(model=self._model, base_url=self._base_url)
+        return self._client
+
+    @staticmethod
+    def build_messages(message: str, mode: str, context: list[dict],
+                       history: tp.Sequence[tuple[str, str]] = ()) -> list[tuple[str, str]]:
+        system = "Ты помощник по документам. Отвечай по-русски."
+        if context:
+            fragments = "\n\n".join(f"[{hit['source']}]\n{hit['text']}" for hit in context)
+            system += f" Используй фрагменты документов:\n\n{fragments}"
+        turns = [("human" if role == "user" else "ai", text) for role, text in history]
+        return [("system", system), *turns, ("human", message)]
+
+    async def stream(self, message: str, mode: str, context: list[dict],
+                     history: tp.Sequence[tuple[str, str]] = ()) -> tp.AsyncIterator[str]:
+        # Закрытие генератора прерывает запрос к Ollama
+        async for chunk in self.client.astream(self.build_messages(message, mode, context, history)):
+            if chunk.content:
+                yield chunk.content
+
+
+def make_generator(settings: ChatSettings) -> AnswerGenerator:
+    if settings.generator_backend == "ollama":
+        return OllamaGenerator(settings.chat_model, settings.ollama_base_url)
+    return FakeGenerator(settings.fake_token_delay)
+
+
+__all__ = ["AnswerGenerator", "FakeGenerator", "OllamaGenerator", "make_generator"]
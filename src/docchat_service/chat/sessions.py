@@ -0,0 +1,235 @@
+import asyncio
+import struct
+import threading
+import time
+import typing as tp
+import weakref
+import zlib
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from sqlalchemy import Column, Float, Integer, LargeBinary, MetaData, String, Table, create_engine, select
+from sqlalchemy.dialects.sqlite import insert
+
+ROLES = ("user", "assistant", "system")
+# Тексты длиннее порога хранятся сжатыми
+COMPRESS_THRESHOLD = 512
+LENGTH = struct.Struct(">I")
+
+metadata = MetaData()
+
+sessions_table = Table(
+    "sessions",
+    metadata,
+    Column("session_id", String(128), primary_key=True),
+    Column("turns", LargeBinary, nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+
+def pack_turn(role: str, text: str) -> bytes:
+    """Реплика в байтах: код роли, флаг сжатия, UTF-8 текст."""
+    data = text.encode("utf-8")
+    compressed = len(data) > COMPRESS_THRESHOLD
+    if compressed:
+        data = zlib.compress(data)
+    return bytes((ROLES.index(role), compressed)) + data
+
+
+def unpack_turn(turn: bytes) -> tuple[str, str]:
+    data = turn[2:]
+    if turn[1]:
+        data = zlib.decompress(data)
+    return ROLES[turn[0]], data.decode("utf-8")
+
+
+class Session:
+    __slots__ = ("turns", "size", "accessed_at", "version")
+
+    def __init__(self, turns: tp.Iterable[bytes] = (), version: int = 0):
+        self.turns: deque[bytes] = deque(turns)
+        self.size = sum(len(turn) for turn in self.turns)
+        self.accessed_at = time.monotonic()
+        self.version = version
+
+    def pack(self) -> bytes:
+        return b"".join(LENGTH.pack(len(turn)) + turn for turn in self.turns)
+
+    @classmethod
+    def unpack(cls, data: bytes, version: int) -> "Session":
+        turns, offset = [], 0
+        while offset < len(data):
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            turns.append(data[offset:offset + length])
+            offset += length
+        return cls(turns, version)
+
+
+class SessionSpill:
+    """Дисковый уровень хранилища сессий (SQLite), общий для процессов и перезапусков."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # timeout — сколько ждать, пока другой воркер держит блокировку записи SQLite
+        self._engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+        metadata.create_all(self._engine)
+        self._lock = threading.Lock()
+
+    def version(self, session_id: str) -> tp.Optional[int]:
+        with self._lock, self._engine.connect() as conn:
+            return conn.execute(
+                select(sessions_table.c.version).where(sessions_table.c.session_id == session_id)
+            ).scalar()
+
+    def load(self, session_id: str) -> tp.Optional[Session]:
+        with self._lock, self._engine.connect() as conn:
+            row = conn.execute(
+                select(sessions_table.c.turns, sessions_table.c.version)
+                .where(sessions_table.c.session_id == session_id)
+            ).first()
+        return Session.unpack(row.turns, row.version) if row else None
+
+    def save(self, session_id: str, data: bytes, version: int):
+        statement = insert(sessions_table).values(
+            session_id=session_id, turns=data, version=version, updated_at=time.time()
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[sessions_table.c.session_id],
+            set_={"turns": statement.excluded.turns, "version": statement.excluded.version,
+                  "updated_at": statement.excluded.updated_at},
+        )
+        with self._lock, self._engine.begin() as conn:
+            conn.execute(statement)
+
+    def delete_older_than(self, timestamp: float):
+        with self._lock, self._engine.begin() as conn:
+            conn.execute(sessions_table.delete().where(sessions_table.c.updated_at < timestamp))
+
+
+class SessionStore:
+    """
+    История диалогов с ограничениями по числу реплик и байтам на сессию
+    и по общему объёму в памяти. Сессии упорядочены по последнему обращению:
+    вытесняются самые давние (LRU) и не использованные дольше ttl секунд.
+    Операции с памятью — O(1) и выполняются в event loop; дисковый уровень
+    (если задан) вызывается через asyncio.to_thread. Пока идёт обращение
+    к диску, другие запросы той же сессии ждут её блокировку, а чужие могут
+    вытеснить её из памяти — поэтому после await сессия добавляется заново.
+    """
+
+    def __init__(self, max_turns: int = 20, max_session_bytes: int = 32 * 1024,
+                 max_total_bytes: int = 64 * 1024 * 1024, ttl: float = 24 * 3600,
+                 spill: tp.Optional[SessionSpill] = None):
+        self.max_turns = max_turns
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self.ttl = ttl
+        self.spill = spill
+        self._sessions: tp.OrderedDict[str, Session] = OrderedDict()
+        # Блокировка живёт, пока её кто-то держит или ждёт
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._total_bytes = 0
+        self.evictions = 0
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if self._total_bytes <= self.max_total_bytes and now - session.accessed_at <= self.ttl:
+                break
+            self._drop(session_id)
+            self.evictions += 1
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.size
+
+    def _put(self, session_id: str, session: Session):
+        self._drop(session_id)
+        self._sessions[session_id] = session
+        self._total_bytes += session.size
+
+    def _touch(self, session_id: str, session: Session):
+        session.accessed_at = time.monotonic()
+        if self._sessions.get(session_id) is not session:
+            # Вытеснена другим запросом, пока ждали диск
+            self._put(session_id, session)
+        self._sessions.move_to_end(session_id)
+
+    async def _get_session(self, session_id: str) -> tp.Optional[Session]:
+        """Вызывается под блокировкой сессии."""
+        session = self._sessions.get(session_id)
+        if session is not None and time.monotonic() - session.accessed_at > self.ttl:
+            self._drop(session_id)
+            session = None
+        if self.spill is not None:
+            # Другой воркер мог дописать сессию — сверяем версию с диском
+            version = await asyncio.to_thread(self.spill.version, session_id)
+            if version is not None and (session is None or session.version != version):
+                if session is not None:
+                    self._drop(session_id)
+                session = await asyncio.to_thread(self.spill.load, session_id)
+        if session is not None:
+            self._touch(session_id, session)
+        return session
+
+    async def get_history(self, session_id: str) -> list[tuple[str, str]]:
+        async with self._lock(session_id):
+            session = await self._get_session(session_id)
+        self._evict()
+        if session is None:
+            return []
+        return [unpack_turn(turn) for turn in session.turns]
+
+    async def append(self, session_id: str, role: str, text: str):
+        # Под блокировкой до записи на диск: иначе два первых сообщения создадут
+        # по своей сессии, а версии на диске запишутся не по порядку
+        async with self._lock(session_id):
+            session = await self._get_session(session_id)
+            if session is None:
+                session = Session()
+                self._put(session_id, session)
+
+            turn = pack_turn(role, text)
+            session.turns.append(turn)
+            session.size += len(turn)
+            self._total_bytes += len(turn)
+            while len(session.turns) > 1 and (
+                len(session.turns) > self.max_turns or session.size > self.max_session_bytes
+            ):
+                dropped = session.turns.popleft()
+                session.size -= len(dropped)
+                self._total_bytes -= len(dropped)
+            session.version += 1
+            self._touch(session_id, session)
+            self._evict()
+
+            if self.spill is not None:
+                await asyncio.to_thread(self.spill.save, session_id, session.pack(), session.version)
+
+    async def cleanup(self):
+        """Удаляет просроченные сессии из памяти и с диска."""
+        self._evict()
+        if self.spill is not None:
+            await asyncio.to_thread(self.spill.delete_older_than, time.time() - self.ttl)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_total_bytes,
+            "evictions": self.evictions,
+            "spill": self.spill is not None,
+        }
+
+
+__all__ = ["SessionStore", "SessionSpill"]
@@ -1,5 +1,6 @@
 import os
 from logging import DEBUG, INFO
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import Field
@@ -17,19 +18,139 @@ class AppSettings(BaseAppSettings):
     app_host: str = Field(validation_alias="APP_HOST", default="0.0.0.0")
     app_port: int = Field(validation_alias="APP_PORT", default=8000)  # Стандартный порт FastAPI
     timezone: str = Field(validation_alias="TIMEZONE", default="UTC")
+    # Больше одного — uvicorn запускает воркеры-процессы, общие каталоги на диске пишутся под блокировками
+    app_workers: int = Field(validation_alias="APP_WORKERS", default=1)
+    # Секунды на завершение текущих запросов и фоновых задач при остановке
+    app_shutdown_timeout: float = Field(validation_alias="APP_SHUTDOWN_TIMEOUT", default=30.0)
+
+    @property
+    def multi_worker(self) -> bool:
+        return self.app_workers > 1
 
 
 class LogSettings(BaseAppSettings):
     log_level: str = Field(validation_alias="LOG_LEVEL", default="INFO")
+    # Записи сверх размера очереди отбрасываются, а не блокируют вызывающий поток
+    log_queue_size: int = Field(validation_alias="LOG_QUEUE_SIZE", default=10000)
+    log_stream: Literal["stdout", "stderr"] = Field(validation_alias="LOG_STREAM", default="stdout")
 
     @property
     def log_lvl(self) -> int:
         return DEBUG if self.debug or self.log_level == "DEBUG" else INFO
 
 
+class ParserSettings(BaseAppSettings):
+    parser_pool: Literal["thread", "process"] = Field(validation_alias="PARSER_POOL", default="thread")
+    parser_workers: int = Field(validation_alias="PARSER_WORKERS", default=os.cpu_count() or 1)
+    parser_max_concurrency: int = Field(validation_alias="PARSER_MAX_CONCURRENCY", default=0)  # 0 — по числу воркеров
+    parser_queue_size: int = Field(validation_alias="PARSER_QUEUE_SIZE", default=64)  # Сколько задач может ждать слот
+    archive_member_workers: int = Field(validation_alias="ARCHIVE_MEMBER_WORKERS", default=min(4, os.cpu_count() or 1))
+    pdf_page_workers: int = Field(validation_alias="PDF_PAGE_WORKERS", default=os.cpu_count() or 1)
+    pdf_parallel_min_pages: int = Field(validation_alias="PDF_PARALLEL_MIN_PAGES", default=64)  # Короче — читаем в одном процессе
+    pdf_page_records: bool = Field(validation_alias="PDF_PAGE_RECORDS", default=False)  # Постраничные записи вместо одного текста
+    # stream — потоковый разбор XML из zip (python-docx только запасной), python-docx — всегда через python-docx
+    docx_parser: Literal["stream", "python-docx"] = Field(validation_alias="DOCX_PARSER", default="stream")
+    # Импортировать парсеры при старте, а не при первом запросе соответствующего формата
+    parser_warmup: bool = Field(validation_alias="PARSER_WARMUP", default=False)
+
+    @property
+    def concurrency(self) -> int:
+        return self.parser_max_concurrency or self.parser_workers
+
+
+class UploadSettings(BaseAppSettings):
+    upload_chunk_size: int = Field(validation_alias="UPLOAD_CHUNK_SIZE", default=1024 * 1024)  # 1 МиБ за одно чтение
+    upload_max_bytes: int = Field(validation_alias="UPLOAD_MAX_BYTES", default=512 * 1024 * 1024)
+    upload_tmp_dir: Optional[str] = Field(validation_alias="UPLOAD_TMP_DIR", default=None)  # None — системный tmp
+    # Пакетная загрузка: файлов в одном запросе (столько же по умолчанию пропускает разбор multipart)
+    # и сколько из них обрабатывается одновременно; дальше очередь ограничивает пул парсинга
+    upload_batch_max_files: int = Field(validation_alias="UPLOAD_BATCH_MAX_FILES", default=1000)
+    upload_batch_concurrency: int = Field(validation_alias="UPLOAD_BATCH_CONCURRENCY", default=4)
+
+
+class LimitSettings(BaseAppSettings):
+    # Лимиты на разбор одной загрузки-архива вместе со всеми вложенными архивами
+    archive_max_bytes: int = Field(validation_alias="ARCHIVE_MAX_BYTES", default=2 * 1024 * 1024 * 1024)  # Распакованных
+    archive_max_members: int = Field(validation_alias="ARCHIVE_MAX_MEMBERS", default=10000)
+    archive_max_depth: int = Field(validation_alias="ARCHIVE_MAX_DEPTH", default=3)  # 1 — без вложенных архивов
+    archive_max_seconds: float = Field(validation_alias="ARCHIVE_MAX_SECONDS", default=600.0)
+    archive_max_ratio: float = Field(validation_alias="ARCHIVE_MAX_RATIO", default=200.0)  # Распакованный/сжатый размер члена
+
+
+class CacheSettings(BaseAppSettings):
+    result_cache_enabled: bool = Field(validation_alias="RESULT_CACHE_ENABLED", default=True)
+    result_cache_dir: str = Field(validation_alias="RESULT_CACHE_DIR", default="cache/results")
+    result_cache_max_bytes: int = Field(validation_alias="RESULT_CACHE_MAX_BYTES", default=1024 * 1024 * 1024)
+
+
+class JobSettings(BaseAppSettings):
+    job_workers: int = Field(validation_alias="JOB_WORKERS", default=2)
+    job_queue_size: int = Field(validation_alias="JOB_QUEUE_SIZE", default=100)
+    job_retry_after: int = Field(validation_alias="JOB_RETRY_AFTER", default=5)  # Секунды в заголовке Retry-After
+    job_history_size: int = Field(validation_alias="JOB_HISTORY_SIZE", default=1000)  # Сколько завершённых задач помнить
+    # Снимки задач для запросов статуса к другому воркеру; используется только при APP_WORKERS > 1
+    job_state_dir: str = Field(validation_alias="JOB_STATE_DIR", default="cache/jobs")
+
+
+class OutputSettings(BaseAppSettings):
+    output_dir: str = Field(validation_alias="OUTPUT_DIR", default="output_jsons")
+    # json — прежний формат с отступами, orjson — компактный, bundle — архив одним файлом с индексом
+    output_format: Literal["json", "orjson", "bundle"] = Field(validation_alias="OUTPUT_FORMAT", default="orjson")
+    output_compression: Literal["none", "zstd"] = Field(validation_alias="OUTPUT_COMPRESSION", default="none")
+    output_zstd_level: int = Field(validation_alias="OUTPUT_ZSTD_LEVEL", default=3)
+
+
+class RagSettings(BaseAppSettings):
+    ingest_enabled: bool = Field(validation_alias="INGEST_ENABLED", default=False)  # Нарезка и эмбеддинги после разбора
+    embedding_backend: Literal["ollama", "fake"] = Field(validation_alias="EMBEDDING_BACKEND", default="ollama")
+    embedding_model: str = Field(validation_alias="EMBEDDING_MODEL", default="nomic-embed-text")
+    embedding_dim: int = Field(validation_alias="EMBEDDING_DIM", default=256)  # Только для fake-бэкенда
+    ollama_base_url: str = Field(validation_alias="OLLAMA_BASE_URL", default="http://localhost:11434")
+    embed_batch_size: int = Field(validation_alias="EMBED_BATCH_SIZE", default=32)
+    embed_concurrency: int = Field(validation_alias="EMBED_CONCURRENCY", default=4)  # Одновременных запросов к бэкенду
+    chunk_size: int = Field(validation_alias="CHUNK_SIZE", default=1000)
+    chunk_overlap: int = Field(validation_alias="CHUNK_OVERLAP", default=200)
+    index_dir: str = Field(validation_alias="INDEX_DIR", default="cache/index")
+    index_max_segments: int = Field(validation_alias="INDEX_MAX_SEGMENTS", default=16)  # Больше — сливаем в один
+    retrieval_top_k: int = Field(validation_alias="RETRIEVAL_TOP_K", default=5)
+    bm25_k1: float = Field(validation_alias="BM25_K1", default=1.5)
+    bm25_b: float = Field(validation_alias="BM25_B", default=0.75)
+    bm25_save_interval: float = Field(validation_alias="BM25_SAVE_INTERVAL", default=30.0)  # Секунды между сохранениями
+    embed_cache_enabled: bool = Field(validation_alias="EMBED_CACHE_ENABLED", default=True)
+    embed_cache_path: str = Field(validation_alias="EMBED_CACHE_PATH", default="cache/embeddings.sqlite")
+    embed_cache_memory_items: int = Field(validation_alias="EMBED_CACHE_MEMORY_ITEMS", default=10000)
+    embed_cache_max_bytes: int = Field(validation_alias="EMBED_CACHE_MAX_BYTES", default=512 * 1024 * 1024)
+
+
+class ChatSettings(BaseAppSettings):
+    generator_backend: Literal["fake", "ollama"] = Field(validation_alias="GENERATOR_BACKEND", default="fake")
+    chat_model: str = Field(validation_alias="CHAT_MODEL", default="llama3")
+    ollama_base_url: str = Field(validation_alias="OLLAMA_BASE_URL", default="http://localhost:11434")
+    fake_token_delay: float = Field(validation_alias="FAKE_TOKEN_DELAY", default=0.0)  # Секунды между токенами
+    session_max_turns: int = Field(validation_alias="SESSION_MAX_TURNS", default=20)
+    session_max_bytes: int = Field(validation_alias="SESSION_MAX_BYTES", default=32 * 1024)
+    sessions_max_bytes: int = Field(validation_alias="SESSIONS_MAX_BYTES", default=64 * 1024 * 1024)
+    session_ttl: float = Field(validation_alias="SESSION_TTL", default=24 * 3600)  # Секунды
+    # SQLite для вытесненных сессий; пусто — сессии живут только в памяти процесса
+    session_store_path: Optional[str] = Field(validation_alias="SESSION_STORE_PATH", default=None)
+    answer_cache_enabled: bool = Field(validation_alias="ANSWER_CACHE_ENABLED", default=True)
+    answer_cache_max_items: int = Field(validation_alias="ANSWER_CACHE_MAX_ITEMS", default=1024)
+    answer_cache_ttl: float = Field(validation_alias="ANSWER_CACHE_TTL", default=3600)  # Секунды
+    # Порог косинусной близости для похожих вопросов; 0 — только точное совпадение
+    answer_cache_similarity: float = Field(validation_alias="ANSWER_CACHE_SIMILARITY", default=0.0)
+
+
 class Secrets:
     app: AppSettings = AppSettings()
     log: LogSettings = LogSettings()
+    parser: ParserSettings = ParserSettings()
+    upload: UploadSettings = UploadSettings()
+    limits: LimitSettings = LimitSettings()
+    cache: CacheSettings = CacheSettings()
+    jobs: JobSettings = JobSettings()
+    output: OutputSettings = OutputSettings()
+    rag: RagSettings = RagSettings()
+    chat: ChatSettings = ChatSettings()
 
 
 APP_CONFIG = Secrets()
@@ -1,9 +1,27 @@
+import asyncio
+import os
+import threading
+
 import pytz
-from langchain_community.embeddings import OllamaEmbeddings
 
 from src.docchat_service.base import Singleton
+from src.docchat_service.capabilities import warm_up
+from src.docchat_service.chat import AnswerCache, SessionSpill, SessionStore, make_generator
 from src.docchat_service.config import APP_CONFIG, Secrets
+from src.docchat_service.jobs import JobManager
 from src.docchat_service.logger import ContextVarsContainer, LoggerConfigurator
+from src.docchat_service.metrics import REGISTRY
+from src.docchat_service.rag import (
+    BM25Index,
+    CachedEmbeddingBackend,
+    EmbeddingCache,
+    IngestPipeline,
+    Retriever,
+    VectorIndex,
+    make_embedding_backend,
+)
+from src.docchat_service.result_cache import ResultCache
+from src.docchat_service.workers import ParserPool, shutdown_pdf_page_pool
 
 class AppContext(metaclass=Singleton):
     @property
@@ -11,14 +29,127 @@ class AppContext(metaclass=Singleton):
         return self._logger_manager.async_logger
 
     def __init__(self, secrets: Secrets):
+        self.secrets = secrets
         self.timezone = pytz.timezone(secrets.app.timezone)
         self.context_vars_container = ContextVarsContainer()
         self._logger_manager = LoggerConfigurator(
             log_lvl=secrets.log.log_lvl,
-            context_vars_container=self.context_vars_container
+            context_vars_container=self.context_vars_container,
+            queue_size=secrets.log.log_queue_size,
+            stream=secrets.log.log_stream,
+        )
+        # Дочерние процессы пулов пишут логи в очередь, которую вычитывает этот процесс
+        self.process_initializer = self._logger_manager.process_initializer()
+        self.parser_pool = ParserPool(secrets.parser, *self.process_initializer)
+        self.result_cache = ResultCache(secrets.cache)
+        # Несколько воркеров делят каталоги на диске, но не память процесса
+        shared = secrets.app.multi_worker
+        self.job_manager = JobManager(secrets.jobs, state_dir=secrets.jobs.job_state_dir if shared else None)
+        embedding_backend = make_embedding_backend(secrets.rag)
+        self.embedding_cache = None
+        if secrets.rag.embed_cache_enabled:
+            self.embedding_cache = EmbeddingCache(
+                secrets.rag.embed_cache_path,
+                memory_items=secrets.rag.embed_cache_memory_items,
+                max_bytes=secrets.rag.embed_cache_max_bytes,
+            )
+            embedding_backend = CachedEmbeddingBackend(embedding_backend, self.embedding_cache)
+        self.embedding_backend = embedding_backend
+        # Индексы читаются с диска при первом обращении (см. _build_indexes), а не при импорте
+        self._indexes_lock = threading.Lock()
+        self.vector_index = None
+        self.bm25_index = None
+        self.ingest_pipeline = None
+        self.retriever = None
+        self.answer_cache = None
+        if secrets.chat.answer_cache_enabled:
+            self.answer_cache = AnswerCache(
+                max_items=secrets.chat.answer_cache_max_items,
+                ttl=secrets.chat.answer_cache_ttl,
+                backend=embedding_backend,
+                similarity=secrets.chat.answer_cache_similarity,
+            )
+        self.generator = make_generator(secrets.chat)
+        self.session_store = SessionStore(
+            max_turns=secrets.chat.session_max_turns,
+            max_session_bytes=secrets.chat.session_max_bytes,
+            max_total_bytes=secrets.chat.sessions_max_bytes,
+            ttl=secrets.chat.session_ttl,
+            spill=SessionSpill(secrets.chat.session_store_path) if secrets.chat.session_store_path else None,
         )
+        self.metrics = REGISTRY
+        self._register_metrics()
         self.logger.info("App context initialized for local RAG development")
 
+    def _build_indexes(self):
+        """
+        Векторный и BM25-индексы, конвейер индексации и поиск. Создаются при первой
+        индексации или первом запросе к чату: импорт модуля (в том числе в процессах
+        пула парсинга) и сервис с INGEST_ENABLED=false не трогают каталог индексов.
+        """
+        if self.retriever is not None:
+            return
+        with self._indexes_lock:
+            if self.retriever is not None:
+                return
+            rag = self.secrets.rag
+            shared = self.secrets.app.multi_worker
+            self.vector_index = VectorIndex(
+                f"{rag.index_dir}/vectors", max_segments=rag.index_max_segments, shared=shared
+            )
+            self.bm25_index = BM25Index(
+                f"{rag.index_dir}/bm25",
+                k1=rag.bm25_k1,
+                b=rag.bm25_b,
+                save_interval=rag.bm25_save_interval,
+                shared=shared,
+            )
+            self.ingest_pipeline = IngestPipeline(
+                self.embedding_backend, rag, self.vector_index, self.bm25_index,
+                on_ingest=self.answer_cache.invalidate if self.answer_cache else None,
+            )
+            self.retriever = Retriever(
+                self.embedding_backend, self.vector_index, self.bm25_index, rag.retrieval_top_k,
+                on_change=self.answer_cache.clear if self.answer_cache else None,
+            )
+
+    def _register_metrics(self):
+        """Метрики, которые читаются из компонентов в момент сбора."""
+        self.metrics.callback(
+            "docchat_parser_pool_tasks", "Parser pool tasks by state",
+            lambda: {("waiting",): self.parser_pool.waiting, ("running",): self.parser_pool.running},
+            ("state",),
+        )
+        self.metrics.callback("docchat_job_queue_depth", "Queued background jobs", lambda: self.job_manager.depth)
+        self.metrics.callback("docchat_chat_sessions", "Chat sessions in memory",
+                              lambda: self.session_store.stats()["sessions"])
+
+        def cache_counts(kind: str) -> dict:
+            counts = {}
+            for name, stats in self._cache_stats().items():
+                hits = stats.get("hits", 0) + stats.get("memory_hits", 0) + stats.get("disk_hits", 0)
+                hits += stats.get("similar_hits", 0)
+                counts[(name,)] = hits if kind == "hits" else stats.get("misses", 0)
+            return counts
+
+        self.metrics.callback("docchat_cache_hits_total", "Cache hits", lambda: cache_counts("hits"),
+                              ("cache",), kind="counter")
+        self.metrics.callback("docchat_cache_misses_total", "Cache misses", lambda: cache_counts("misses"),
+                              ("cache",), kind="counter")
+        self.metrics.callback(
+            "docchat_cache_hit_ratio", "Cache hit ratio since start",
+            lambda: {(name,): stats["hit_ratio"] for name, stats in self._cache_stats().items()},
+            ("cache",),
+        )
+
+    def _cache_stats(self) -> dict:
+        stats = {"results": self.result_cache.stats()}
+        if self.embedding_cache is not None:
+            stats["embeddings"] = self.embedding_cache.stats()
+        if self.answer_cache is not None:
+            stats["answers"] = self.answer_cache.stats()
+        return stats
+
     def get_logger(self):
         return self.logger
 
@@ -28,12 +159,58 @@ class AppContext(metaclass=Singleton):
     def get_pytz_timezone(self):
         return self.timezone
 
+    def get_process_initializer(self):
+        return self.process_initializer
+
+    def get_parser_pool(self):
+        return self.parser_pool
+
+    def get_result_cache(self):
+        return self.result_cache
+
+    def get_job_manager(self):
+        return self.job_manager
+
+    def get_ingest_pipeline(self):
+        self._build_indexes()
+        return self.ingest_pipeline
+
+    def get_retriever(self):
+        self._build_indexes()
+        return self.retriever
+
+    def get_embedding_cache(self):
+        return self.embedding_cache
+
+    def get_generator(self):
+        return self.generator
+
+    def get_session_store(self):
+        return self.session_store
+
+    def get_answer_cache(self):
+        return self.answer_cache
+
+    def get_metrics(self):
+        return self.metrics
+
     async def on_startup(self):
-        self.logger.info("Application is starting up in local mode")
+        self.logger.info("Application is starting up in local mode",
+                         extra={"pid": os.getpid(), "workers": self.secrets.app.app_workers})
+        self.parser_pool.start()
+        if self.secrets.parser.parser_warmup:
+            loaded = await asyncio.to_thread(warm_up)
+            self.logger.info("Parsers warmed up", extra={"capabilities": loaded})
         self.logger.info("Ready for RAG document processing with Ollama")
 
     async def on_shutdown(self):
         self.logger.info("Application is shutting down")
+        await self.job_manager.stop(timeout=self.secrets.app.app_shutdown_timeout)
+        await self.session_store.cleanup()
+        if self.bm25_index is not None:
+            self.bm25_index.save()
+        self.parser_pool.shutdown()
+        shutdown_pdf_page_pool()
         self._logger_manager.remove_logger_handlers()
 
 APP_CTX = AppContext(APP_CONFIG)
@@ -0,0 +1,234 @@
+import asyncio
+import os
+import time
+import typing as tp
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import orjson
+
+from src.docchat_service.config import JobSettings
+
+
+class JobQueueFull(Exception):
+    """Очередь фоновых задач заполнена."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Очередь задач заполнена, повторите позже")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    filename: str
+    path: str
+    digest: str = ""
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    state: str = "queued"  # queued | running | done | failed
+    processed: int = 0
+    total: tp.Optional[int] = None
+    result: tp.Optional[dict] = None
+    error: tp.Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: tp.Optional[float] = None
+    finished_at: tp.Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed")
+
+    def set_progress(self, processed: int, total: tp.Optional[int]):
+        self.processed = processed
+        self.total = total
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "state": self.state,
+            "progress": {"processed": self.processed, "total": self.total},
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        """Задача из снимка to_dict() (путь к файлу в снимок не входит)."""
+        return cls(
+            filename=data["filename"],
+            path="",
+            id=data["job_id"],
+            state=data["state"],
+            processed=data["progress"]["processed"],
+            total=data["progress"]["total"],
+            result=data["result"],
+            error=data["error"],
+            created_at=data["created_at"],
+            started_at=data["started_at"],
+            finished_at=data["finished_at"],
+        )
+
+
+JobHandler = tp.Callable[[Job], tp.Awaitable[dict]]
+
+
+class JobManager:
+    """
+    Ограниченная очередь фоновых задач обработки и пул корутин-воркеров.
+    Состояние задач хранится в памяти процесса; завершённые задачи
+    вытесняются, когда их больше job_history_size.
+    С state_dir снимки задач пишутся на диск при смене состояния, чтобы
+    статус задачи мог отдать любой воркер, а не только принявший её.
+    """
+
+    def __init__(self, settings: JobSettings, state_dir: tp.Optional[str] = None):
+        self._settings = settings
+        self._queue: tp.Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._jobs: tp.OrderedDict[str, Job] = OrderedDict()
+        self._handler: tp.Optional[JobHandler] = None
+        self._closing = False
+        self._state_dir = Path(state_dir) if state_dir else None
+        if self._state_dir is not None:
+            self._state_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def started(self) -> bool:
+        return self._queue is not None
+
+    def start(self, handler: JobHandler):
+        if self._queue is not None:
+            return
+        self._handler = handler
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self._settings.job_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self._settings.job_workers)
+        ]
+
+    async def stop(self, timeout: float = 0):
+        """
+        Перестаёт принимать задачи и ждёт до timeout секунд, пока очередь
+        доработает; оставшиеся задачи отменяются и помечаются неудачными,
+        их временные файлы загрузок удаляются.
+        """
+        self._closing = True
+        if self._queue is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.state = "failed"
+            job.error = "Задача не начата до остановки сервиса"
+            job.finished_at = time.time()
+            self._persist(job)
+            if job.path:
+                Path(job.path).unlink(missing_ok=True)
+        self._workers = []
+        self._queue = None
+
+    def check_capacity(self):
+        if self._queue is None or self._closing or self._queue.full():
+            raise JobQueueFull(self._settings.job_retry_after)
+
+    def submit(self, job: Job) -> Job:
+        self.check_capacity()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(self._settings.job_retry_after)
+        self._remember(job)
+        return job
+
+    def add_finished(self, job: Job, result: dict) -> Job:
+        """Регистрирует задачу, результат которой уже известен (например, из кеша)."""
+        job.state = "done"
+        job.result = result
+        job.started_at = job.finished_at = time.time()
+        self._remember(job)
+        return job
+
+    def get(self, job_id: str) -> tp.Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self._state_dir is not None:
+            job = self._load(job_id)
+        return job
+
+    def _state_path(self, job_id: str) -> tp.Optional[Path]:
+        try:
+            # Только настоящие UUID: job_id приходит из URL и становится именем файла
+            return self._state_dir / f"{uuid.UUID(job_id)}.json"
+        except ValueError:
+            return None
+
+    def _persist(self, job: Job):
+        if self._state_dir is None:
+            return
+        path = self._state_path(job.id)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(orjson.dumps(job.to_dict()))
+            os.replace(tmp_path, path)
+        except OSError:
+            # Снимок нужен только другим воркерам; ошибка записи не должна ронять обработку
+            tmp_path.unlink(missing_ok=True)
+
+    def _load(self, job_id: str) -> tp.Optional[Job]:
+        path = self._state_path(job_id)
+        if path is None:
+            return None
+        try:
+            return Job.from_dict(orjson.loads(path.read_bytes()))
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        self._persist(job)
+        if len(self._jobs) <= self._settings.job_history_size:
+            return
+        for job_id in [job_id for job_id, item in self._jobs.items() if item.finished]:
+            if len(self._jobs) <= self._settings.job_history_size:
+                break
+            del self._jobs[job_id]
+            if self._state_dir is not None:
+                self._state_path(job_id).unlink(missing_ok=True)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.state = "running"
+            job.started_at = time.time()
+            self._persist(job)
+            try:
+                job.result = await self._handler(job)
+                job.state = "done"
+            except asyncio.CancelledError:
+                job.state = "failed"
+                job.error = "Задача прервана остановкой сервиса"
+                raise
+            except Exception as e:
+                job.state = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._persist(job)
+                self._queue.task_done()
+
+
+__all__ = ["Job", "JobManager", "JobQueueFull"]
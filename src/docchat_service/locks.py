@@ -0,0 +1,76 @@
+import contextlib
+import os
+import threading
+import typing as tp
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка действует только внутри процесса
+    fcntl = None
+
+
+class FileLock:
+    """
+    Межпроцессная блокировка на flock(2) для общих файлов на диске
+    (индексы, манифесты), когда сервис запущен несколькими воркерами.
+    Внутри процесса потоки дополнительно упорядочиваются обычным RLock,
+    поэтому повторный захват тем же потоком не блокируется (вложенный
+    захват наследует режим внешнего).
+    """
+
+    def __init__(self, path: tp.Union[str, Path]):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._fd: tp.Optional[int] = None
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def acquire(self, shared: bool = False, blocking: bool = True) -> tp.Iterator[bool]:
+        """
+        shared=True — разделяемая блокировка для чтения, иначе исключительная.
+        blocking=False — не ждать: если блокировку держит другой поток или
+        процесс, контекст сразу отдаёт False и ничего не захватывает.
+        """
+        if not self._thread_lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            if self._depth == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                                    | (0 if blocking else fcntl.LOCK_NB))
+                    except BlockingIOError:
+                        os.close(fd)
+                        yield False
+                        return
+                    except BaseException:
+                        os.close(fd)
+                        raise
+                self._fd = fd
+            self._depth += 1
+            try:
+                yield True
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    # Закрытие дескриптора снимает flock
+                    os.close(self._fd)
+                    self._fd = None
+        finally:
+            self._thread_lock.release()
+
+
+def file_stamp(path: Path) -> tp.Optional[tuple[int, int, int]]:
+    """Отпечаток файла: меняется при каждой атомарной замене через os.replace."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+__all__ = ["FileLock", "file_stamp"]
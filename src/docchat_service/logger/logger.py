@@ -1,12 +1,23 @@
-import json
 import logging
+import multiprocessing
+import queue
 import sys
+import threading
+import time
 from contextvars import ContextVar
 from logging import Formatter, Logger, StreamHandler
-from typing import Any, Dict, Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+from src.docchat_service.metrics import EVENTS
 
 trace_id_ctx: ContextVar[str] = ContextVar("trace_id", default="local")
 
+# Атрибуты, которые есть у любой LogRecord; всё остальное пришло через extra
+STANDARD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
 
 class JsonFormatter(Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -16,13 +27,16 @@ class JsonFormatter(Formatter):
             "message": record.getMessage(),
             "module": record.module,
             "function": record.funcName,
-            "trace_id": trace_id_ctx.get(),
+            "trace_id": getattr(record, "trace_id", None) or trace_id_ctx.get(),
         }
-        if hasattr(record, "extra"):
-            log_data.update(record.extra)
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_ATTRS and key not in log_data:
+                log_data[key] = value
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_data, ensure_ascii=False)
+        elif record.exc_text:
+            log_data["exception"] = record.exc_text
+        return orjson.dumps(log_data, default=str).decode("utf-8")
 
 
 class ColoredFormatter(Formatter):
@@ -35,48 +49,174 @@ class ColoredFormatter(Formatter):
     }
     RESET = "\033[0m"
 
+    def __init__(self, datefmt: Optional[str] = None):
+        super().__init__(datefmt=datefmt)
+        self._formatters = {
+            level: Formatter(
+                f"{color}%(asctime)s | %(levelname)-8s | %(trace_id)s{self.RESET} "
+                f"| %(message)s [%(module)s.%(funcName)s]",
+                datefmt=datefmt,
+            )
+            for level, color in self.COLORS.items()
+        }
+
     def format(self, record: logging.LogRecord) -> str:
-        color = self.COLORS.get(record.levelname, self.RESET)
-        return (
-            f"{color}%(asctime)s | %(levelname)-8s | %(trace_id)s{self.RESET} "
-            f"| %(message)s [%(module)s.%(funcName)s]"
-        )
+        if not hasattr(record, "trace_id"):
+            record.trace_id = trace_id_ctx.get()
+        return self._formatters.get(record.levelname, self._formatters["INFO"]).format(record)
+
+
+class ContextFilter(logging.Filter):
+    """Запоминает trace_id в записи в потоке, где она создана: форматирует её уже поток QueueListener."""
+
+    def __init__(self, context_vars_container=None):
+        super().__init__()
+        self.context_vars_container = context_vars_container
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            if self.context_vars_container is not None:
+                record.trace_id = self.context_vars_container.trace_id.get()
+            else:
+                record.trace_id = trace_id_ctx.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает записи с extra={"rate_key": ...}: не больше burst подряд
+    и дальше rate в секунду на ключ. Первая пропущенная после паузы запись
+    получает поле suppressed с числом отброшенных. Остальные записи не трогает.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, list] = {}  # ключ -> [токены, время, отброшено]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Кладёт запись в ограниченную очередь и сразу возвращается. Запись
+    форматирует поток QueueListener, поэтому здесь только подготавливаем
+    её к передаче: подставляем аргументы и превращаем исключение в текст.
+    При переполнении очереди запись отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            EVENTS.inc(event="log_records_dropped")
+
+
+def init_process_logging(log_queue, log_lvl: int):
+    """
+    initializer для ProcessPoolExecutor: в дочернем процессе нет потока
+    QueueListener, поэтому записи "rag_app" уходят в межпроцессную очередь,
+    которую вычитывает родитель (см. LoggerConfigurator.process_initializer).
+    """
+    logger = logging.getLogger("rag_app")
+    logger.setLevel(log_lvl)
+    logger.handlers.clear()
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+    handler.addFilter(ContextFilter())
+    logger.addHandler(handler)
 
 
 class LoggerConfigurator:
     _instance: Optional["LoggerConfigurator"] = None
 
-    def __new__(cls, log_lvl: int = logging.INFO, context_vars_container=None):
+    def __new__(cls, log_lvl: int = logging.INFO, context_vars_container=None, queue_size: int = 10000,
+                stream: str = "stdout"):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance._init_logger(log_lvl)
+            cls._instance._init_logger(log_lvl, context_vars_container, queue_size, stream)
         return cls._instance
 
-    def _init_logger(self, log_lvl: int):
+    def _init_logger(self, log_lvl: int, context_vars_container, queue_size: int, stream: str):
         self.logger = logging.getLogger("rag_app")
         self.logger.setLevel(log_lvl)
         self.logger.handlers.clear()
 
-        console_handler = StreamHandler(sys.stdout)
+        console_handler = StreamHandler(sys.stderr if stream == "stderr" else sys.stdout)
         if log_lvl == logging.DEBUG:
             console_handler.setFormatter(ColoredFormatter(datefmt="%H:%M:%S"))
         else:
             console_handler.setFormatter(JsonFormatter())
-        self.logger.addHandler(console_handler)
+
+        # В консоль пишет отдельный поток, event loop только кладёт запись в очередь
+        self.queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        self.queue_handler.addFilter(RateLimitFilter())
+        self.queue_handler.addFilter(ContextFilter(context_vars_container))
+        self.logger.addHandler(self.queue_handler)
+        self.listener = QueueListener(self.queue_handler.queue, console_handler, respect_handler_level=True)
+        self.listener.start()
+
+        # Записи из процессных пулов: дочерние процессы пишут в эту очередь, родитель выводит их тем же обработчиком
+        self.log_lvl = log_lvl
+        self.process_queue = multiprocessing.Queue(maxsize=queue_size)
+        self.process_listener = QueueListener(self.process_queue, console_handler, respect_handler_level=True)
+        self.process_listener.start()
 
     @property
     def async_logger(self) -> Logger:
         return self.logger
 
+    def process_initializer(self) -> tuple[Callable, tuple]:
+        """(initializer, initargs) для ProcessPoolExecutor, чтобы логи дочерних процессов не терялись."""
+        return init_process_logging, (self.process_queue, self.log_lvl)
+
     def metric(self, metric_name: str, metric_value: int):
-        self.logger.debug(f"Metric stub: {metric_name}={metric_value}")
+        """Прибавляет metric_value к счётчику docchat_events_total{event=metric_name}."""
+        EVENTS.inc(metric_value, event=metric_name)
 
     def audit(self, event_name: str, event_params: Any):
         self.logger.debug(f"Audit stub: {event_name} | {event_params}")
 
     def remove_logger_handlers(self):
+        # Дописывает накопленные в очереди записи и останавливает поток
+        for listener in (self.listener, self.process_listener):
+            if listener._thread is not None:
+                listener.stop()
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
 
 
-__all__ = ["LoggerConfigurator"]
\ No newline at end of file
+__all__ = ["LoggerConfigurator", "RateLimitFilter", "init_process_logging"]
@@ -0,0 +1,215 @@
+import bisect
+import contextlib
+import threading
+import time
+import typing as tp
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+LabelValues = tp.Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tp.Sequence[str], values: tp.Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Метрика с метками. Обновление — один словарный доступ под коротким локом."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tp.Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[LabelValues, tp.Any] = {}
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> tp.Iterator[tuple[str, LabelValues, LabelValues, float]]:
+        """(суффикс имени, доп. метки, значения меток, значение)."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", (), key, value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, extra_names, values, value in self.samples():
+            labels = _format_labels(self.labelnames + extra_names, values)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами: счётчики хранятся некумулятивно, суммируются при выводе."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tp.Sequence[str] = (),
+                 buckets: tp.Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield "_bucket", ("le",), key + (_format_value(float(bound)),), cumulative
+            yield "_sum", (), key, total
+            yield "_count", (), key, count
+
+
+class CallbackMetric(Metric):
+    """
+    Значение читается при сборе: callback возвращает число
+    или словарь {значения меток: число}. Для очередей и статистики кешей.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: tp.Callable[[], tp.Any],
+                 labelnames: tp.Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield "", (), key if isinstance(key, tuple) else (key,), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            # Повторная регистрация (например, при пересоздании контекста) заменяет метрику
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tp.Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tp.Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tp.Sequence[str] = (),
+                  buckets: tp.Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, callback: tp.Callable[[], tp.Any],
+                 labelnames: tp.Sequence[str] = (), kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, kind))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "docchat_http_requests_total", "HTTP requests by route and status", ("method", "path", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "docchat_http_request_duration_seconds", "HTTP request latency", ("method", "path")
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "docchat_stage_duration_seconds", "Document processing stage latency", ("stage",)
+)
+ARCHIVE_MEMBERS = REGISTRY.histogram(
+    "docchat_archive_members", "Members per processed archive", buckets=COUNT_BUCKETS
+)
+BYTES_PROCESSED = REGISTRY.counter(
+    "docchat_bytes_processed_total", "Bytes processed by stage", ("stage",)
+)
+EVENTS = REGISTRY.counter(
+    "docchat_events_total", "Application events reported via LoggerConfigurator.metric", ("event",)
+)
+
+__all__ = [
+    "MetricsRegistry",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "CallbackMetric",
+    "REGISTRY",
+    "HTTP_REQUESTS",
+    "HTTP_LATENCY",
+    "STAGE_LATENCY",
+    "ARCHIVE_MEMBERS",
+    "BYTES_PROCESSED",
+    "EVENTS",
+]
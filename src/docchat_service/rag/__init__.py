@@ -0,0 +1,24 @@
+from .bm25 import BM25Index, tokenize
+from .chunking import Chunk, content_text, split_document
+from .embedding_cache import CachedEmbeddingBackend, EmbeddingCache
+from .embeddings import EmbeddingBackend, FakeEmbeddings, OllamaEmbeddingBackend, make_embedding_backend
+from .ingest import IngestPipeline
+from .retriever import Retriever
+from .vector_index import VectorIndex
+
+__all__ = [
+    "BM25Index",
+    "tokenize",
+    "Chunk",
+    "content_text",
+    "split_document",
+    "CachedEmbeddingBackend",
+    "EmbeddingCache",
+    "EmbeddingBackend",
+    "FakeEmbeddings",
+    "OllamaEmbeddingBackend",
+    "make_embedding_backend",
+    "IngestPipeline",
+    "Retriever",
+    "VectorIndex",
+]
@@ -0,0 +1,425 @@
+import contextlib
+import math
+import os
+import re
+import threading
+import time
+import typing as tp
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from src.docchat_service.locks import FileLock, file_stamp
+
+from .chunking import Chunk
+
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+STATE_NAME = "bm25.snapshot"
+DOCS_NAME = "docs.jsonl"
+DELETES_NAME = "deletes.bin"
+DELETE_RECORD_SIZE = array("I").itemsize
+LOCK_NAME = ".lock"
+# Порядок массивов numpy в снимке, после строки JSON с метаданными
+SNAPSHOT_ARRAYS = ("doc_lengths", "codes", "offsets", "bounds", "deltas", "tfs", "last_ids")
+
+
+def tokenize(text: str) -> list[str]:
+    """Слова кириллицей и латиницей в нижнем регистре, ё приводится к е."""
+    return TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+class Posting:
+    """Список вхождений термина: id фрагментов дельта-кодированы, частоты рядом."""
+
+    __slots__ = ("deltas", "tfs", "last_id")
+
+    def __init__(self):
+        self.deltas = array("I")
+        self.tfs = array("H")
+        self.last_id = 0
+
+    def append(self, doc_id: int, tf: int):
+        self.deltas.append(doc_id - self.last_id)
+        self.tfs.append(min(tf, 0xFFFF))
+        self.last_id = doc_id
+
+    def decode(self) -> tuple[np.ndarray, np.ndarray]:
+        ids = np.cumsum(np.frombuffer(self.deltas, dtype=np.uint32), dtype=np.int64)
+        return ids, np.frombuffer(self.tfs, dtype=np.uint16).astype(np.float32)
+
+
+class BM25Index:
+    """
+    Инкрементальный инвертированный индекс с BM25-ранжированием.
+    Фрагменты получают возрастающие внутренние id, поэтому добавление — это
+    дописывание в конец списков вхождений. Удаление обнуляет длину фрагмента,
+    а compact() пересобирает списки без удалённых id.
+
+    На диске — журналы только для дописывания: docs.jsonl (фрагменты с текстом,
+    id фрагмента — номер строки) и deletes.bin (id удалённых фрагментов), плюс
+    периодический снимок состояния bm25.snapshot с позициями в журналах, до которых
+    он дошёл: строка JSON с метаданными и следом массивы numpy (np.save без pickle,
+    каталог могут делить процессы). При открытии читается снимок и проигрываются
+    хвосты журналов; нечитаемый снимок пропускается, индекс собирается из журналов.
+    Тексты фрагментов читаются из docs.jsonl только для найденных.
+
+    shared=True — каталог делят несколько процессов: изменения дописываются
+    в журналы под исключительной файловой блокировкой, а refresh() применяет
+    только дописанное другими процессами, не перечитывая снимок.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75, save_interval: float = 30.0,
+                 shared: bool = False):
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self.save_interval = save_interval
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(self.directory / LOCK_NAME)
+        self._reset()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._shared_lock():
+            self._load()
+
+    def _reset(self):
+        self._postings: dict[str, Posting] = {}
+        self._doc_lengths = array("I", [0])  # id 0 не используется, чтобы первая дельта была > 0
+        self._codes = array("i", [-1])
+        self._offsets = array("Q", [0])
+        self._documents: list[str] = []
+        self._document_codes: dict[str, int] = {}
+        self._total_length = 0
+        self._live = 0
+        self._deleted = 0
+        self._docs_size = 0  # До какого места применены журналы
+        self._deletes_size = 0
+        self._docs_inode: tp.Optional[int] = None
+        self._dirty = False  # Есть изменения, которых нет в снимке
+        self._saved_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return self._live
+
+    # --- хранение ---
+
+    def _shared_lock(self, exclusive: bool = False) -> tp.ContextManager:
+        if not self.shared:
+            return contextlib.nullcontext()
+        return self._file_lock.acquire(shared=not exclusive)
+
+    def _log_size(self, name: str) -> int:
+        stamp = file_stamp(self.directory / name)
+        return stamp[2] if stamp is not None else 0
+
+    def _load(self):
+        """Снимок (если он согласован с журналами) и записи журналов после него."""
+        state = self._read_snapshot()
+        # Снимок длиннее журналов — журналы заменили, тогда собираем индекс из них заново
+        if (state is not None and state["docs_size"] <= self._log_size(DOCS_NAME)
+                and state["deletes_size"] <= self._log_size(DELETES_NAME)):
+            deltas, tfs, bounds = state["deltas"], state["tfs"], state["bounds"].tolist()
+            for i, (term, last_id) in enumerate(zip(state["terms"], state["last_ids"].tolist())):
+                posting = self._postings[term] = Posting()
+                posting.deltas.frombytes(deltas[bounds[i]:bounds[i + 1]].tobytes())
+                posting.tfs.frombytes(tfs[bounds[i]:bounds[i + 1]].tobytes())
+                posting.last_id = last_id
+            self._doc_lengths = array("I", state["doc_lengths"].tobytes())
+            self._codes = array("i", state["codes"].tobytes())
+            self._offsets = array("Q", state["offsets"].tobytes())
+            self._documents = state["documents"]
+            self._document_codes = {doc: code for code, doc in enumerate(self._documents)}
+            self._total_length = state["total_length"]
+            self._live = state["live"]
+            self._deleted = state["deleted"]
+            self._docs_size = state["docs_size"]
+            self._deletes_size = state["deletes_size"]
+        self._replay()
+
+    def _read_snapshot(self) -> tp.Optional[dict]:
+        try:
+            with open(self.directory / STATE_NAME, "rb") as f:
+                state = orjson.loads(f.readline())
+                for name in SNAPSHOT_ARRAYS:
+                    state[name] = np.load(f, allow_pickle=False)
+        except (OSError, ValueError, EOFError):
+            # Нет снимка или он повреждён (orjson.JSONDecodeError — подкласс ValueError)
+            return None
+        if len(state["bounds"]) != len(state["terms"]) + 1:
+            return None
+        return state
+
+    def _replay(self) -> bool:
+        """
+        Применяет записи журналов после уже применённых. Недописанный хвост
+        (сбой посреди записи) пропускается; обрезается он только в _writing,
+        под исключительной блокировкой. True — индекс изменился.
+        """
+        changed = False
+        docs_stamp = file_stamp(self.directory / DOCS_NAME)
+        if docs_stamp is not None:
+            self._docs_inode = docs_stamp[0]
+            if docs_stamp[2] > self._docs_size:
+                with open(self.directory / DOCS_NAME, "rb") as f:
+                    f.seek(self._docs_size)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        self._index_doc(orjson.loads(line), self._docs_size)
+                        self._docs_size += len(line)
+                        changed = True
+        deletes_size = self._log_size(DELETES_NAME)
+        complete = deletes_size - (deletes_size - self._deletes_size) % DELETE_RECORD_SIZE
+        if complete > self._deletes_size:
+            ids = array("I")
+            with open(self.directory / DELETES_NAME, "rb") as f:
+                f.seek(self._deletes_size)
+                ids.frombytes(f.read(complete - self._deletes_size))
+            self._apply_deletes(ids)
+            self._deletes_size = complete
+            changed = True
+        return changed
+
+    def _rewritten(self) -> bool:
+        """docs.jsonl заменили или укоротили — применять хвост уже нельзя."""
+        stamp = file_stamp(self.directory / DOCS_NAME)
+        if stamp is None:
+            return self._docs_size > 0
+        return (self._docs_inode is not None and stamp[0] != self._docs_inode) or stamp[2] < self._docs_size
+
+    def _catch_up(self) -> bool:
+        if self._rewritten():
+            self._reset()
+            self._load()
+            return True
+        return self._replay()
+
+    def _save_snapshot(self):
+        terms = list(self._postings)
+        postings = [self._postings[term] for term in terms]
+        # Списки вхождений склеены подряд, bounds[i]:bounds[i + 1] — вхождения terms[i]
+        bounds = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(posting.deltas) for posting in postings], out=bounds[1:])
+        arrays = {
+            "doc_lengths": np.frombuffer(self._doc_lengths, dtype=np.uint32),
+            "codes": np.frombuffer(self._codes, dtype=np.int32),
+            "offsets": np.frombuffer(self._offsets, dtype=np.uint64),
+            "bounds": bounds,
+            "deltas": np.frombuffer(b"".join(posting.deltas.tobytes() for posting in postings), dtype=np.uint32),
+            "tfs": np.frombuffer(b"".join(posting.tfs.tobytes() for posting in postings), dtype=np.uint16),
+            "last_ids": np.array([posting.last_id for posting in postings], dtype=np.int64),
+        }
+        meta = {
+            "terms": terms,
+            "documents": self._documents,
+            "total_length": self._total_length,
+            "live": self._live,
+            "deleted": self._deleted,
+            "docs_size": self._docs_size,
+            "deletes_size": self._deletes_size,
+        }
+        path = self.directory / STATE_NAME
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(meta) + b"\n")
+            for name in SNAPSHOT_ARRAYS:
+                np.save(f, arrays[name], allow_pickle=False)
+        os.replace(tmp_path, path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def save(self):
+        """Записывает снимок, если с прошлого есть изменения: журналы после него проигрываются короче."""
+        if not self._dirty:
+            return
+        with self._writing():
+            self._save_snapshot()
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+            self._save_snapshot()
+
+    def refresh(self) -> bool:
+        """Применяет записи, дописанные другими процессами. True — индекс обновился."""
+        if not self.shared:
+            return False
+        if (self._log_size(DOCS_NAME) == self._docs_size and self._log_size(DELETES_NAME) == self._deletes_size
+                and not self._rewritten()):
+            return False
+        with self._lock, self._shared_lock():
+            return self._catch_up()
+
+    @contextlib.contextmanager
+    def _writing(self) -> tp.Iterator[None]:
+        """
+        Изменение индекса: в общем режиме — под исключительной блокировкой поверх
+        всех чужих записей. Недописанные хвосты журналов обрезаются здесь, чтобы
+        новые записи начинались с границы записи.
+        """
+        with self._lock, self._shared_lock(exclusive=True):
+            if self.shared:
+                self._catch_up()
+            for name, size in ((DOCS_NAME, self._docs_size), (DELETES_NAME, self._deletes_size)):
+                if self._log_size(name) > size:
+                    os.truncate(self.directory / name, size)
+            yield
+
+    # --- запись ---
+
+    def _index_doc(self, meta: dict, offset: int):
+        doc_id = len(self._doc_lengths)
+        code = self._document_codes.get(meta["document_id"])
+        if code is None:
+            code = self._document_codes[meta["document_id"]] = len(self._documents)
+            self._documents.append(meta["document_id"])
+        terms = Counter(tokenize(meta["text"]))
+        for term, tf in terms.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = Posting()
+            posting.append(doc_id, tf)
+        length = sum(terms.values())
+        self._doc_lengths.append(length)
+        self._codes.append(code)
+        self._offsets.append(offset)
+        self._total_length += length
+        self._live += 1
+
+    def _apply_deletes(self, ids: tp.Iterable[int]) -> int:
+        removed = 0
+        for doc_id in ids:
+            if doc_id < len(self._codes) and self._codes[doc_id] >= 0:
+                self._total_length -= self._doc_lengths[doc_id]
+                self._doc_lengths[doc_id] = 0
+                self._codes[doc_id] = -1
+                removed += 1
+        self._live -= removed
+        self._deleted += removed
+        return removed
+
+    def add(self, chunks: list[Chunk]):
+        if not chunks:
+            return
+        lines = [
+            orjson.dumps({
+                "chunk_id": chunk.chunk_id,
+                "document_id": chunk.document_id,
+                "source": chunk.source,
+                "text": chunk.text,
+            }) + b"\n"
+            for chunk in chunks
+        ]
+        with self._writing():
+            # Сначала журнал, затем память: после сбоя фрагменты восстановятся при открытии
+            with open(self.directory / DOCS_NAME, "ab") as docs:
+                docs.write(b"".join(lines))
+            offset = self._docs_size
+            for chunk, line in zip(chunks, lines):
+                self._index_doc({"document_id": chunk.document_id, "text": chunk.text}, offset)
+                offset += len(line)
+            self._docs_size = offset
+            self._docs_inode = file_stamp(self.directory / DOCS_NAME)[0]
+            self._dirty = True
+            self._maybe_save()
+
+    def delete(self, document_id: str, source: tp.Optional[str] = None) -> int:
+        """Удаляет фрагменты документа (или одного его источника)."""
+        with self._writing():
+            code = self._document_codes.get(document_id)
+            if code is None:
+                return 0
+            ids = np.flatnonzero(np.frombuffer(self._codes, dtype=np.int32) == code)
+            if source is not None:
+                ids = [doc_id for doc_id, meta in zip(ids, self._read_meta(ids)) if meta["source"] == source]
+            ids = array("I", (int(doc_id) for doc_id in ids))
+            if not ids:
+                return 0
+            with open(self.directory / DELETES_NAME, "ab") as f:
+                f.write(ids.tobytes())
+            self._deletes_size += len(ids) * DELETE_RECORD_SIZE
+            removed = self._apply_deletes(ids)
+            self._dirty = True
+            if self._deleted > max(1000, self._live // 5):
+                self.compact()
+            self._maybe_save()
+            return removed
+
+    def compact(self):
+        """Убирает удалённые id из списков вхождений (в памяти и в следующем снимке)."""
+        with self._writing():
+            alive = np.frombuffer(self._codes, dtype=np.int32) >= 0
+            for term in list(self._postings):
+                ids, tfs = self._postings[term].decode()
+                keep = alive[ids]
+                if not keep.any():
+                    del self._postings[term]
+                    continue
+                posting = Posting()
+                for doc_id, tf in zip(ids[keep].tolist(), tfs[keep].astype(np.uint16).tolist()):
+                    posting.append(doc_id, tf)
+                self._postings[term] = posting
+            self._deleted = 0
+            self._dirty = True
+
+    # --- поиск ---
+
+    def _read_meta(self, ids) -> list[dict]:
+        result = []
+        with open(self.directory / DOCS_NAME, "rb") as f:
+            for doc_id in ids:
+                f.seek(self._offsets[doc_id])
+                result.append(orjson.loads(f.readline()))
+        return result
+
+    def search(self, query: str, k: int = 5, document_ids: tp.Optional[list[str]] = None) -> list[dict]:
+        terms = set(tokenize(query))
+        self.refresh()
+        with self._lock:
+            if not terms or not self._live or k <= 0:
+                return []
+            n_docs = len(self._doc_lengths)
+            doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+            # Копия, а не представление: array нельзя расширять, пока на него смотрит numpy
+            codes = np.frombuffer(self._codes, dtype=np.int32).copy()
+            avg_length = self._total_length / self._live or 1.0
+            all_ids, all_scores = [], []
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                ids, tfs = posting.decode()
+                # Вхождения удалённых фрагментов остаются в списках до compact(),
+                # в df и в оценки они попадать не должны
+                alive = codes[ids] >= 0
+                if not alive.all():
+                    ids, tfs = ids[alive], tfs[alive]
+                df = len(ids)
+                if not df:
+                    continue
+                idf = math.log(1 + (self._live - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths[ids] / avg_length)
+                all_ids.append(ids)
+                all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+            if not all_ids:
+                return []
+
+            scores = np.bincount(np.concatenate(all_ids), weights=np.concatenate(all_scores), minlength=n_docs)
+            mask = codes < 0
+            if document_ids:
+                wanted = [self._document_codes[d] for d in document_ids if d in self._document_codes]
+                mask |= ~np.isin(codes, wanted)
+            scores[mask] = 0.0
+
+            top = min(k, n_docs)
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[scores[best] > 0]
+            best = best[np.argsort(-scores[best])]
+            metas = self._read_meta(best.tolist())
+        return [{**meta, "score": float(scores[doc_id])} for doc_id, meta in zip(best, metas)]
+
+
+__all__ = ["BM25Index", "tokenize"]
@@ -0,0 +1,42 @@
+import functools
+from dataclasses import dataclass
+
+
+@dataclass
+class Chunk:
+    document_id: str
+    source: str  # Имя файла или члена архива, из которого взят фрагмент
+    index: int
+    text: str
+
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.document_id}:{self.source}:{self.index}"
+
+
+@functools.lru_cache(maxsize=8)
+def get_splitter(chunk_size: int, chunk_overlap: int):
+    # langchain_text_splitters тянет langchain_core — импортируем при первой нарезке
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def content_text(content) -> str:
+    """Текст из результата DocumentReader: строка или список постраничных записей."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(record.get("text", "") for record in content if isinstance(record, dict))
+    return ""
+
+
+def split_document(document_id: str, source: str, content, chunk_size: int, chunk_overlap: int) -> list[Chunk]:
+    text = content_text(content)
+    if not text.strip():
+        return []
+    pieces = get_splitter(chunk_size, chunk_overlap).split_text(text)
+    return [Chunk(document_id, source, index, piece) for index, piece in enumerate(pieces)]
+
+
+__all__ = ["Chunk", "content_text", "split_document"]
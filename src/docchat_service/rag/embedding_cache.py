@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+import typing as tp
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import xxhash
+from sqlalchemy import Column, Float, Integer, LargeBinary, MetaData, String, Table, create_engine, delete, func, select, update
+
+from .embeddings import EmbeddingBackend
+
+metadata = MetaData()
+
+embeddings_table = Table(
+    "embeddings",
+    metadata,
+    Column("key", String(64), primary_key=True),
+    Column("vector", LargeBinary, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("last_used", Float, nullable=False, index=True),
+)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_key(text: str, model_name: str) -> str:
+    return xxhash.xxh3_128_hexdigest(f"{model_name}\0{normalize_text(text)}".encode("utf-8"))
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кеш эмбеддингов: LRU в памяти процесса и SQLite на диске.
+    Дисковый уровень ограничен max_bytes, при переполнении удаляются
+    давно не использованные записи. Файл SQLite открывается (и создаётся)
+    при первом обращении к кешу, а не при создании объекта.
+    """
+
+    def __init__(self, path: str, memory_items: int = 10000, max_bytes: int = 512 * 1024 * 1024):
+        self._path = Path(path)
+        self._engine = None
+        self._memory: tp.OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_items = memory_items
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        """Движок SQLite; вызывается под self._lock."""
+        if self._engine is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            # timeout — сколько ждать, пока другой воркер держит блокировку записи SQLite
+            engine = create_engine(f"sqlite:///{self._path}",
+                                   connect_args={"check_same_thread": False, "timeout": 30})
+            metadata.create_all(engine)
+            with engine.connect() as conn:
+                self._disk_bytes = conn.execute(select(func.coalesce(func.sum(embeddings_table.c.size), 0))).scalar()
+            self._engine = engine
+        return self._engine
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+
+            missing = [key for key in keys if key not in found]
+            if missing:
+                with self._connect().begin() as conn:
+                    rows = conn.execute(
+                        select(embeddings_table.c.key, embeddings_table.c.vector)
+                        .where(embeddings_table.c.key.in_(missing))
+                    ).all()
+                    if rows:
+                        conn.execute(
+                            update(embeddings_table)
+                            .where(embeddings_table.c.key.in_([row.key for row in rows]))
+                            .values(last_used=time.time())
+                        )
+                for row in rows:
+                    vector = np.frombuffer(row.vector, dtype=np.float32)
+                    found[row.key] = vector
+                    self._remember(row.key, vector)
+                self.disk_hits += len(rows)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]):
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            {"key": key, "vector": vector.astype(np.float32).tobytes(), "size": vector.nbytes, "last_used": now}
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector.astype(np.float32))
+            with self._connect().begin() as conn:
+                existing = set(conn.execute(
+                    select(embeddings_table.c.key).where(embeddings_table.c.key.in_(list(items)))
+                ).scalars())
+                rows = [row for row in rows if row["key"] not in existing]
+                if rows:
+                    conn.execute(embeddings_table.insert(), rows)
+                    self._disk_bytes += sum(row["size"] for row in rows)
+                if self._disk_bytes > self._max_bytes:
+                    self._evict(conn)
+
+    def _evict(self, conn):
+        # Освобождаем с запасом в 10%, чтобы не чистить на каждой вставке
+        target = self._max_bytes * 0.9
+        oldest = conn.execute(
+            select(embeddings_table.c.key, embeddings_table.c.size).order_by(embeddings_table.c.last_used)
+        )
+        victims = []
+        for row in oldest:
+            if self._disk_bytes <= target:
+                break
+            victims.append(row.key)
+            self._disk_bytes -= row.size
+        oldest.close()
+        for start in range(0, len(victims), 500):
+            conn.execute(delete(embeddings_table).where(embeddings_table.c.key.in_(victims[start:start + 500])))
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self._max_bytes,
+            }
+
+
+class CachedEmbeddingBackend(EmbeddingBackend):
+    """Обёртка над бэкендом: в бэкенд уходят только промахи кеша, без повторов внутри пачки."""
+
+    def __init__(self, backend: EmbeddingBackend, cache: EmbeddingCache):
+        self.backend = backend
+        self.cache = cache
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        keys = [embedding_key(text, self.model_name) for text in texts]
+        found = await asyncio.to_thread(self.cache.get_many, list(dict.fromkeys(keys)))
+
+        missing: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = await self.backend.embed(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            await asyncio.to_thread(self.cache.put_many, computed)
+            found.update(computed)
+
+        if not keys:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([found[key] for key in keys])
+
+
+__all__ = ["EmbeddingCache", "CachedEmbeddingBackend", "embedding_key"]
@@ -0,0 +1,78 @@
+import re
+
+import numpy as np
+import xxhash
+
+from src.docchat_service.capabilities import require
+from src.docchat_service.config import RagSettings
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class EmbeddingBackend:
+    """Превращает тексты в матрицу float32 (по строке на текст)."""
+
+    model_name: str
+    dim: int
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+
+class FakeEmbeddings(EmbeddingBackend):
+    """
+    Детерминированные эмбеддинги без внешних сервисов: хеширование слов
+    в `dim` корзин со знаком. Тексты с общими словами получают близкие векторы,
+    этого достаточно для тестов и бенчмарков.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model_name = f"fake-{dim}"
+
+    def embed_sync(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_RE.findall(text.lower()):
+                h = xxhash.xxh64_intdigest(token.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    """Клиент LangChain создаётся при первом запросе: импорт langchain_ollama занимает заметное время."""
+
+    def __init__(self, model: str, base_url: str):
+        self.model_name = model
+        self.dim = 0  # Узнаём из первого ответа
+        self._base_url = base_url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = require("langchain_ollama").OllamaEmbeddings(model=self.model_name, base_url=self._base_url)
+        return self._client
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.asarray(await self.client.aembed_documents(texts), dtype=np.float32)
+        if vectors.size:
+            self.dim = vectors.shape[1]
+        return vectors
+
+
+def make_embedding_backend(settings: RagSettings) -> EmbeddingBackend:
+    if settings.embedding_backend == "fake":
+        return FakeEmbeddings(settings.embedding_dim)
+    return OllamaEmbeddingBackend(settings.embedding_model, settings.ollama_base_url)
+
+
+__all__ = ["EmbeddingBackend", "FakeEmbeddings", "OllamaEmbeddingBackend", "make_embedding_backend"]
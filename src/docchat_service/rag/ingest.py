@@ -0,0 +1,84 @@
+import asyncio
+import typing as tp
+
+import numpy as np
+
+from src.docchat_service.config import RagSettings
+from .chunking import Chunk
+from .bm25 import BM25Index
+from .embeddings import EmbeddingBackend
+from .vector_index import VectorIndex
+
+
+class IngestPipeline:
+    """
+    Эмбеддинги для нарезанных фрагментов: пачки по embed_batch_size,
+    не больше embed_concurrency запросов к бэкенду одновременно на весь процесс.
+    on_ingest получает id документов, фрагменты которых попали в индексы.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, settings: RagSettings,
+                 vector_index: tp.Optional[VectorIndex] = None, bm25_index: tp.Optional[BM25Index] = None,
+                 on_ingest: tp.Optional[tp.Callable[[list[str]], None]] = None):
+        self.backend = backend
+        self.vector_index = vector_index
+        self.bm25_index = bm25_index
+        self.on_ingest = on_ingest
+        self.enabled = settings.ingest_enabled
+        self._settings = settings
+        self._semaphore: tp.Optional[asyncio.Semaphore] = None
+
+    async def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._settings.embed_concurrency)
+        async with self._semaphore:
+            return await self.backend.embed(texts)
+
+    async def embed_chunks(self, chunks: list[Chunk]) -> np.ndarray:
+        size = self._settings.embed_batch_size
+        batches = [chunks[i:i + size] for i in range(0, len(chunks), size)]
+        results = await asyncio.gather(*(self._embed_batch([c.text for c in batch]) for batch in batches))
+        if not results:
+            return np.zeros((0, self.backend.dim), dtype=np.float32)
+        return np.vstack(results)
+
+    async def ingest(self, chunks: list[Chunk]) -> int:
+        """
+        Индексирует фрагменты документа (BM25 и векторы), возвращает число фрагментов.
+        Сначала считаются эмбеддинги: если бэкенд недоступен, в индексы не попадает
+        ничего и повторная загрузка не задвоит фрагменты. Если не удалось добавить
+        в BM25, уже добавленные векторы откатываются.
+        """
+        if not chunks:
+            return 0
+        vectors = await self.embed_chunks(chunks)
+        if self.vector_index is not None:
+            await asyncio.to_thread(self.vector_index.add, chunks, vectors)
+        if self.bm25_index is not None:
+            try:
+                await asyncio.to_thread(self.bm25_index.add, chunks)
+            except Exception:
+                if self.vector_index is not None:
+                    for document_id, source in dict.fromkeys((c.document_id, c.source) for c in chunks):
+                        await asyncio.to_thread(self.vector_index.delete, document_id, source)
+                raise
+        if self.on_ingest is not None:
+            self.on_ingest(list(dict.fromkeys(chunk.document_id for chunk in chunks)))
+        return len(chunks)
+
+    async def delete(self, document_id: str, sources: list[str]) -> int:
+        """Убирает из индексов фрагменты перечисленных источников документа, возвращает их число."""
+        removed = 0
+        for source in sources:
+            counts = []
+            if self.bm25_index is not None:
+                counts.append(await asyncio.to_thread(self.bm25_index.delete, document_id, source))
+            if self.vector_index is not None:
+                counts.append(await asyncio.to_thread(self.vector_index.delete, document_id, source))
+            removed += max(counts, default=0)
+        if removed and self.on_ingest is not None:
+            self.on_ingest([document_id])
+        return removed
+
+
+__all__ = ["IngestPipeline"]
@@ -0,0 +1,76 @@
+import asyncio
+import typing as tp
+
+from .bm25 import BM25Index
+from .embeddings import EmbeddingBackend
+from .vector_index import VectorIndex
+
+# Константа reciprocal rank fusion: сглаживает вклад первых позиций
+RRF_K = 60
+
+
+def fuse(result_lists: list[list[dict]], k: int) -> list[dict]:
+    """Объединяет ранжированные списки фрагментов методом reciprocal rank fusion."""
+    scores: dict[str, float] = {}
+    hits: dict[str, dict] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results):
+            chunk_id = hit["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            hits.setdefault(chunk_id, hit)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [{**hits[chunk_id], "score": scores[chunk_id]} for chunk_id in best]
+
+
+class Retriever:
+    """
+    Поиск фрагментов, релевантных вопросу: векторный индекс и BM25,
+    результаты которых объединяются через reciprocal rank fusion.
+    on_change вызывается, когда индексы изменил другой процесс.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, vector_index: VectorIndex,
+                 bm25_index: tp.Optional[BM25Index] = None, top_k: int = 5,
+                 on_change: tp.Optional[tp.Callable[[], None]] = None):
+        self.backend = backend
+        self.vector_index = vector_index
+        self.bm25_index = bm25_index
+        self.top_k = top_k
+        self.on_change = on_change
+
+    async def refresh(self) -> bool:
+        """Подхватывает изменения индексов, сделанные другими воркерами."""
+        indexes = [index for index in (self.vector_index, self.bm25_index) if index is not None and index.shared]
+        if not indexes:
+            return False
+        changed = any(await asyncio.gather(*(asyncio.to_thread(index.refresh) for index in indexes)))
+        if changed and self.on_change is not None:
+            self.on_change()
+        return changed
+
+    async def _vector_search(self, query: str, k: int, document_ids) -> list[dict]:
+        if self.vector_index.size == 0:
+            return []
+        query_vector = await self.backend.embed_query(query)
+        return await asyncio.to_thread(self.vector_index.search, query_vector, k, document_ids)
+
+    async def _lexical_search(self, query: str, k: int, document_ids) -> list[dict]:
+        if self.bm25_index is None or self.bm25_index.size == 0:
+            return []
+        return await asyncio.to_thread(self.bm25_index.search, query, k, document_ids)
+
+    async def retrieve(self, query: str, k: tp.Optional[int] = None,
+                       document_ids: tp.Optional[list[str]] = None) -> list[dict]:
+        k = k or self.top_k
+        await self.refresh()
+        results = await asyncio.gather(
+            self._vector_search(query, k, document_ids),
+            self._lexical_search(query, k, document_ids),
+        )
+        results = [hits for hits in results if hits]
+        if len(results) == 1:
+            return results[0]
+        return fuse(results, k)
+
+
+__all__ = ["Retriever", "fuse"]
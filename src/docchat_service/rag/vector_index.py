@@ -0,0 +1,438 @@
+import contextlib
+import math
+import os
+import threading
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from src.docchat_service.locks import FileLock, file_stamp
+
+from .chunking import Chunk
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+MERGE_LOCK_NAME = ".merge.lock"  # Слияние идёт в одном потоке одного процесса за раз
+# Ярус сегмента — порядок числа его живых строк по этому основанию; сливаются сегменты одного яруса
+MERGE_FACTOR = 4
+MERGE_BATCH_ROWS = 65536  # Столько векторов за раз копируется при слиянии
+
+
+class Segment:
+    """
+    Неизменяемый сегмент индекса. Векторы, коды документов и смещения строк
+    метаданных лежат в .npy и отображаются в память при первом обращении.
+    """
+
+    def __init__(self, directory: Path, name: str, rows: int, documents: list[str]):
+        self.directory = directory
+        self.name = name
+        self.rows = rows
+        self.documents = documents  # Код документа в codes — индекс в этом списке
+        self._vectors: tp.Optional[np.ndarray] = None
+        self._codes: tp.Optional[np.ndarray] = None
+        self._offsets: tp.Optional[np.ndarray] = None
+
+    def _path(self, kind: str) -> Path:
+        return self.directory / f"{self.name}.{kind}"
+
+    @property
+    def files(self) -> list[Path]:
+        return [self._path(kind) for kind in ("vec.npy", "codes.npy", "offsets.npy", "meta.jsonl")]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            self._vectors = np.load(self._path("vec.npy"), mmap_mode="r")
+        return self._vectors
+
+    @property
+    def codes(self) -> np.ndarray:
+        if self._codes is None:
+            self._codes = np.load(self._path("codes.npy"), mmap_mode="r")
+        return self._codes
+
+    @property
+    def offsets(self) -> np.ndarray:
+        if self._offsets is None:
+            self._offsets = np.load(self._path("offsets.npy"), mmap_mode="r")
+        return self._offsets
+
+    def read_meta(self, rows: tp.Iterable[int]) -> list[dict]:
+        offsets = self.offsets
+        result = []
+        with open(self._path("meta.jsonl"), "rb") as f:
+            for row in rows:
+                f.seek(int(offsets[row]))
+                result.append(orjson.loads(f.read(int(offsets[row + 1] - offsets[row]))))
+        return result
+
+    def iter_meta(self) -> tp.Iterator[dict]:
+        with open(self._path("meta.jsonl"), "rb") as f:
+            for line in f:
+                yield orjson.loads(line)
+
+    @classmethod
+    def write(cls, directory: Path, name: str, vectors: np.ndarray, metas: list[dict]) -> "Segment":
+        documents: list[str] = []
+        codes_by_document: dict[str, int] = {}
+        codes = np.empty(len(metas), dtype=np.int32)
+        offsets = np.empty(len(metas) + 1, dtype=np.int64)
+        meta_path = directory / f"{name}.meta.jsonl"
+        with open(meta_path, "wb") as f:
+            for row, meta in enumerate(metas):
+                document_id = meta["document_id"]
+                if document_id not in codes_by_document:
+                    codes_by_document[document_id] = len(documents)
+                    documents.append(document_id)
+                codes[row] = codes_by_document[document_id]
+                offsets[row] = f.tell()
+                f.write(orjson.dumps(meta) + b"\n")
+            offsets[len(metas)] = f.tell()
+        np.save(directory / f"{name}.vec.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+        np.save(directory / f"{name}.codes.npy", codes)
+        np.save(directory / f"{name}.offsets.npy", offsets)
+        return cls(directory, name, len(metas), documents)
+
+    @classmethod
+    def merge(cls, directory: Path, name: str, dim: int, sources: list[tuple["Segment", np.ndarray]]) -> "Segment":
+        """
+        Новый сегмент из строк live каждого исходного сегмента. Векторы пишутся
+        пачками по MERGE_BATCH_ROWS прямо в отображённый в память .npy,
+        метаданные копируются построчно, поэтому в памяти не весь индекс,
+        а пачка векторов и коды/смещения строк.
+        """
+        total = sum(len(live) for _, live in sources)
+        vectors = np.lib.format.open_memmap(
+            directory / f"{name}.vec.npy", mode="w+", dtype=np.float32, shape=(total, dim)
+        )
+        codes = np.empty(total, dtype=np.int32)
+        offsets = np.empty(total + 1, dtype=np.int64)
+        codes_by_document: dict[str, int] = {}  # Порядок ключей — порядок кодов
+        row = 0
+        with open(directory / f"{name}.meta.jsonl", "wb") as out:
+            for segment, live in sources:
+                if not live.size:
+                    continue
+                source_codes = np.asarray(segment.codes[live])
+                # Документы без живых строк в новый сегмент не переходят
+                remap = np.full(len(segment.documents), -1, dtype=np.int32)
+                for code in np.unique(source_codes).tolist():
+                    remap[code] = codes_by_document.setdefault(segment.documents[code], len(codes_by_document))
+                codes[row:row + len(live)] = remap[source_codes]
+                for start in range(0, len(live), MERGE_BATCH_ROWS):
+                    batch = live[start:start + MERGE_BATCH_ROWS]
+                    vectors[row + start:row + start + len(batch)] = segment.vectors[batch]
+                wanted = iter(live.tolist())
+                next_row = next(wanted, None)
+                with open(segment._path("meta.jsonl"), "rb") as f:
+                    for source_row, line in enumerate(f):
+                        if source_row != next_row:
+                            continue
+                        offsets[row] = out.tell()
+                        out.write(line)
+                        row += 1
+                        next_row = next(wanted, None)
+                        if next_row is None:
+                            break
+            offsets[total] = out.tell()
+        vectors.flush()
+        del vectors
+        np.save(directory / f"{name}.codes.npy", codes)
+        np.save(directory / f"{name}.offsets.npy", offsets)
+        return cls(directory, name, total, list(codes_by_document))
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "rows": self.rows, "documents": self.documents}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    Векторный индекс фрагментов без внешних сервисов.
+    Добавление пишет новый сегмент (append-only), удаление помечает строки
+    в манифесте. Когда сегментов больше max_segments, сливаются сегменты
+    близкого размера (ярусами по MERGE_FACTOR), поэтому каждая строка
+    переписывается O(log N) раз, а не при каждом слиянии; compact() сливает всё.
+    Слияние пишется вне блокировок и подменяет сегменты в манифесте в конце.
+    При открытии читается только манифест, сегменты отображаются лениво.
+
+    shared=True — каталог делят несколько процессов: запись идёт под файловой
+    блокировкой поверх свежего манифеста, а refresh() перечитывает манифест,
+    если его заменил другой процесс.
+    """
+
+    def __init__(self, directory: str, max_segments: int = 16, shared: bool = False):
+        self.directory = Path(directory)
+        self.max_segments = max_segments
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(self.directory / LOCK_NAME)
+        self.dim: tp.Optional[int] = None
+        self._segments: list[Segment] = []
+        self._deleted: dict[str, set[int]] = {}
+        self._next_segment = 1
+        self._stamp = None
+        # Держится всё слияние: иначе два процесса сольют одни и те же сегменты,
+        # и один удалит исходные файлы, пока другой их читает
+        self._merge_lock = FileLock(self.directory / MERGE_LOCK_NAME)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._shared_lock():
+            self._load_manifest()
+
+    # --- манифест ---
+
+    def _shared_lock(self, exclusive: bool = False) -> tp.ContextManager:
+        if not self.shared:
+            return contextlib.nullcontext()
+        return self._file_lock.acquire(shared=not exclusive)
+
+    def _load_manifest(self):
+        path = self.directory / MANIFEST_NAME
+        self._stamp = file_stamp(path)
+        self.dim = None
+        self._segments = []
+        self._deleted = {}
+        self._next_segment = 1
+        if self._stamp is None:
+            return
+        manifest = orjson.loads(path.read_bytes())
+        self.dim = manifest["dim"]
+        self._next_segment = manifest["next_segment"]
+        self._segments = [
+            Segment(self.directory, item["name"], item["rows"], item["documents"])
+            for item in manifest["segments"]
+        ]
+        self._deleted = {name: set(rows) for name, rows in manifest["deleted"].items()}
+
+    def _save_manifest(self):
+        manifest = {
+            "dim": self.dim,
+            "next_segment": self._next_segment,
+            "segments": [segment.to_dict() for segment in self._segments],
+            "deleted": {name: sorted(rows) for name, rows in self._deleted.items() if rows},
+        }
+        path = self.directory / MANIFEST_NAME
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(orjson.dumps(manifest))
+        os.replace(tmp_path, path)
+        self._stamp = file_stamp(path)
+
+    def refresh(self) -> bool:
+        """Перечитывает манифест, если его изменил другой процесс. True — индекс обновился."""
+        if not self.shared or file_stamp(self.directory / MANIFEST_NAME) == self._stamp:
+            return False
+        with self._lock, self._shared_lock():
+            if file_stamp(self.directory / MANIFEST_NAME) == self._stamp:
+                return False
+            self._load_manifest()
+        return True
+
+    @contextlib.contextmanager
+    def _writing(self) -> tp.Iterator[None]:
+        """Изменение индекса: в общем режиме — под исключительной блокировкой и поверх свежего манифеста."""
+        with self._lock, self._shared_lock(exclusive=True):
+            if self.shared and file_stamp(self.directory / MANIFEST_NAME) != self._stamp:
+                self._load_manifest()
+            yield
+
+    def _new_segment_name(self) -> str:
+        name = f"seg_{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    # --- запись ---
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return sum(s.rows for s in self._segments) - sum(len(r) for r in self._deleted.values())
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    def add(self, chunks: list[Chunk], vectors: np.ndarray):
+        if not chunks:
+            return
+        if len(chunks) != len(vectors):
+            raise ValueError("Число фрагментов и векторов не совпадает")
+        vectors = normalize(vectors)
+        with self._writing():
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с индексом ({self.dim})")
+            metas = [
+                {"chunk_id": c.chunk_id, "document_id": c.document_id, "source": c.source, "text": c.text}
+                for c in chunks
+            ]
+            segment = Segment.write(self.directory, self._new_segment_name(), vectors, metas)
+            self._segments.append(segment)
+            self._save_manifest()
+        if len(self._segments) <= self.max_segments:
+            return
+        with self._merge_lock.acquire(blocking=False) as acquired:
+            # Слиянием уже занят другой поток или процесс — он подхватит и этот сегмент
+            while acquired and self._merge(self._pick_merge):
+                pass
+
+    def delete(self, document_id: str, source: tp.Optional[str] = None) -> int:
+        """Помечает удалёнными фрагменты документа (или одного его источника)."""
+        removed = 0
+        with self._writing():
+            for segment in self._segments:
+                if document_id not in segment.documents:
+                    continue
+                deleted = self._deleted.setdefault(segment.name, set())
+                for row, meta in enumerate(segment.iter_meta()):
+                    if meta["document_id"] == document_id and (source is None or meta["source"] == source):
+                        if row not in deleted:
+                            deleted.add(row)
+                            removed += 1
+            if removed:
+                self._save_manifest()
+        return removed
+
+    def compact(self):
+        """Сливает все сегменты в один, без удалённых строк."""
+        with self._merge_lock.acquire():
+            self._merge(lambda: list(self._segments))
+
+    def _live_rows(self, segment: Segment) -> int:
+        return segment.rows - len(self._deleted.get(segment.name, ()))
+
+    def _pick_merge(self) -> list[Segment]:
+        """
+        Сегменты для очередного слияния, пока их больше max_segments:
+        самый мелкий ярус, где набралось MERGE_FACTOR сегментов, а если такого
+        нет — самые маленькие сегменты, сколько нужно, чтобы уложиться в лимит.
+        """
+        if len(self._segments) <= self.max_segments:
+            return []
+        tiers: dict[int, list[Segment]] = {}
+        for segment in self._segments:
+            tiers.setdefault(int(math.log(max(self._live_rows(segment), 1), MERGE_FACTOR)), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier]
+        count = max(2, len(self._segments) - self.max_segments + 1)
+        return sorted(self._segments, key=self._live_rows)[:count]
+
+    def _merge(self, pick: tp.Callable[[], list[Segment]]) -> bool:
+        """
+        Сливает сегменты, выбранные pick() под блокировкой. Новый сегмент пишется
+        без блокировок; затем под блокировкой он заменяет исходные в манифесте,
+        а строки, удалённые за время слияния, переносятся на него.
+        False — сливать нечего или исходные сегменты уже слил другой процесс.
+        """
+        with self._writing():
+            chosen = pick()
+            if len(chosen) < 2 and not any(self._deleted.get(segment.name) for segment in chosen):
+                return False
+            sources = []
+            for segment in chosen:
+                deleted = self._deleted.get(segment.name, set())
+                live = np.array([row for row in range(segment.rows) if row not in deleted], dtype=np.int64)
+                sources.append((segment, live))
+            name = self._new_segment_name()
+            # Имя сегмента занято в манифесте, чтобы его не взял другой процесс
+            self._save_manifest()
+            dim = self.dim
+
+        merged = Segment.merge(self.directory, name, dim, sources)
+
+        with self._writing():
+            names = [segment.name for segment, _ in sources]
+            current = [segment.name for segment in self._segments]
+            if not set(names) <= set(current):
+                for path in merged.files:
+                    path.unlink(missing_ok=True)
+                return False
+            deleted, offset = [], 0
+            for segment, live in sources:
+                later = np.array(sorted(self._deleted.get(segment.name, ())), dtype=np.int64)
+                if later.size and live.size:
+                    positions = np.minimum(np.searchsorted(live, later), len(live) - 1)
+                    deleted.extend((offset + positions[live[positions] == later]).tolist())
+                offset += len(live)
+            position = current.index(names[0])
+            self._segments = [segment for segment in self._segments if segment.name not in names]
+            if merged.rows:
+                self._segments.insert(position, merged)
+            for segment_name in names:
+                self._deleted.pop(segment_name, None)
+            if deleted:
+                self._deleted[name] = set(deleted)
+            self._save_manifest()
+            if not merged.rows:
+                for path in merged.files:
+                    path.unlink(missing_ok=True)
+            for segment, _ in sources:
+                for path in segment.files:
+                    path.unlink(missing_ok=True)
+        return True
+
+    # --- поиск ---
+
+    def search(self, query: np.ndarray, k: int = 5, document_ids: tp.Optional[list[str]] = None) -> list[dict]:
+        """Top-k по косинусной близости, при document_ids — только среди этих документов."""
+        self.refresh()
+        try:
+            return self._search(query, k, document_ids)
+        except FileNotFoundError:
+            # Сегменты слиты (другим потоком или процессом) после того, как мы взяли их список
+            self.refresh()
+            return self._search(query, k, document_ids)
+
+    def _search(self, query: np.ndarray, k: int, document_ids: tp.Optional[list[str]]) -> list[dict]:
+        with self._lock:
+            segments = list(self._segments)
+            deleted = {name: list(rows) for name, rows in self._deleted.items()}
+        if not segments or k <= 0:
+            return []
+
+        query = normalize(query).reshape(-1)
+        wanted = set(document_ids or [])
+        candidates = []  # (scores, segment, rows)
+        for segment in segments:
+            if wanted and wanted.isdisjoint(segment.documents):
+                continue
+            scores = np.asarray(segment.vectors @ query, dtype=np.float32)
+            if wanted:
+                codes = [code for code, doc in enumerate(segment.documents) if doc in wanted]
+                scores[~np.isin(segment.codes, codes)] = -np.inf
+            if deleted.get(segment.name):
+                scores[deleted[segment.name]] = -np.inf
+            top = min(k, len(scores))
+            rows = np.argpartition(-scores, top - 1)[:top]
+            rows = rows[np.isfinite(scores[rows])]
+            if rows.size:
+                candidates.append((scores[rows], segment, rows))
+        if not candidates:
+            return []
+
+        all_scores = np.concatenate([scores for scores, _, _ in candidates])
+        owners = np.concatenate([np.full(len(rows), i) for i, (_, _, rows) in enumerate(candidates)])
+        all_rows = np.concatenate([rows for _, _, rows in candidates])
+        top = min(k, len(all_scores))
+        best = np.argpartition(-all_scores, top - 1)[:top]
+        best = best[np.argsort(-all_scores[best])]
+
+        hits = []
+        for i in best:
+            _, segment, _ = candidates[owners[i]]
+            meta = segment.read_meta([int(all_rows[i])])[0]
+            hits.append({**meta, "score": float(all_scores[i])})
+        return hits
+
+
+__all__ = ["VectorIndex", "normalize"]
@@ -0,0 +1,121 @@
+import os
+import threading
+import typing as tp
+from collections import OrderedDict
+from pathlib import Path
+
+import orjson
+
+from src.docchat_service.config import CacheSettings
+
+
+class ResultCache:
+    """
+    Дисковый кеш результатов извлечения, адресуемый хешем содержимого.
+    Каждая запись — отдельный JSON-файл, в памяти хранится только индекс
+    ключ → размер в порядке последнего использования (LRU).
+    Каталог могут делить несколько воркеров: записи атомарны (os.replace),
+    а чужие записи находятся на диске при промахе по индексу. Лимит размера
+    каждый воркер соблюдает по своему индексу, поэтому он приблизительный.
+    """
+
+    def __init__(self, settings: CacheSettings):
+        self.enabled = settings.result_cache_enabled
+        self._dir = Path(settings.result_cache_dir)
+        self._max_bytes = settings.result_cache_max_bytes
+        self._index: tp.OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self._dir / f"{key}.json"
+
+    def _load_index(self):
+        self._dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self._dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        # Самые давно использованные записи — в начале индекса
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> tp.Optional[dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            known = key in self._index
+            if known:
+                self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            # Запись, которой нет в индексе, мог сделать другой воркер — проверяем диск
+            payload = path.read_bytes()
+            data = orjson.loads(payload)
+            # mtime хранит порядок LRU между перезапусками
+            os.utime(path)
+        except (OSError, orjson.JSONDecodeError):
+            with self._lock:
+                self._size -= self._index.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            if not known and key not in self._index:
+                self._index[key] = len(payload)
+                self._size += len(payload)
+            self.hits += 1
+        return data
+
+    def put(self, key: str, value: dict):
+        if not self.enabled:
+            return
+        payload = orjson.dumps(value)
+        if len(payload) > self._max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size -= self._index.pop(key, 0)
+            self._index[key] = len(payload)
+            self._size += len(payload)
+            self._evict()
+
+    def delete(self, key: str):
+        """Убирает запись, которая оказалась недействительной (например, удалён сохранённый результат)."""
+        with self._lock:
+            self._size -= self._index.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        while self._size > self._max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self._path(key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._index),
+                "bytes": self._size,
+                "max_bytes": self._max_bytes,
+            }
+
+
+__all__ = ["ResultCache"]
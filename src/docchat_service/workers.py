@@ -0,0 +1,125 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import threading
+import typing as tp
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.docchat_service.config import ParserSettings
+
+T = tp.TypeVar("T")
+
+
+class ParserPoolBusy(Exception):
+    """Очередь на парсинг переполнена, запрос нужно повторить позже."""
+
+
+class ParserPool:
+    """
+    Пул для синхронного парсинга документов вне event loop.
+    Одновременно выполняется не больше `concurrency` задач, ещё `parser_queue_size`
+    могут ждать слот — остальные сразу получают ParserPoolBusy.
+    initializer/initargs передаются процессному пулу (например, настройка логов в дочернем процессе).
+    """
+
+    def __init__(self, settings: ParserSettings, initializer: tp.Optional[tp.Callable] = None, initargs: tuple = ()):
+        self._settings = settings
+        self._initializer = initializer
+        self._initargs = initargs
+        self._executor: tp.Optional[Executor] = None
+        self._semaphore: tp.Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def kind(self) -> str:
+        return self._settings.parser_pool
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._settings.parser_workers,
+                initializer=self._initializer,
+                initargs=self._initargs,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._settings.parser_workers,
+                thread_name_prefix="parser",
+            )
+        self._semaphore = asyncio.Semaphore(self._settings.concurrency)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._executor = None
+        self._semaphore = None
+
+    def check_capacity(self):
+        if self._waiting >= self._settings.parser_queue_size:
+            raise ParserPoolBusy(f"В очереди на парсинг уже {self._waiting} задач")
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> tp.AsyncIterator[None]:
+        """Занимает слот пула, не отправляя работу в executor (для потоковой обработки)."""
+        if self._executor is None:
+            self.start()
+        self.check_capacity()
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    async def run(self, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        async with self.slot():
+            loop = asyncio.get_running_loop()
+            call = functools.partial(func, *args, **kwargs)
+            if self.kind == "thread":
+                # Как asyncio.to_thread: контекст запроса (trace_id для логов) переходит в поток
+                call = functools.partial(contextvars.copy_context().run, call)
+            return await loop.run_in_executor(self._executor, call)
+
+_pdf_page_pool: tp.Optional[ProcessPoolExecutor] = None
+_pdf_page_pool_lock = threading.Lock()
+
+
+def get_pdf_page_pool(max_workers: int, initializer: tp.Optional[tp.Callable] = None,
+                      initargs: tuple = ()) -> ProcessPoolExecutor:
+    """Процессный пул для постраничного разбора PDF, создаётся при первом обращении."""
+    global _pdf_page_pool
+    with _pdf_page_pool_lock:
+        if _pdf_page_pool is None:
+            _pdf_page_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        return _pdf_page_pool
+
+
+def shutdown_pdf_page_pool(wait: bool = True):
+    global _pdf_page_pool
+    with _pdf_page_pool_lock:
+        if _pdf_page_pool is not None:
+            _pdf_page_pool.shutdown(wait=wait, cancel_futures=not wait)
+            _pdf_page_pool = None
+
+
+__all__ = ["ParserPool", "ParserPoolBusy", "get_pdf_page_pool", "shutdown_pdf_page_pool"]
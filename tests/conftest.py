@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Настройки читаются при импорте приложения: каталоги и бэкенды задаём до него
+WORK_DIR = tempfile.mkdtemp(prefix="docchat_tests_")
+os.environ.update({
+    "INGEST_ENABLED": "true",
+    "EMBEDDING_BACKEND": "fake",
+    "GENERATOR_BACKEND": "fake",
+    "LOG_LEVEL": "WARNING",
+    "LOG_STREAM": "stderr",
+    "OUTPUT_DIR": os.path.join(WORK_DIR, "output"),
+    "UPLOAD_TMP_DIR": os.path.join(WORK_DIR, "tmp"),
+    "RESULT_CACHE_DIR": os.path.join(WORK_DIR, "cache", "results"),
+    "JOB_STATE_DIR": os.path.join(WORK_DIR, "cache", "jobs"),
+    "INDEX_DIR": os.path.join(WORK_DIR, "cache", "index"),
+    "EMBED_CACHE_PATH": os.path.join(WORK_DIR, "cache", "embeddings.sqlite"),
+})
+os.makedirs(os.environ["UPLOAD_TMP_DIR"], exist_ok=True)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from src.docchat_service.api import app_main
+
+    with TestClient(app_main) as test_client:
+        yield test_client
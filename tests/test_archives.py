@@ -0,0 +1,40 @@
+import io
+import os
+import zipfile
+from pathlib import Path
+
+import orjson
+
+from src.docchat_service.context import APP_CTX
+
+
+def make_zip(members: dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, text in members.items():
+            archive.writestr(name, text)
+    return buffer.getvalue()
+
+
+def upload_zip(client, name: str, members: dict[str, str]) -> dict:
+    response = client.post("/api/v1/upload", files={"file": (name, make_zip(members), "application/zip")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_archive_manifest_prunes_removed_members(client):
+    output_dir = Path(os.environ["OUTPUT_DIR"])
+    first = upload_zip(client, "prune.zip", {"keep.txt": "постоянный член архива", "gone.txt": "удаляемый член архива"})
+    manifest = orjson.loads((output_dir / "prune.manifest.json").read_bytes())
+    assert set(manifest["members"]) == {"keep.txt", "gone.txt"}
+    gone_output = Path(manifest["members"]["gone.txt"]["output"])
+    assert gone_output.exists()
+
+    second = upload_zip(client, "prune.zip", {"keep.txt": "постоянный член архива", "new.txt": "новый член архива"})
+    assert second["document_id"] == first["document_id"]
+    manifest = orjson.loads((output_dir / "prune.manifest.json").read_bytes())
+    assert set(manifest["members"]) == {"keep.txt", "new.txt"}
+    assert not gone_output.exists()
+
+    hits = APP_CTX.get_retriever().bm25_index.search("член архива", k=20, document_ids=[first["document_id"]])
+    assert sorted(hit["source"] for hit in hits) == ["keep.txt", "new.txt"]
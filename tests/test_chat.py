@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+
+import orjson
+
+from src.docchat_service.api import app_main
+from src.docchat_service.chat import FakeGenerator
+from src.docchat_service.context import APP_CTX
+
+
+def upload_text(client, name: str, text: str) -> dict:
+    response = client.post("/api/v1/upload", files={"file": (name, text.encode("utf-8"), "text/plain")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def ask(client, message: str, document_ids=()) -> dict:
+    response = client.post("/api/v1/chat", json={"message": message, "document_ids": list(document_ids)})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_answer_cache_invalidated_on_ingest(client):
+    scoped = upload_text(client, "scoped.txt", "Срок поставки тридцать дней.")
+    assert scoped["chunks_created"] == 1
+
+    assert not ask(client, "Какой срок поставки?")["cached"]
+    assert ask(client, "Какой срок поставки?")["cached"]
+    assert not ask(client, "Какой срок поставки?", [scoped["document_id"]])["cached"]
+    assert ask(client, "Какой срок поставки?", [scoped["document_id"]])["cached"]
+
+    upload_text(client, "other.txt", "Гарантийный срок двенадцать месяцев.")
+    # Новый документ сбрасывает ответы по всем документам, но не по чужому набору
+    assert not ask(client, "Какой срок поставки?")["cached"]
+    assert ask(client, "Какой срок поставки?", [scoped["document_id"]])["cached"]
+
+
+class TrackingGenerator(FakeGenerator):
+    def __init__(self):
+        super().__init__(token_delay=0.05)
+        self.tokens = 0
+        self.closed = False
+
+    async def stream(self, message, mode, context, history=()):
+        try:
+            async for token in super().stream(message, mode, context, history):
+                self.tokens += 1
+                yield token
+        finally:
+            self.closed = True
+
+
+async def stream_until_first_token(message: str, session_id: str) -> list[dict]:
+    """Запрос к /chat/stream напрямую через ASGI: клиент отключается после первого токена."""
+    body = orjson.dumps({"message": message, "session_id": session_id})
+    first_token = asyncio.Event()
+    requested = False
+    sent = []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await first_token.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if b"event: token" in message.get("body", b""):
+            first_token.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/v1/chat/stream",
+        "raw_path": b"/api/v1/chat/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+        "client": ("test", 50000),
+        "server": ("test", 80),
+    }
+    await asyncio.wait_for(app_main(scope, receive, send), timeout=10)
+    return sent
+
+
+def test_sse_stream_stops_on_disconnect(client, monkeypatch):
+    generator = TrackingGenerator()
+    monkeypatch.setattr(APP_CTX, "generator", generator)
+    session_id = str(uuid.uuid4())
+    message = "Расскажи подробно про условия договора поставки"
+
+    sent = asyncio.run(stream_until_first_token(message, session_id))
+
+    body = b"".join(part.get("body", b"") for part in sent if part["type"] == "http.response.body")
+    assert sent[0]["status"] == 200
+    assert b"event: token" in body
+    assert b"event: done" not in body
+    assert generator.closed
+    assert generator.tokens < len(FakeGenerator.answer(message, "general").split())
+    # Оборванный ответ не попадает ни в историю сессии, ни в кеш ответов
+    assert asyncio.run(APP_CTX.get_session_store().get_history(session_id)) == []
@@ -0,0 +1,52 @@
+import asyncio
+
+from src.docchat_service.config import RagSettings
+from src.docchat_service.rag import BM25Index, FakeEmbeddings, IngestPipeline, Retriever, VectorIndex, split_document
+
+TEXT = (
+    "Поставка оборудования выполняется в течение тридцати дней после оплаты. "
+    "Исполнитель отвечает за качество монтажа и пусконаладочных работ. "
+    "Гарантийный срок на оборудование составляет двенадцать месяцев."
+)
+
+
+def open_rag(directory):
+    backend = FakeEmbeddings()
+    vector_index = VectorIndex(str(directory / "vectors"))
+    bm25_index = BM25Index(str(directory / "bm25"))
+    pipeline = IngestPipeline(backend, RagSettings(), vector_index, bm25_index)
+    return pipeline, Retriever(backend, vector_index, bm25_index, top_k=3)
+
+
+def test_chunk_embed_index_round_trip(tmp_path):
+    pipeline, retriever = open_rag(tmp_path)
+    chunks = split_document("doc-1", "contract.txt", TEXT, chunk_size=80, chunk_overlap=0)
+    assert len(chunks) > 1
+
+    assert asyncio.run(pipeline.ingest(chunks)) == len(chunks)
+    assert pipeline.vector_index.size == pipeline.bm25_index.size == len(chunks)
+
+    hits = asyncio.run(retriever.retrieve("сколько месяцев гарантии"))
+    assert hits[0]["document_id"] == "doc-1"
+    assert hits[0]["source"] == "contract.txt"
+    assert "двенадцать месяцев" in hits[0]["text"]
+
+
+def test_reingest_after_delete(tmp_path):
+    pipeline, retriever = open_rag(tmp_path)
+    chunks = split_document("doc-1", "contract.txt", TEXT, chunk_size=80, chunk_overlap=0)
+    asyncio.run(pipeline.ingest(chunks))
+
+    assert asyncio.run(pipeline.delete("doc-1", ["contract.txt"])) == len(chunks)
+    assert pipeline.vector_index.size == pipeline.bm25_index.size == 0
+    assert asyncio.run(retriever.retrieve("гарантийный срок")) == []
+
+    asyncio.run(pipeline.ingest(chunks))
+    assert pipeline.vector_index.size == pipeline.bm25_index.size == len(chunks)
+    hits = asyncio.run(retriever.retrieve("гарантийный срок", k=10))
+    assert len({hit["chunk_id"] for hit in hits}) == len(hits) <= len(chunks)
+
+    # После переоткрытия с диска удалённые фрагменты не возвращаются и не задваиваются
+    pipeline.bm25_index.save()
+    reopened, _ = open_rag(tmp_path)
+    assert reopened.vector_index.size == reopened.bm25_index.size == len(chunks)